@@ -11,6 +11,7 @@ from .models import (
     Game,
     Landmark,
     Lap,
+    LiveFeature,
     Session,
     SessionType,
     Track,
@@ -43,6 +44,10 @@ class FastLapSegmentAdmin(AdminChangeLinksMixin, admin.ModelAdmin):
     change_links = []
 
 
+class LiveFeatureAdmin(AdminChangeLinksMixin, admin.ModelAdmin):
+    list_display = ["driver", "game", "car", "track", "turn", "session_id", "created"]
+
+
 class LapAdmin(AdminChangeLinksMixin, admin.ModelAdmin):
     list_display = [
         "id",
@@ -146,6 +151,7 @@ admin.site.register(Driver, DriverAdmin)
 admin.site.register(Session, SessionAdmin)
 admin.site.register(FastLap, FastLapAdmin)
 admin.site.register(FastLapSegment, FastLapSegmentAdmin)
+admin.site.register(LiveFeature, LiveFeatureAdmin)
 admin.site.register(Coach, CoachAdmin)
 admin.site.register(Landmark, LandmarkAdmin)
 admin.site.register(TrackGuide, TrackGuideAdmin)
@@ -55,8 +55,9 @@ class FastLapAnalyzer:
         game = lap.session.game
         fast_lap = FastLap.objects.filter(game=game, car=car, track=track, driver=None).first()
         sectors = []
-        if fast_lap and fast_lap.data:
-            for segment in fast_lap.data.get("segments", []):
+        fast_lap_data = fast_lap.get_data() if fast_lap else None
+        if fast_lap_data:
+            for segment in fast_lap_data.get("segments", []):
                 sectors.append(
                     {
                         "start": segment.start,
@@ -0,0 +1,191 @@
+"""Versioned binary encoding of the reference ``FastLap`` data.
+
+``FastLapAnalyzer.analyze`` produces a dict with ``segments`` (Segment instances with their
+features and sector telemetry), ``distance_time`` (a DataFrame) and ``lap_ids``. Instead of
+pickling the objects, the data is stored as a numpy ``.npz`` archive:
+
+- ``version``: the format version
+- ``meta``: JSON records with the lap ids and for every segment its fields and features
+- ``distance_time/<column>``: one array per column of the distance / time lookup table
+- ``telemetry/<turn>/<column>``: one array per column of the sector telemetry of a segment
+
+Arrays of an ``.npz`` are only decoded when accessed, so the coach loading a reference lap
+reads the segment records and the distance / time table, but never the sector telemetry.
+"""
+
+import io
+import json
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from telemetry.pitcrew.segment import Segment
+
+VERSION = 1
+FEATURE_TYPES = ("brake", "throttle", "gear", "other")
+SEGMENT_FIELDS = ("turn", "start", "end", "type", "time", "track_length")
+
+
+class FastLapDataError(ValueError):
+    pass
+
+
+def is_encoded(value):
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:2]) == b"PK"
+
+
+def _json_default(value):
+    if hasattr(value, "item"):
+        # numpy scalar
+        return value.item()
+    raise TypeError(f"can't encode {type(value)}")
+
+
+def _encode_features(features):
+    features = dict(features)
+    if "distance_gear" in features:
+        # JSON object keys are strings, keep the meters as int
+        features["distance_gear"] = [[int(k), int(v)] for k, v in features["distance_gear"].items()]
+    return features
+
+
+def _decode_features(features):
+    if "distance_gear" in features:
+        features["distance_gear"] = {k: v for k, v in features["distance_gear"]}
+    return features
+
+
+def _add_frame(arrays, prefix, df):
+    """Store the columns of a DataFrame as arrays, return the column spec for the meta records."""
+    spec = {"columns": [], "utc": []}
+    arrays[f"{prefix}/index"] = df.index.to_numpy()
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            series = series.dt.tz_convert("UTC").dt.tz_localize(None)
+            spec["utc"].append(column)
+        values = series.to_numpy()
+        if values.dtype == object:
+            values = values.astype(str)
+        arrays[f"{prefix}/{column}"] = values
+        spec["columns"].append(column)
+    return spec
+
+
+def _read_frame(npz, prefix, spec):
+    columns = spec["columns"]
+    data = {column: npz[f"{prefix}/{column}"] for column in columns}
+    df = pd.DataFrame(data, index=npz[f"{prefix}/index"], columns=columns)
+    for column in spec["utc"]:
+        df[column] = df[column].dt.tz_localize("UTC")
+    return df
+
+
+def encode(data):
+    """Encode the analyzer result to bytes."""
+    arrays = {"version": np.array([VERSION])}
+    meta = {
+        "lap_ids": sorted(data.get("lap_ids", [])),
+        "segments": [],
+        "distance_time": None,
+    }
+
+    distance_time = data.get("distance_time")
+    if isinstance(distance_time, pd.DataFrame):
+        meta["distance_time"] = _add_frame(arrays, "distance_time", distance_time)
+
+    for segment in data.get("segments", []):
+        record = {field: getattr(segment, field) for field in SEGMENT_FIELDS}
+        record["features"] = {
+            type: [_encode_features(f) for f in getattr(segment, f"_{type}_features")] for type in FEATURE_TYPES
+        }
+        telemetry = segment.telemetry
+        record["telemetry"] = None
+        if isinstance(telemetry, pd.DataFrame) and len(telemetry.columns):
+            record["telemetry"] = _add_frame(arrays, f"telemetry/{segment.turn}", telemetry)
+        meta["segments"].append(record)
+
+    arrays["meta"] = np.frombuffer(json.dumps(meta, default=_json_default).encode(), dtype=np.uint8)
+
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+class FastLapData:
+    """Read only, dict like view of encoded FastLap data.
+
+    ``segments`` and ``distance_time`` are decoded on first access, the telemetry of a
+    segment only when ``segment.telemetry`` is read.
+    """
+
+    def __init__(self, blob):
+        try:
+            self.npz = np.load(io.BytesIO(bytes(blob)), allow_pickle=False)
+            self.version = int(self.npz["version"][0])
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+            raise FastLapDataError(f"invalid FastLap data: {e}")
+        if self.version > VERSION:
+            raise FastLapDataError(f"unsupported FastLap data version {self.version}")
+        self.meta = json.loads(self.npz["meta"].tobytes())
+        self._decoded = {}
+
+    def __contains__(self, key):
+        return key in ("segments", "distance_time", "lap_ids")
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key not in self._decoded:
+            self._decoded[key] = getattr(self, f"decode_{key}")()
+        return self._decoded[key]
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        return self[key]
+
+    def decode_lap_ids(self):
+        return set(self.meta["lap_ids"])
+
+    def decode_distance_time(self):
+        spec = self.meta["distance_time"]
+        if spec is None:
+            return None
+        return _read_frame(self.npz, "distance_time", spec)
+
+    def decode_segments(self):
+        segments = []
+        for record in self.meta["segments"]:
+            segment = Segment()
+            for field in SEGMENT_FIELDS:
+                setattr(segment, field, record[field])
+            for type in FEATURE_TYPES:
+                for features in record["features"][type]:
+                    segment.add_features(_decode_features(features), type=type)
+            if record["telemetry"] is not None:
+                segment.set_telemetry_loader(self.telemetry_loader(record["turn"], record["telemetry"]))
+            segments.append(segment)
+        return segments
+
+    def telemetry_loader(self, turn, spec):
+        def load():
+            return _read_frame(self.npz, f"telemetry/{turn}", spec)
+
+        return load
+
+    def to_dict(self):
+        """Decode everything, e.g. to re-encode or pickle the data."""
+        segments = self["segments"]
+        for segment in segments:
+            segment.load_telemetry()
+        return {
+            "segments": segments,
+            "distance_time": self["distance_time"],
+            "lap_ids": self["lap_ids"],
+        }
+
+
+def decode(blob):
+    return FastLapData(blob)
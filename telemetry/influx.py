@@ -5,6 +5,7 @@ import warnings
 from datetime import datetime, timedelta
 
 import influxdb_client
+import pandas as pd
 from dateutil import parser
 
 # import asyncio
@@ -344,6 +345,31 @@ class Influx:
 
         return df
 
+    def session_lap_df(self, session_id, fields, start="-10y", end="now()", measurement="laps_cc", bucket="racing"):
+        """Return the fields of a session with its topic as DataFrame, e.g. to detect its laps."""
+        if isinstance(start, datetime):
+            start = start.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        if isinstance(end, datetime):
+            end = end.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+        field_filter = " or ".join(f'r["_field"] == "{field}"' for field in fields)
+        query = f"""
+        from(bucket: "{bucket}")
+        |> range(start: {start}, stop: {end})
+        |> filter(fn: (r) => r["_measurement"] == "{measurement}")
+        |> filter(fn: (r) => r["SessionId"] == "{session_id}")
+        |> filter(fn: (r) => {field_filter})
+        |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+        |> group(columns: [])
+        |> sort(columns: ["_time"], desc: false)
+        """
+
+        df = self.query_api.query_data_frame(query=query)
+        if isinstance(df, list):
+            # one frame per table if the tables have different columns
+            df = pd.concat(df).sort_values(by="_time")
+        return df
+
     # https://community.influxdata.com/t/how-to-copy-data-between-measurements/22582/14
     def copy_session(
         self,
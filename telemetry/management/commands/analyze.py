@@ -111,8 +111,9 @@ class Command(BaseCommand):
         track = lap.track
         game = lap.session.game
         fast_lap, created = FastLap.objects.get_or_create(car=car, track=track, game=game, driver=None)
-        if fast_lap.data:
-            previous_run_lap_ids = fast_lap.data.get("lap_ids", set())
+        fast_lap_data = fast_lap.get_data()
+        if fast_lap_data:
+            previous_run_lap_ids = fast_lap_data.get("lap_ids", set())
             if previous_run_lap_ids == lap_ids and not force_save:
                 logging.debug("same laps as previous run, skipping")
                 return
@@ -160,7 +161,7 @@ class Command(BaseCommand):
         new_laps = set(laps)
         got_new_laps = new_laps != current_laps
 
-        fast_lap_data = fast_lap.data
+        fast_lap_data = fast_lap.get_data()
         based_on_new_laps = True
         if fast_lap_data and "lap_ids" in fast_lap_data:
             current_lap_ids = fast_lap_data["lap_ids"]
@@ -168,7 +169,7 @@ class Command(BaseCommand):
             based_on_new_laps = new_lap_ids != current_lap_ids
 
         if force_save or got_new_laps or based_on_new_laps:
-            fast_lap.data = data
+            fast_lap.set_data(data)
             fast_lap.laps.set(laps)
             fast_lap.save()
             logging.debug("### SAVED ###")
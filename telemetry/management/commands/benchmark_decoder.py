@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from telemetry.pitcrew.telemetry_decoder import FORMAT_MSGPACK, TelemetryDecoder, encode_payload
+
+
+class Command(BaseCommand):
+    help = "benchmark telemetry payload decoding on recorded sessions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-s",
+            "--session-ids",
+            nargs="+",
+            type=str,
+            default=["1681897871"],
+            help="recorded sessions in telemetry/tests/data",
+        )
+        parser.add_argument("-r", "--rounds", type=int, default=5)
+
+    def handle(self, *args, **options):
+        data_dir = os.path.join(os.path.dirname(__file__), "..", "..", "tests", "data")
+        payloads = []
+        msgpack_payloads = []
+        for session_id in options["session_ids"]:
+            file_path = os.path.join(data_dir, f"session_{session_id}_df.csv.gz")
+            df = pd.read_csv(file_path, compression="gzip", parse_dates=["_time"])
+            df = df.replace(np.nan, None)
+            for row in df.to_dict(orient="records"):
+                _time = int(row.pop("_time").timestamp() * 1000.0)
+                payload = {"time": _time, "telemetry": row}
+                payloads.append(json.dumps(payload).encode("utf-8"))
+                msgpack_payloads.append(encode_payload(payload, FORMAT_MSGPACK))
+
+        self.stdout.write(
+            f"{len(payloads)} payloads, {len(payloads[0])} bytes json, {len(msgpack_payloads[0])} bytes msgpack each"
+        )
+
+        def current(payload):
+            return json.loads(payload.decode("utf-8")).get("telemetry")
+
+        decoder = TelemetryDecoder(TelemetryDecoder.COACH_FIELDS)
+        runs = [
+            ("json dict", current, payloads),
+            ("projected", decoder.decode, payloads),
+            ("msgpack", decoder.decode, msgpack_payloads),
+        ]
+        for name, decode, encoded in runs:
+            best = None
+            for _ in range(options["rounds"]):
+                start = time.perf_counter()
+                decoded = [decode(payload) for payload in encoded]
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            size = sys.getsizeof(decoded[0])
+            if isinstance(decoded[0], dict):
+                size += sum(sys.getsizeof(k) for k in decoded[0])
+            self.stdout.write(
+                f"{name:>10}: {best / len(payloads) * 1_000_000:.1f} us/payload - {size} bytes retained per tick"
+            )
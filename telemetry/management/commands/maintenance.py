@@ -3,6 +3,7 @@ import logging
 
 from django.core.management.base import BaseCommand
 
+from telemetry.fast_lap_data import FastLapDataError
 from telemetry.influx import Influx
 from telemetry.models import FastLap, Lap, Session
 from telemetry.pitcrew.segment import Segment
@@ -59,6 +60,12 @@ class Command(BaseCommand):
             action="store_true",
         )
 
+        parser.add_argument(
+            "--encode-fastlaps-data",
+            help="convert the pickled fastlaps data to the binary format",
+            action="store_true",
+        )
+
     def handle(self, *args, **options):
         self.influx = Influx()
         if options["delete_influx"]:
@@ -71,6 +78,8 @@ class Command(BaseCommand):
             self.fix_fastlaps_data()
         elif options["fix_fastlaps"]:
             self.fix_fastlaps()
+        elif options["encode_fastlaps_data"]:
+            self.encode_fastlaps_data()
 
     def fix_fastlaps(self):
         """
@@ -110,6 +119,14 @@ class Command(BaseCommand):
         batch_size = 10
         fastlaps = FastLap.objects.all().iterator(chunk_size=batch_size)
         for fastlap in fastlaps:
+            if fastlap.binary_data:
+                try:
+                    fastlap.get_data()
+                except FastLapDataError as e:
+                    logging.warning(f"FastLap {fastlap.id} has invalid binary data: {e}")
+                    fastlap.delete()
+                continue
+
             data = fastlap.data
             if data is None:
                 continue
@@ -131,6 +148,31 @@ class Command(BaseCommand):
                     fastlap.delete()
                     break
 
+    def encode_fastlaps_data(self):
+        """
+        Converts the pickled data of the reference fastlaps to the binary format of telemetry.fast_lap_data.
+        The fastlaps of drivers only hold legacy live features and are left alone.
+
+        Returns:
+            None
+        """
+        fastlaps = FastLap.objects.filter(driver=None, binary_data__isnull=True).iterator(chunk_size=10)
+        encoded = 0
+        for fastlap in fastlaps:
+            data = fastlap.data
+            if not isinstance(data, dict) or not data.get("segments"):
+                continue
+            try:
+                fastlap.set_data(data)
+            except Exception as e:
+                logging.error(f"FastLap {fastlap.id} could not be encoded: {e}")
+                continue
+            fastlap.save(update_fields=["data", "binary_data", "modified"])
+            encoded += 1
+            logging.info(f"FastLap {fastlap.id} encoded: {len(fastlap.binary_data)} bytes")
+
+        print(f"encoded {encoded} fastlaps")
+
     def fix_rbr_sessions(self):
         # get all sessions for Richard Burns Rally
         sessions = Session.objects.filter(game__name="Richard Burns Rally")
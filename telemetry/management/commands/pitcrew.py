@@ -6,7 +6,8 @@ from django.core.management.base import BaseCommand
 from flask import Flask
 from flask_healthz import healthz
 
-from telemetry.models import Coach, Driver, FastLap
+from telemetry.models import Coach, Driver, FastLap, LiveFeature
+from telemetry.pitcrew.coach_watcher import CoachWatcher
 from telemetry.pitcrew.crew import Crew
 from telemetry.pitcrew.kube_crew import KubeCrew
 
@@ -21,14 +22,35 @@ class Command(BaseCommand):
         parser.add_argument("-s", "--session-saver", action="store_true")
         parser.add_argument("-n", "--no-save", action="store_true")
         parser.add_argument("-d", "--delete-driver-fastlaps", action="store_true")
+        parser.add_argument(
+            "--shards",
+            type=int,
+            default=int(os.getenv("B4MAD_RACING_PITCREW_SHARDS", 1)),
+            help="number of firehose worker processes. Every shard receives all telemetry from the broker and "
+            + "skips the drivers of other shards before decoding, so shards split the decoding and session "
+            + "tracking, not the network traffic",
+        )
+        parser.add_argument(
+            "--coach-runtime",
+            type=str,
+            choices=CoachWatcher.RUNTIMES,
+            default=None,
+            help="kube: one deployment per driver, pool: all coaches in this process",
+        )
 
     def handle(self, *args, **options):
         if options["delete_driver_fastlaps"]:
             # get all fastlaps where driver is not empty
             FastLap.objects.filter(driver__isnull=False).delete()
+            LiveFeature.objects.all().delete()
             return
 
-        crew = Crew(save=(not options["no_save"]), replay=options["replay"])
+        crew = Crew(
+            save=(not options["no_save"]),
+            replay=options["replay"],
+            shards=options["shards"],
+            coach_runtime=options["coach_runtime"],
+        )
 
         # Check if the B4MAD_RACING_COACH environment variable is set
         env_coach = os.getenv("B4MAD_RACING_COACH")
@@ -1,5 +1,4 @@
 import datetime
-import json
 import logging
 import os
 import threading
@@ -16,6 +15,7 @@ from telemetry.influx import Influx
 from telemetry.models import Lap
 from telemetry.pitcrew.firehose import Firehose
 from telemetry.pitcrew.session_saver import SessionSaver
+from telemetry.pitcrew.telemetry_decoder import FORMAT_JSON, FORMATS, encode_payload
 
 B4MAD_RACING_MQTT_HOST = os.environ.get("MOSQUITTO_MQTT_SERVICE_HOST", "telemetry.b4mad.racing")
 B4MAD_RACING_MQTT_PORT = int(os.environ.get("MOSQUITTO_MQTT_SERVICE_PORT", 31883))
@@ -77,6 +77,13 @@ class Command(BaseCommand):
         parser.add_argument("--delta", type=str, default=None)
         parser.add_argument("--quiet", action="store_true")
         parser.add_argument("--keep-session-id", action="store_true")
+        parser.add_argument(
+            "--format",
+            type=str,
+            choices=FORMATS,
+            default=FORMAT_JSON,
+            help="payload encoding to publish with",
+        )
 
     def handle(self, *args, **options):
         influx = Influx()
@@ -89,6 +96,7 @@ class Command(BaseCommand):
         self.change_driver = options["change_driver"]
         self.keep_session_id = options["keep_session_id"]
         self.quiet = options["quiet"]
+        self.format = options["format"]
         self.session_saver = None
         self.session_save_thread = None
         bucket = options["bucket"]
@@ -168,9 +176,9 @@ class Command(BaseCommand):
         self.firehose.notify(topic, payload["telemetry"], now=now)
 
     def mqtt_notify(self, topic, payload):
-        # convert payload to json string
-        payload_string = json.dumps(payload)
-        self.mqttc.publish(topic, payload=str(payload_string), qos=0, retain=False)
+        # encode payload as json, msgpack or cbor
+        payload_bytes = encode_payload(payload, self.format)
+        self.mqttc.publish(topic, payload=payload_bytes, qos=0, retain=False)
 
     def replay(self, session, wait=0.001, new_session_id=None):
         # epoch = datetime.datetime.utcfromtimestamp(0)
@@ -1,6 +1,7 @@
 import logging
 import time
 
+import dateutil.parser
 from django.core.management.base import BaseCommand
 from rich.console import Console
 from rich.progress import Progress, TextColumn
@@ -8,6 +9,10 @@ from rich.table import Column
 
 from telemetry.influx import Influx
 from telemetry.models import Lap
+from telemetry.pitcrew.lap_detector import FIELDS, detect_laps
+from telemetry.pitcrew.session import Session
+from telemetry.pitcrew.session_key import SessionKey
+from telemetry.pitcrew.session_saver import SessionHolder, SessionSaver
 
 
 class Command(BaseCommand):
@@ -55,6 +60,11 @@ class Command(BaseCommand):
             help="seconds to sleep between messages",
         )
         parser.add_argument("--live", action="store_true")
+        parser.add_argument(
+            "--save-laps",
+            action="store_true",
+            help="detect the laps of the sessions and save them to the database instead of replaying them",
+        )
         parser.add_argument("--start", type=str, default=None)
         parser.add_argument("--end", type=str, default=None)
 
@@ -66,7 +76,9 @@ class Command(BaseCommand):
         # bar_column = BarColumn(bar_width=None, table_column=Column(ratio=2))
         self.progress = Progress(text_column, expand=True)
         self.task = self.progress.add_task("Replaying", total=100, meters=0, topic="")
-        if options["session_ids"]:
+        if options["session_ids"] and options["save_laps"]:
+            self.save_laps(influx, options["session_ids"], start=options["start"], end=options["end"])
+        elif options["session_ids"]:
             for session_id in options["session_ids"]:
                 session = influx.session(
                     session_id=session_id,
@@ -96,6 +108,33 @@ class Command(BaseCommand):
         else:
             self.replay(session, wait=options["wait"], new_session_id=new_session_id)
 
+    def save_laps(self, influx, session_ids, start=None, end=None):
+        """Detect the laps of whole sessions at once and save them in bulk."""
+        start = dateutil.parser.parse(start) if start else "-10y"
+        end = dateutil.parser.parse(end) if end else "now()"
+        holder = SessionHolder()
+        for session_id in session_ids:
+            df = influx.session_lap_df(session_id, fields=FIELDS + ("CarClass",), start=start, end=end)
+            if df.empty:
+                self.console.print(f"[red] No telemetry found for session {session_id}")
+                continue
+            for topic, topic_df in df.groupby("topic", sort=False):
+                key = SessionKey.from_topic(topic)
+                if key is None:
+                    continue
+                session = Session(topic, start=topic_df["_time"].iloc[0])
+                session.end = topic_df["_time"].iloc[-1]
+                payload = {}
+                if "CarClass" in topic_df and topic_df["CarClass"].notna().any():
+                    payload["CarClass"] = topic_df["CarClass"].dropna().iloc[0]
+                key.init_session(session, payload)
+                session.laps = detect_laps(topic_df, rbr=key.is_rbr)
+                holder.sessions[topic] = session
+                finished = sum(lap.finished for lap in session.laps.values())
+                self.console.print(f"[green] {topic}: {len(session.laps)} laps, {finished} finished")
+
+        SessionSaver(holder).save_sessions()
+
     def replay(self, session, wait=0.001, new_session_id=None):
         prev_payload = {"telemetry": {}}
         monitor_fields = [
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-18 01:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("telemetry", "0026_livefeature"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fastlap",
+            name="binary_data",
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -110,6 +110,8 @@ class FastLap(ExportModelOperationsMixin("fastlap"), TimeStampedModel):
     driver = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name="fast_laps", null=True)
     # add binary field to hold arbitrary data
     data = PickledObjectField(null=True)
+    # the analyzer result encoded by telemetry.fast_lap_data, replaces the pickled data
+    binary_data = models.BinaryField(null=True, editable=False)
 
     class Meta:
         ordering = ["game", "car", "track"]
@@ -117,6 +119,24 @@ class FastLap(ExportModelOperationsMixin("fastlap"), TimeStampedModel):
     def __str__(self):
         return f"{self.id}: {self.game} {self.car} {self.track}"
 
+    def get_data(self):
+        """Return the analyzer result, decoded lazily from binary_data or the legacy pickled data."""
+        if self.binary_data:
+            decoded = getattr(self, "_decoded_data", None)
+            if decoded is None:
+                from telemetry.fast_lap_data import decode
+
+                decoded = self._decoded_data = decode(self.binary_data)
+            return decoded
+        return self.data
+
+    def set_data(self, data):
+        from telemetry.fast_lap_data import encode
+
+        self.binary_data = encode(data)
+        self._decoded_data = None
+        self.data = None
+
 
 class Lap(ExportModelOperationsMixin("lap"), DirtyFieldsMixin, TimeStampedModel):
     number = models.IntegerField()
@@ -181,6 +201,47 @@ class FastLapSegment(TimeStampedModel):
         return repr
 
 
+class LiveFeatureQuerySet(models.QuerySet):
+    def for_fast_lap(self, driver, game, track, car):
+        return self.filter(driver=driver, game=game, track=track, car=car)
+
+    def recent(self, laps=10):
+        """Return the features of the last ``laps`` passes per turn, as dict turn -> list, oldest first."""
+        rank = models.Window(
+            expression=models.functions.RowNumber(),
+            partition_by=[models.F("turn")],
+            order_by=models.F("id").desc(),
+        )
+        rows = self.annotate(rank=rank).filter(rank__lte=laps).order_by("turn", "id")
+        features = {}
+        for row in rows.values("turn", "features"):
+            features.setdefault(row["turn"], []).append(row["features"])
+        return features
+
+
+class LiveFeature(TimeStampedModel):
+    """Append-only features of one pass of a driver through a segment."""
+
+    driver = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name="live_features")
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name="live_features")
+    track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name="live_features")
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name="live_features")
+    turn = models.IntegerField()
+    session_id = models.CharField(max_length=200, default="")
+    # features by type: brake, throttle, gear and other
+    features = models.JSONField(default=dict)
+
+    objects = LiveFeatureQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["driver", "game", "track", "car", "turn", "created"]),
+        ]
+
+    def __str__(self):
+        return f"{self.driver} {self.track} {self.car} turn {self.turn} - {self.created}"
+
+
 class Coach(ExportModelOperationsMixin("coach"), TimeStampedModel):
     driver = models.OneToOneField(
         Driver,
@@ -1,82 +1,121 @@
 import logging
+import queue
+import threading
 from typing import Dict, Union
 
 import django.utils.timezone
 
-from telemetry.models import Driver
-
+from .dimension_cache import DimensionCache
 from .session import Session
+from .session_expiry import SessionExpiry
+from .session_key import SessionKey
 from .session_rbr import SessionRbr
 
 
 class ActiveDrivers:
+    TELEMETRY_FIELDS = ("CarClass",)
+
     def __init__(self, debug=False):
         self.debug = debug
         self.sessions: Dict[str, Union[Session, SessionRbr]] = {}
+        self.expiry = SessionExpiry(max_age=600)  # 10 minutes
         self.do_clear_sessions = False
+        # new sessions are pending until a background thread resolved their driver record
+        self.pending = set()
+        self.registrations = queue.SimpleQueue()
+        self.dimensions = DimensionCache()
+        self.threaded = True
+        self.registration_thread = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stopped(self):
+        return self._stop_event.is_set()
 
     def notify(self, topic, payload, now=None):
         now = now or django.utils.timezone.now()
         if topic not in self.sessions:
-            try:
-                (
-                    prefix,
-                    driver,
-                    session_id,
-                    game,
-                    track,
-                    car,
-                    session_type,
-                ) = topic.split("/")
-            except ValueError:
+            key = SessionKey.from_topic(topic)
+            if key is None:
                 # ignore invalid session
                 return
 
-            if game == "Richard Burns Rally":
+            if key.is_rbr:
                 session = SessionRbr(topic, start=now)
             else:
                 session = Session(topic, start=now)
 
-            try:
-                db_driver, created = Driver.objects.get_or_create(name=driver)
-                session.driver = db_driver
-                session.session_id = session_id
-                logging.debug(f"New session: {topic}")
-                session.game_name = game
-                session.track = track
-                session.car = car
-                session.car_class = payload.get("CarClass", "")
-                session.session_type = session_type
-                self.sessions[topic] = session
-            except Exception as e:
-                logging.error(f"Error creating driver {driver} - {e}")
-                return
+            key.init_session(session, payload)
+            logging.debug(f"New session: {topic}")
+            self.sessions[topic] = session
+            self.register(topic)
 
         session = self.sessions[topic]
         session.end = now
+        self.expiry.touch(topic, now)
         if self.do_clear_sessions:
             self.clear_sessions(now)
 
+    def register(self, topic):
+        self.pending.add(topic)
+        self.registrations.put(topic)
+        if self.threaded and self.registration_thread is None:
+            self.registration_thread = threading.Thread(target=self.run_registration, name="driver-registration")
+            self.registration_thread.daemon = True
+            self.registration_thread.start()
+
+    def run_registration(self):
+        while not self.stopped():
+            try:
+                topic = self.registrations.get(timeout=1)
+            except queue.Empty:
+                continue
+            if not self.register_pending([topic]):
+                # retry with the next batch
+                self._stop_event.wait(1)
+
+    def register_pending(self, topics=()):
+        """Resolve the drivers of the pending sessions in one batch, return False on errors."""
+        topics = list(topics)
+        while True:
+            try:
+                topics.append(self.registrations.get_nowait())
+            except queue.Empty:
+                break
+
+        sessions = [(topic, self.sessions.get(topic)) for topic in topics]
+        sessions = [(topic, session) for topic, session in sessions if session is not None]
+        if not sessions:
+            return True
+        try:
+            drivers = self.dimensions.resolve("driver", [(session.key.driver,) for _, session in sessions], create=True)
+        except Exception as e:
+            logging.error(f"Error creating drivers of {len(sessions)} sessions - {e}")
+            for topic, _ in sessions:
+                self.registrations.put(topic)
+            return False
+
+        for topic, session in sessions:
+            driver = drivers[(session.key.driver,)]
+            session.driver = driver
+            self.pending.discard(topic)
+        return True
+
+    def resolved_sessions(self):
+        """The sessions with a driver record, by topic."""
+        return {topic: session for topic, session in list(self.sessions.items()) if topic not in self.pending}
+
     # TODO: clear sessions every now and then
     def clear_sessions(self, now):
-        """Clear inactive telemetry sessions.
-
-        Loops through all sessions and deletes:
-        - Any session inactive for more than 10 minutes
-        - Any lap marked for deletion
+        """Clear telemetry sessions without updates for 10 minutes.
 
         Args:
             now (datetime): The current datetime
 
         """
-
-        delete_sessions = []
-        for topic, session in self.sessions.items():
-            # Delete session without updates for 10 minutes
-            if (now - session.end).seconds > 600:
-                delete_sessions.append(topic)
-
-        # Delete all inactive sessions
-        for topic in delete_sessions:
+        for topic in self.expiry.expired(now):
             del self.sessions[topic]
+            self.pending.discard(topic)
             logging.debug(f"{topic}\n\t deleting inactive session")
@@ -3,6 +3,7 @@ from collections import deque
 
 from telemetry.pitcrew.history import History
 from telemetry.pitcrew.logging_mixin import LoggingMixin
+from telemetry.pitcrew.snippet import AT_NAMES, EVAL_NAMES, compile_snippet
 
 from .response import Response, ResponseInstant
 from .session import Session
@@ -23,24 +24,12 @@ class Application(LoggingMixin):
         self.segments_by_turn = {}
         for segment in self.history.segments:
             self.segments_by_turn[segment.turn] = segment
-        self.init_distance_to_segment()
         self.ready = False
         self.init()
 
-    def init_distance_to_segment(self):
-        self.distance_to_segment = {}
-        for segment in self.history.segments:
-            for distance in range(segment.start, segment.end + 1):
-                if distance in self.distance_to_segment:
-                    self.log_debug(f"Distance {distance} assigned twice")
-                else:
-                    self.distance_to_segment[distance] = segment
-        for distance in range(self.history.track_length):
-            if distance not in self.distance_to_segment:
-                self.log_debug(f"Distance {distance} not set")
-
     def get_segment_at(self, distance):
-        return self.distance_to_segment.get(distance, None)
+        # the meter -> segment index is shared by the History of all applications
+        return self.history.segment_at(distance)
 
     def notify(self, distance: int, telemetry: dict, now: datetime.datetime):
         self.telemetry = telemetry
@@ -123,7 +112,7 @@ class Application(LoggingMixin):
         return response
 
     def race_pace_speed_at(self, distance):
-        return self.history.map_distance_speed.get(distance, 0)
+        return self.history.speed_at_distance(distance, log_missing=False)
 
     def calculate_avg_speed(self):
         race_pace_speed = self.race_pace_speed_at(self.distance)
@@ -140,32 +129,11 @@ class Application(LoggingMixin):
             self.avg_speed_pct = self.speed_pct_sum / len(self.speed_pct_history)
 
     def eval_at(self, snippet, segment):
-        globals = {
-            "brake_point": segment.brake_point,
-            "throttle_point": segment.throttle_point,
-            "apex": segment.apex,
-            "gear": segment.gear_distance,
-            "turn_in": segment.turn_in,
-        }
-        return self.eval(snippet, segment, globals)
-
-    def eval(self, snippet, segment, globals=None):
-        globals = globals or {
-            "segment": segment,
-            "brake_point": segment.brake_point,
-            "apex": segment.apex,
-            "brake_point_diff": segment.brake_point_diff,
-            "apex_diff": segment.apex_diff,
-            "gear_diff": segment.gear_diff,
-            "coach_brake_force": segment.coach_brake_force,
-            "coach_turn_in": segment.coach_turn_in,
-            "coach_brake_point": segment.coach_brake_point,
-            "coach_gear": segment.coach_gear,
-            "coach_apex": segment.coach_apex,
-            "coach_throttle_force": segment.coach_throttle_force,
-        }
+        return self.eval(snippet, segment, AT_NAMES)
+
+    def eval(self, snippet, segment, names=EVAL_NAMES):
         try:
-            rv = eval(snippet, globals)  # nosec
+            rv = compile_snippet(snippet).eval(segment, names)
             self.log_debug(f"eval: {snippet} -> {rv}")
             return rv
         except Exception as e:
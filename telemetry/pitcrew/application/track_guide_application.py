@@ -3,6 +3,7 @@ from collections import deque
 from typing import Dict
 
 from telemetry.models import TrackGuide
+from telemetry.pitcrew.snippet import SnippetError, check_note
 
 from .application import Application
 
@@ -156,6 +157,13 @@ class TrackGuideApplication(Application):
 
     def init_turns(self):
         for note in self.track_guide.notes.all():
+            # bad snippets are reported when the track guide is loaded, not mid session
+            try:
+                check_note(note)
+            except SnippetError as e:
+                self.log_error(e)
+                continue
+
             turn_id = note.segment or note.landmark.name
             turn = self.turns.get(turn_id, None)
             if not turn:
@@ -21,6 +21,7 @@ from .message import (
     MessageTrackGuideNotes,
     MessageTrailBrake,
 )
+from .session_key import SessionKey
 
 
 class Coach(LoggingMixin):
@@ -28,6 +29,10 @@ class Coach(LoggingMixin):
         self.history = history
         self.db_coach = db_coach
         self.messages = []
+        # meter -> messages that can respond there, see init_schedule
+        self.schedule = []
+        self.scheduled_at = {}
+        self.message_order = {}
         self.previous_distance = 10_000_000
         self.response_topic = f"/coach/{db_coach.driver.name}"
         self.responses = {}
@@ -41,20 +46,11 @@ class Coach(LoggingMixin):
         self._error = None
 
     def filter_from_topic(self, topic):
-        frags = topic.split("/")
-        driver = frags[1]
-        session = frags[2]  # noqa
-        game = frags[3]
-        track = frags[4]
-        car = frags[5]
-        filter = {
-            "Driver": driver,
-            "GameName": game,
-            "TrackCode": track,
-            "CarModel": car,
-            "SessionId": session,
-        }
-        return filter
+        key = SessionKey.from_topic(topic)
+        if key is None:
+            # invalid topic
+            return {}
+        return key.filter()
 
     def new_session(self, topic):
         self._new_session_starting = True
@@ -63,6 +59,8 @@ class Coach(LoggingMixin):
         filter = self.filter_from_topic(topic)
         self.session_id = filter.get("SessionId", "NO_SESSION")
         self.messages = []
+        self.schedule = []
+        self.scheduled_at = {}
         self._next_messages = []
         self.responses = {}
         self.db_coach.refresh_from_db()
@@ -115,6 +113,7 @@ class Coach(LoggingMixin):
                 startup_message += " track guide mode"
 
             init_success = self.init_messages()
+            self.init_schedule()
             if not init_success:
                 startup_message += " " + str(self.get_and_reset_error())
 
@@ -229,11 +228,16 @@ class Coach(LoggingMixin):
 
     def get_responses(self, telemetry, future_distance):
         responses = []
-        for message in self.messages:
+        if future_distance >= len(self.schedule):
+            return responses
+
+        # only the messages that can respond at this distance, in the order of self.messages
+        for message in list(self.schedule[future_distance]):
             # if self.mode == DbCoach.MODE_DEBUG:
             #     response = message.response_track_walk(future_distance, telemetry)
             # else:
             response = message.response_hot_lap(future_distance, telemetry)
+            self.reschedule(message)
 
             if response:
                 if not isinstance(response, list):
@@ -244,6 +248,42 @@ class Coach(LoggingMixin):
 
         return responses
 
+    def init_schedule(self):
+        """Index the messages by the meters where they can respond."""
+        self.schedule = [[] for _ in range(self.history.track_length)]
+        self.scheduled_at = {}
+        self.message_order = {message: index for index, message in enumerate(self.messages)}
+        for message in self.messages:
+            self.schedule_message(message, self.trigger_distances(message))
+
+    def trigger_distances(self, message):
+        distances = set()
+        for distance in message.trigger_distances():
+            # fractional or off track distances never match a meter
+            if distance is None or distance != distance:
+                continue
+            if distance == int(distance) and 0 <= distance < len(self.schedule):
+                distances.add(int(distance))
+        return tuple(sorted(distances))
+
+    def schedule_message(self, message, distances):
+        order = self.message_order
+        for distance in distances:
+            messages = self.schedule[distance]
+            messages.append(message)
+            messages.sort(key=lambda m: order[m])
+        self.scheduled_at[message] = distances
+
+    def reschedule(self, message):
+        """Messages can move after they responded, e.g. MessageTrackGuideNotes."""
+        distances = self.trigger_distances(message)
+        scheduled = self.scheduled_at.get(message, ())
+        if distances == scheduled:
+            return
+        for distance in scheduled:
+            self.schedule[distance].remove(message)
+        self.schedule_message(message, distances)
+
     def merge_responses(self, responses):
         map = {}
         for response in responses:
@@ -313,7 +353,8 @@ class Coach(LoggingMixin):
                             message.add_segment(segment)
                     if message.segment:
                         message.set_notes(notes, mode="landmark")
-                        self.messages.append(message)
+                        if message.active:
+                            self.messages.append(message)
 
         for segment in self.history.segments:
             if self.mode == DbCoach.MODE_ONLY_BRAKE or self.mode == DbCoach.MODE_ONLY_BRAKE_DEBUG:
@@ -328,7 +369,8 @@ class Coach(LoggingMixin):
                 notes = list(self.track_guide.notes.filter(segment=segment.turn))
                 if notes:
                     message.set_notes(notes)
-                    self.messages.append(message)
+                    if message.active:
+                        self.messages.append(message)
                 continue
 
             if self.mode == DbCoach.MODE_DEBUG:
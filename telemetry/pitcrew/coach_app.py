@@ -10,6 +10,7 @@ from .application.response import ResponseInstant
 from .application.session import Session
 from .application.track_guide_application import TrackGuideApplication
 from .history import History
+from .session_key import SessionKey
 
 
 class CoachApp(LoggingMixin):
@@ -31,22 +32,11 @@ class CoachApp(LoggingMixin):
         self.apps = []
 
     def filter_from_topic(self, topic):
-        frags = topic.split("/")
-        driver = frags[1]
-        session = frags[2]  # noqa
-        game = frags[3]
-        track = frags[4]
-        car = frags[5]
-        session_type = frags[6]
-        filter = {
-            "Driver": driver,
-            "GameName": game,
-            "TrackCode": track,
-            "CarModel": car,
-            "SessionId": session,
-            "SessionType": session_type,
-        }
-        return filter
+        key = SessionKey.from_topic(topic)
+        if key is None:
+            # invalid topic
+            return {}
+        return key.filter()
 
     def new_session(self, topic):
         self._new_session_starting = True
@@ -10,11 +10,16 @@ from .application.brake_application import BrakeApplication
 from .application.debug_application import DebugApplication
 from .application.session import Session
 from .application.track_guide_application import TrackGuideApplication
+from .distance_flags import DistanceFlags
 from .history import History
 from .persister import Persister
+from .session_key import SessionKey
+from .telemetry_decoder import TelemetryDecoder
 
 
 class CoachCopilots(LoggingMixin):
+    TELEMETRY_FIELDS = TelemetryDecoder.COACH_FIELDS
+
     def __init__(self, history: History, coach_model: Coach, debug=False):
         self.history = history
         self.coach_model = coach_model
@@ -27,8 +32,8 @@ class CoachCopilots(LoggingMixin):
         self.topic = ""
         self.session_id = ""
         self.distance = 0
-        self.playing_at = {}  # distance -> bool
-        self.ticked_at = {}  # distance -> bool
+        self.playing_at = DistanceFlags()  # a response is playing at distance
+        self.ticked_at = DistanceFlags()  # the apps were notified for distance
         self.track_length = 1
         self._crashed = False
         self.telemetry = {}
@@ -36,22 +41,7 @@ class CoachCopilots(LoggingMixin):
         self.driver_name = self.coach_model.driver.name
 
     def filter_from_topic(self, topic):
-        frags = topic.split("/")
-        driver = frags[1]
-        session = frags[2]  # noqa
-        game = frags[3]
-        track = frags[4]
-        car = frags[5]
-        session_type = frags[6]
-        filter = {
-            "Driver": driver,
-            "GameName": game,
-            "TrackCode": track,
-            "CarModel": car,
-            "SessionId": session,
-            "SessionType": session_type,
-        }
-        return filter
+        return SessionKey.from_topic(topic).filter()
 
     def new_session(self, topic):
         self._new_session_starting = True
@@ -94,6 +84,8 @@ class CoachCopilots(LoggingMixin):
         self.session.session_type = self.session_type
         self.session.id = self.session_id
         self.track_length = self.session.track_length()
+        self.playing_at = DistanceFlags(self.track_length)
+        self.ticked_at = DistanceFlags(self.track_length)
 
         # find all copilot instances for this driver
         # where the mqtt_drivername on the driver relation matches self.driver_name
@@ -142,18 +134,13 @@ class CoachCopilots(LoggingMixin):
                         ratio = speed_now / speed_at
                         read_time *= ratio
                     end = self.history.distance_add_seconds(start, read_time)
-                    for distance in range(start, end):
-                        play_at_distance = distance % self.track_length
-                        self.playing_at[play_at_distance] = True
+                    self.playing_at.set_range(start, end)
 
             self.responses = []
             return (self.response_topic, responses)
 
     def message_playing_at(self, distance):
-        is_playing_at = self.playing_at.get(distance, False)
-        if is_playing_at:
-            return True
-        return False
+        return self.playing_at[distance]
 
     def notify(self, topic, telemetry, now=None):
         now = now or django.utils.timezone.now()
@@ -179,10 +166,8 @@ class CoachCopilots(LoggingMixin):
         self.telemetry = telemetry
         self.tick(topic, telemetry, now)
 
-        ticked_at_distance = self.previous_distance
-        while ticked_at_distance != self.distance:
-            ticked_at_distance = self.history.distance_add(ticked_at_distance, 1)
-            self.ticked_at[ticked_at_distance] = False
+        # the meters we passed can be ticked again on the next lap
+        self.ticked_at.set_range(self.previous_distance + 1, self.distance + 1, False)
         self.previous_distance = self.distance
 
         for app in self.apps:
@@ -237,18 +222,14 @@ class CoachCopilots(LoggingMixin):
         stop = self.history.distance_add(self.distance, stop_delta)
 
         # self.log_debug(f"start at {distance} to {stop} - delta: {delta} - speed: {telemetry['SpeedMs']} m/s {telemetry['SpeedMs'] * 3.6} km/h")
-        while distance != stop:
-            # self.log_debug(f"d: {distance} ({self.distance})")
-            self.playing_at[distance] = False
-            if distance % 100 == 0:
-                self.log_debug(f"distance: {distance} ({self.distance})")
-
-            # notify all registered apps
-            if not self.ticked_at.get(distance):
-                for app in self.apps:
-                    app.notify(distance, telemetry, now)
-
-            self.ticked_at[distance] = True
-            distance = self.history.distance_add(distance, 1)
+        self.playing_at.set_range(distance, stop, False)
+
+        # notify all registered apps for the meters ahead they have not seen yet
+        for ticked_distance in self.ticked_at.unset_in_range(distance, stop):
+            if ticked_distance % 100 == 0:
+                self.log_debug(f"distance: {ticked_distance} ({self.distance})")
+            for app in self.apps:
+                app.notify(ticked_distance, telemetry, now)
+        self.ticked_at.set_range(distance, stop)
 
         self.previous_delta = delta
@@ -0,0 +1,187 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from telemetry.models import Coach, Driver
+from telemetry.utils import shard_for_topic
+
+from .coach_copilots import CoachCopilots
+from .history import History
+from .ingest import Ingest
+from .mqtt import Mqtt
+from .session_key import SessionKey
+from .telemetry_decoder import TelemetryDecoder
+
+
+class CoachPool:
+    """Host the coaches of many drivers in one process on a single MQTT connection.
+
+    This is the alternative to one KubeCrew deployment per driver. Telemetry is routed to
+    a fixed number of workers by driver, so the ticks of a driver are handled in order by
+    the same worker. The History of every coach is stepped by a shared thread pool instead
+    of a thread per driver, the histories wake up the pool when they have work.
+
+    Errors are isolated per driver: a coach raising ``max_errors`` times in a row is dropped
+    and started fresh on the next ``sync``.
+    """
+
+    TELEMETRY_FIELDS = TelemetryDecoder.COACH_FIELDS
+
+    def __init__(self, replay=False, workers=None, debug=False):
+        self.replay = replay
+        self.debug = debug
+        self.workers = workers or int(os.environ.get("B4MAD_RACING_COACH_WORKERS", 4))
+        self.coaches = {}  # driver name -> CoachCopilots
+        self.errors = {}  # driver name -> number of errors in a row
+        self.max_errors = 10
+        self.lock = threading.Lock()
+
+        self.ingests = [Ingest(self.handle) for _ in range(self.workers)]
+        self.history_executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="coach-history")
+        self.history_futures = {}  # driver name -> Future of the running History.step
+        # set by the histories when they have work and when a step finished
+        self.history_event = threading.Event()
+        # wake up for time based work, e.g. flushing the live features
+        self.history_timeout = 1  # seconds
+        self.mqtt = Mqtt(self, "crewchief/#", replay=replay, debug=debug)
+
+        self.ready = False
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.history_event.set()
+        self.mqtt.stop()
+        for ingest in self.ingests:
+            ingest.stop()
+        self.history_executor.shutdown(wait=True)
+        # write the live features and laps of the running coaches
+        for driver_name in list(self.coaches):
+            self.stop_coach(driver_name)
+
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def sync(self, driver_names):
+        """Start coaches for new drivers and stop the ones no longer active."""
+        for driver_name in set(self.coaches) - set(driver_names):
+            self.stop_coach(driver_name)
+        for driver_name in set(driver_names) - set(self.coaches):
+            self.start_coach(driver_name)
+
+    def start_coach(self, driver_name):
+        try:
+            driver = Driver.objects.get(name=driver_name)
+            coach_model, created = Coach.objects.get_or_create(driver=driver)
+            history = History()
+            history.threaded = True
+            history.work_event = self.history_event
+            coach = CoachCopilots(history, coach_model, debug=self.debug)
+        except Exception as e:
+            logging.exception(f"Error starting coach for {driver_name}: {e}")
+            return
+
+        with self.lock:
+            self.coaches[driver_name] = coach
+            self.errors[driver_name] = 0
+        logging.info(f"coach started for {driver_name} - {len(self.coaches)} coaches")
+
+    def stop_coach(self, driver_name):
+        with self.lock:
+            coach = self.coaches.pop(driver_name, None)
+            self.errors.pop(driver_name, None)
+        if coach:
+            coach.history.disconnect()
+            coach.history.flush_live_features()
+            coach.persister.stop()
+            logging.info(f"coach stopped for {driver_name} - {len(self.coaches)} coaches")
+
+    def coach_succeeded(self, driver_name):
+        if self.errors.get(driver_name):
+            with self.lock:
+                if driver_name in self.errors:
+                    self.errors[driver_name] = 0
+
+    def coach_failed(self, driver_name, e):
+        logging.exception(f"Error in coach for {driver_name}: {e}")
+        with self.lock:
+            errors = self.errors.get(driver_name, 0) + 1
+            self.errors[driver_name] = errors
+        if errors >= self.max_errors:
+            logging.error(f"dropping coach for {driver_name} after {errors} errors")
+            self.stop_coach(driver_name)
+
+    def notify(self, topic, payload, now=None):
+        """Called by the MQTT thread, hand the telemetry to the worker of the driver."""
+        key = SessionKey.from_topic(topic)
+        if key is None or key.driver not in self.coaches:
+            return
+        self.ingests[shard_for_topic(topic, self.workers)].put(topic, payload)
+
+    def handle(self, topic, payload):
+        """Called by a worker, notify the coach and publish its responses."""
+        driver_name = SessionKey.from_topic(topic).driver
+        coach = self.coaches.get(driver_name)
+        if coach is None:
+            return
+        try:
+            response = coach.notify(topic, payload)
+        except Exception as e:
+            self.coach_failed(driver_name, e)
+            return
+        self.coach_succeeded(driver_name)
+        self.mqtt.publish_response(response, payload)
+
+    def step_histories(self):
+        for driver_name, coach in list(self.coaches.items()):
+            future = self.history_futures.get(driver_name)
+            if future and not future.done():
+                # still initializing or processing segments
+                continue
+            if not coach.history.has_work():
+                continue
+            try:
+                self.history_futures[driver_name] = self.history_executor.submit(self.step_history, driver_name, coach)
+            except RuntimeError:
+                # the pool is stopping
+                return
+
+        for driver_name in set(self.history_futures) - set(self.coaches):
+            del self.history_futures[driver_name]
+
+    def step_history(self, driver_name, coach):
+        try:
+            coach.history.step()
+        except Exception as e:
+            self.coach_failed(driver_name, e)
+        else:
+            self.coach_succeeded(driver_name)
+        finally:
+            # work that arrived during the step is picked up right away
+            self.history_event.set()
+
+    def run(self):
+        threads = []
+        t = threading.Thread(target=self.mqtt.run)
+        t.name = "coach-pool-mqtt"
+        threads.append(t)
+        for index, ingest in enumerate(self.ingests):
+            t = threading.Thread(target=ingest.run)
+            t.name = f"coach-pool-worker-{index}"
+            threads.append(t)
+        for t in threads:
+            t.start()
+
+        while not self.stopped():
+            self.ready = self.mqtt.ready
+            self.history_event.clear()
+            self.step_histories()
+            self.history_event.wait(timeout=self.history_timeout)
+
+        self.mqtt.disconnect()
+        self.history_executor.shutdown(wait=True)
+        for driver_name in list(self.coaches):
+            self.stop_coach(driver_name)
+        for t in threads:
+            t.join(timeout=60)
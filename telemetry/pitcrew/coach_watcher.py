@@ -1,28 +1,41 @@
 import logging
+import os
 import threading
 import time
 
-from telemetry.models import Driver
-
 from .active_drivers import ActiveDrivers
 
 # from .coach import Coach as PitCrewCoach
 # from .coach_app import CoachApp
 from .coach_copilots import CoachCopilots
+from .coach_pool import CoachPool
 from .history import History
 from .kube_crew import KubeCrew
 from .mqtt import Mqtt
 
 
 class CoachWatcher:
-    def __init__(self, firehose: ActiveDrivers, replay=False):
+    RUNTIME_KUBE = "kube"
+    RUNTIME_POOL = "pool"
+    RUNTIMES = [RUNTIME_KUBE, RUNTIME_POOL]
+
+    def __init__(self, firehose: ActiveDrivers, replay=False, runtime=None):
         self.firehose = firehose
         self.sleep_time = 10
         self.active_coaches = {}
         self.replay = replay
         self.ready = False
         self._stop_event = threading.Event()
-        self.kube_crew = KubeCrew()
+        # kube: one deployment per driver, pool: all coaches in this process
+        self.runtime = runtime or os.environ.get("B4MAD_RACING_COACH_RUNTIME", self.RUNTIME_KUBE)
+        if self.runtime not in self.RUNTIMES:
+            raise ValueError(f"unknown coach runtime {self.runtime}")
+        self.kube_crew = None
+        self.coach_pool = None
+        if self.runtime == self.RUNTIME_POOL:
+            self.coach_pool = CoachPool(replay=replay)
+        else:
+            self.kube_crew = KubeCrew()
 
     def stop(self):
         self._stop_event.set()
@@ -32,10 +45,9 @@ class CoachWatcher:
 
     def drivers(self):
         drivers = set()
-        for session in self.firehose.sessions.values():
-            # check if session.driver is a Driver object
-            if isinstance(session.driver, Driver):
-                drivers.add(session.driver)
+        # only sessions whose driver record is resolved
+        for session in self.firehose.resolved_sessions().values():
+            drivers.add(session.driver)
         return drivers
 
     def watch_coaches(self):
@@ -44,10 +56,13 @@ class CoachWatcher:
             # sleep longer than save_sessions, to make sure all DB objects are initialized
             time.sleep(self.sleep_time)
             drivers = self.drivers()
-            self.kube_crew.drivers.clear()
-            for driver in drivers:
-                self.kube_crew.drivers.add(driver.name)
-            self.kube_crew.sync_deployments()
+            if self.coach_pool:
+                self.coach_pool.sync([driver.name for driver in drivers])
+            else:
+                self.kube_crew.drivers.clear()
+                for driver in drivers:
+                    self.kube_crew.drivers.add(driver.name)
+                self.kube_crew.sync_deployments()
             self.firehose.do_clear_sessions = True
 
     def start_coach(self, driver_name, coach_model, debug=False):
@@ -61,7 +76,7 @@ class CoachWatcher:
         coach = CoachCopilots(history, coach_model, debug=debug)
 
         topic = f"crewchief/{driver_name}/#"
-        mqtt = Mqtt(coach, topic, replay=self.replay, debug=debug)
+        mqtt = Mqtt(coach, topic, replay=self.replay, debug=debug, ingest=True)
 
         def history_thread():
             logging.info(f"History thread starting for {driver_name}")
@@ -1,32 +1,45 @@
 import logging
+import multiprocessing
 import os
 import signal
 import threading
 import time
 
+from django import db
 from flask_healthz import HealthError
 
 from .active_drivers import ActiveDrivers
 from .coach_watcher import CoachWatcher
+from .firehose_shard import FirehoseShard, ShardedActiveDrivers
 from .mqtt import Mqtt
 
 # from .session_saver import SessionSaver
 
 
 class Crew:
-    def __init__(self, debug=False, replay=False, save=True):
+    def __init__(self, debug=False, replay=False, save=True, shards=1, coach_runtime=None):
         self._ready = False
         self._live = False
         self.debug = debug
         self.replay = replay
         self.save = save
+        self.shards = shards
 
         topic = "crewchief/#"
 
-        self.firehose = ActiveDrivers(debug=debug)
-        self.mqtt = Mqtt(self.firehose, topic, replay=replay)
-
-        self.coach_watcher = CoachWatcher(self.firehose, replay=replay)
+        self.shard_processes = []
+        if self.shards > 1:
+            # every shard is a process with its own MQTT client, consuming a hash partition of the drivers
+            self.shard_queue = multiprocessing.Queue()
+            self.shard_stop_event = multiprocessing.Event()
+            self.firehose = ShardedActiveDrivers(self.shard_queue, self.shards, debug=debug)
+            self.mqtt = None
+        else:
+            self.firehose = ActiveDrivers(debug=debug)
+            self.mqtt = Mqtt(self.firehose, topic, replay=replay)
+
+        self.coach_watcher = CoachWatcher(self.firehose, replay=replay, runtime=coach_runtime)
+        self.coach_pool = self.coach_watcher.coach_pool
         # self.coach_watcher.sleep_time = 3
 
         # self.session_saver = SessionSaver(self.firehose, save=save)
@@ -54,6 +67,33 @@ class Crew:
         if not self._ready:
             raise HealthError("not ready yet")
 
+    def firehose_ready(self):
+        if self.shards > 1:
+            return self.firehose.ready
+        return self.mqtt.ready
+
+    def start_shards(self):
+        # don't share the parent's DB connections with the forked shards
+        db.connections.close_all()
+        for index in range(self.shards):
+            shard = FirehoseShard(
+                index, self.shards, self.shard_queue, self.shard_stop_event, replay=self.replay, debug=self.debug
+            )
+            p = multiprocessing.Process(target=shard.run)
+            p.name = f"firehose-shard-{index}"
+            p.daemon = True
+            self.shard_processes.append(p)
+            logging.debug(f"starting Process {p}")
+            p.start()
+
+    def stop_shards(self):
+        self.shard_stop_event.set()
+        for p in self.shard_processes:
+            logging.debug(f"joining Process {p}")
+            p.join(timeout=60)
+            if p.is_alive():
+                p.terminate()
+
     def run(self):
         # log my process id
         logging.info(f"starting Crew with pid {os.getpid()}")
@@ -63,14 +103,25 @@ class Crew:
 
         threads = []
 
-        t = threading.Thread(target=self.mqtt.run)
-        t.name = "mqtt"
-        threads.append(t)
+        if self.shards > 1:
+            self.start_shards()
+            t = threading.Thread(target=self.firehose.run)
+            t.name = "firehose_shards"
+            threads.append(t)
+        else:
+            t = threading.Thread(target=self.mqtt.run)
+            t.name = "mqtt"
+            threads.append(t)
 
         t = threading.Thread(target=self.coach_watcher.run)
         t.name = "coach_watcher"
         threads.append(t)
 
+        if self.coach_pool:
+            t = threading.Thread(target=self.coach_pool.run)
+            t.name = "coach_pool"
+            threads.append(t)
+
         # t = threading.Thread(target=self.session_saver.run)
         # t.name = "session_saver"
         # threads.append(t)
@@ -81,7 +132,8 @@ class Crew:
 
         logging.debug("waiting for threads to be ready...")
         while True:
-            if self.mqtt.ready and self.coach_watcher.ready:  # and self.session_saver.ready:
+            coach_pool_ready = self.coach_pool.ready if self.coach_pool else True
+            if self.firehose_ready() and self.coach_watcher.ready and coach_pool_ready:  # and self.session_saver.ready:
                 break
             time.sleep(1)
 
@@ -96,9 +148,21 @@ class Crew:
                     self.stop()
                     logging.error(f"Thread {t} died")
                     break
+            for p in self.shard_processes:
+                if not p.is_alive():
+                    self.stop()
+                    logging.error(f"Process {p} died")
+                    break
 
-        self.mqtt.stop()
+        if self.shards > 1:
+            self.stop_shards()
+            self.firehose.stop()
+        else:
+            self.mqtt.stop()
+            self.firehose.stop()
         self.coach_watcher.stop()
+        if self.coach_pool:
+            self.coach_pool.stop()
         # self.session_saver.stop()
 
         for t in threads:
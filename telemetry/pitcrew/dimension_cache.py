@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+
+from telemetry.models import Car, CarClass, Driver, Game, SessionType, Track
+
+# dimension -> model and the fields of its natural key
+DIMENSIONS = {
+    "driver": (Driver, ("name",)),
+    "game": (Game, ("name",)),
+    "session_type": (SessionType, ("type",)),
+    "car": (Car, ("game_id", "name")),
+    "car_class": (CarClass, ("game_id", "name")),
+    "track": (Track, ("game_id", "name")),
+}
+
+
+class DimensionCache:
+    """Cache of the dimension records of sessions (driver, game, car, ...) by natural key.
+
+    Keys are resolved in batches with one query per dimension, unknown keys are
+    created with a single bulk insert. Records expire after ``ttl`` seconds, keys that
+    were not found are remembered for ``negative_ttl`` seconds so sessions that can't
+    be resolved don't query again on every loop.
+    """
+
+    def __init__(self, ttl=None, negative_ttl=None):
+        self.ttl = ttl or float(os.environ.get("B4MAD_RACING_DIMENSION_CACHE_TTL", 600))
+        self.negative_ttl = negative_ttl or float(os.environ.get("B4MAD_RACING_DIMENSION_CACHE_NEGATIVE_TTL", 60))
+        self.entries = {}  # (dimension, key) -> (record or None, expires)
+        self.lock = threading.Lock()
+
+    def resolve(self, dimension, keys, create=False):
+        """Return the records of the keys of a dimension, None for keys not found.
+
+        With create, records for unknown keys are inserted.
+        """
+        now = time.monotonic()
+        records = {}
+        missing = set()
+        with self.lock:
+            for key in set(keys):
+                entry = self.entries.get((dimension, key))
+                if entry and entry[1] >= now and (entry[0] is not None or not create):
+                    records[key] = entry[0]
+                else:
+                    missing.add(key)
+
+        if missing:
+            found = self.fetch(dimension, missing)
+            new = missing - found.keys()
+            if create and new:
+                model, fields = DIMENSIONS[dimension]
+                model.objects.bulk_create([model(**dict(zip(fields, key))) for key in new], ignore_conflicts=True)
+                found.update(self.fetch(dimension, new))
+
+            with self.lock:
+                for key in missing:
+                    record = found.get(key)
+                    ttl = self.ttl if record is not None else self.negative_ttl
+                    self.entries[(dimension, key)] = (record, now + ttl)
+                    records[key] = record
+        return records
+
+    def fetch(self, dimension, keys):
+        model, fields = DIMENSIONS[dimension]
+        lookup = {f"{field}__in": {key[i] for key in keys} for i, field in enumerate(fields)}
+        found = {}
+        # of duplicate names the oldest record wins
+        for record in model.objects.filter(**lookup).order_by("-id"):
+            key = tuple(getattr(record, field) for field in fields)
+            if key in keys:
+                found[key] = record
+        return found
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
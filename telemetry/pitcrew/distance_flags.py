@@ -0,0 +1,42 @@
+import numpy as np
+
+
+class DistanceFlags:
+    """A flag per meter of a track.
+
+    Ranges of meters are set and cleared with a single slice assignment, a range
+    ``[start, stop)`` with ``start > stop`` wraps around the start / finish line.
+    """
+
+    def __init__(self, length=1):
+        self.flags = np.zeros(max(int(length), 1), dtype=bool)
+
+    def __len__(self):
+        return len(self.flags)
+
+    def __getitem__(self, distance):
+        return bool(self.flags[int(distance) % len(self.flags)])
+
+    def __setitem__(self, distance, value):
+        self.flags[int(distance) % len(self.flags)] = value
+
+    def slices(self, start, stop):
+        length = len(self.flags)
+        start, stop = int(start) % length, int(stop) % length
+        if start <= stop:
+            return [(start, stop)]
+        return [(start, length), (0, stop)]
+
+    def set_range(self, start, stop, value=True):
+        for a, b in self.slices(start, stop):
+            self.flags[a:b] = value
+
+    def unset_in_range(self, start, stop):
+        """Return the meters in the range that are not set, in driving order."""
+        distances = []
+        for a, b in self.slices(start, stop):
+            distances.extend((np.flatnonzero(~self.flags[a:b]) + a).tolist())
+        return distances
+
+    def clear(self):
+        self.flags[:] = False
@@ -0,0 +1,161 @@
+import math
+import numbers
+
+import numpy as np
+
+
+class FeatureColumn:
+    """The values of one feature in the rows of a FeatureBuffer.
+
+    Missing and falsy values are not ``present``, ``ints`` remembers which values were
+    integers so they are returned as int like they were added. A column with any
+    non numeric value (e.g. ``distance_gear``) is read from the rows instead.
+    """
+
+    def __init__(self, capacity):
+        self.values = np.zeros(capacity)
+        self.present = np.zeros(capacity, dtype=bool)
+        self.ints = np.zeros(capacity, dtype=bool)
+        self.numeric = True
+
+    def set(self, position, value):
+        if value and value is not None:
+            if isinstance(value, numbers.Real):
+                self.values[position] = value
+                self.ints[position] = isinstance(value, numbers.Integral)
+            else:
+                self.numeric = False
+            self.present[position] = True
+        else:
+            self.present[position] = False
+
+    def resize(self, order, capacity):
+        for name in ("values", "present", "ints"):
+            array = getattr(self, name)
+            resized = np.zeros(capacity, dtype=array.dtype)
+            resized[: len(order)] = array[order]
+            setattr(self, name, resized)
+
+
+class FeatureBuffer:
+    """The live features of one type of a segment, a ring buffer of at most maxlen rows.
+
+    Rows are the feature dicts as added, iterating yields them oldest first like the
+    deque it replaces. Every feature is also kept in a numpy column, so the recent values
+    of a feature are read with a few array operations instead of a walk over the dicts.
+    Without maxlen the buffer grows.
+    """
+
+    def __init__(self, rows=(), maxlen=None):
+        self.maxlen = maxlen
+        self.capacity = maxlen or 16
+        self.rows = np.empty(self.capacity, dtype=object)
+        self.columns = {}
+        self.head = 0  # position of the next row
+        self.size = 0
+        for features in rows:
+            self.append(features)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return iter(self.rows[self.order()].tolist())
+
+    def __getitem__(self, i):
+        if not -self.size <= i < self.size:
+            raise IndexError("FeatureBuffer index out of range")
+        return self.rows[(self.head - self.size + i % self.size) % self.capacity]
+
+    def __repr__(self):
+        return f"FeatureBuffer({list(self)}, maxlen={self.maxlen})"
+
+    def order(self):
+        """Positions of the rows, oldest first."""
+        return (self.head - self.size + np.arange(self.size)) % self.capacity
+
+    def grow(self):
+        order = self.order()
+        self.capacity *= 2
+        rows = np.empty(self.capacity, dtype=object)
+        rows[: self.size] = self.rows[order]
+        self.rows = rows
+        for column in self.columns.values():
+            column.resize(order, self.capacity)
+        self.head = self.size
+
+    def append(self, features):
+        if self.maxlen == 0:
+            return
+        if self.size == self.capacity and self.maxlen is None:
+            self.grow()
+
+        position = self.head
+        self.rows[position] = features
+        for name, column in self.columns.items():
+            column.set(position, features.get(name))
+        for name in features.keys() - self.columns.keys():
+            column = FeatureColumn(self.capacity)
+            column.set(position, features[name])
+            self.columns[name] = column
+
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def recent(self, feature, n=0):
+        """Return the present values of a feature newest first and which of them are ints.
+
+        Like the original walk over the dicts the oldest row is never included. With n
+        at most n values are returned.
+        """
+        column = self.columns.get(feature)
+        if column is None or self.size < 2:
+            return no_values()
+        positions = (self.head - 1 - np.arange(self.size - 1)) % self.capacity
+        positions = positions[column.present[positions]]
+        if n:
+            positions = positions[:n]
+        if column.numeric:
+            return column.values[positions], column.ints[positions]
+        values = np.empty(len(positions), dtype=object)
+        values[:] = [row.get(feature) for row in self.rows[positions]]
+        return values, np.zeros(len(positions), dtype=bool)
+
+
+def no_values():
+    return np.empty(0), np.empty(0, dtype=bool)
+
+
+def to_list(values, ints):
+    if values.dtype == object:
+        return values.tolist()
+    return [int(value) if is_int else value for value, is_int in zip(values.tolist(), ints.tolist())]
+
+
+def inliers(values, threshold=1):
+    """Mask of the values with a z-score below threshold, like scipy.stats.zscore.
+
+    If all values are the same the z-scores are NaN and no value is an inlier. The mean
+    and standard deviation are summed like numpy's, without its overhead for small arrays.
+
+    They are computed per call over the requested window, not kept as running sums in
+    the buffer: the callers ask for different windows (the last n values, all but the
+    oldest row), and running sums round differently, which flips the borderline z-score
+    of exactly 1, e.g. for two laps. Selecting the inliers needs a pass over the window
+    anyway, which is at most the recent laps of the segment.
+    """
+    if (values == values.min()).all():
+        return np.zeros(len(values), dtype=bool)
+    deviations = values - values.sum() / len(values)
+    std = math.sqrt((deviations * deviations).sum() / len(values))
+    return np.abs(deviations / std) < threshold
+
+
+def mean(values, ints):
+    """The mean like statistics.mean, an int if all values are ints and it is whole."""
+    if ints.all():
+        total = sum(int(value) for value in values.tolist())
+        if total % len(values) == 0:
+            return total // len(values)
+        return total / len(values)
+    return math.fsum(values.tolist()) / len(values)
@@ -0,0 +1,127 @@
+import logging
+import queue
+import threading
+
+import django.utils.timezone
+
+from .active_drivers import ActiveDrivers
+from .mqtt import Mqtt
+from .session import Session
+from .session_expiry import SessionExpiry
+from .session_key import SessionKey
+
+
+class FirehoseShard:
+    """Worker process consuming one hash partition of the firehose.
+
+    Each shard runs its own ActiveDrivers and Mqtt client and periodically reports
+    its active sessions to the supervising Crew via a multiprocessing queue.
+
+    Every shard subscribes to all telemetry, the broker can't partition by driver:
+    shared subscriptions ($share/) balance single messages, which would split the ticks
+    of a driver over the shards. Messages of other shards are skipped by topic before
+    their payload is decoded, so the broker fan-out grows with the number of shards.
+    """
+
+    def __init__(self, index, shards, report_queue, stop_event, replay=False, debug=False):
+        self.index = index
+        self.shards = shards
+        self.report_queue = report_queue
+        self.stop_event = stop_event
+        self.replay = replay
+        self.debug = debug
+        self.report_interval = 5
+
+    def run(self):
+        logging.info(f"starting firehose shard {self.index}/{self.shards}")
+        firehose = ActiveDrivers(debug=self.debug)
+        mqtt = Mqtt(firehose, "crewchief/#", replay=self.replay, partition=(self.index, self.shards))
+
+        t = threading.Thread(target=mqtt.run)
+        t.name = f"mqtt-shard-{self.index}"
+        t.start()
+
+        reported_ready = False
+        while not self.stop_event.is_set():
+            self.stop_event.wait(self.report_interval)
+            if mqtt.ready and not reported_ready:
+                self.report_queue.put(("ready", self.index, None))
+                reported_ready = True
+            self.report(firehose)
+            firehose.do_clear_sessions = True
+
+        mqtt.stop()
+        mqtt.disconnect()
+        t.join(timeout=60)
+        logging.info(f"firehose shard {self.index} stopped")
+
+    def report(self, firehose):
+        sessions = []
+        # sessions still waiting for their driver record are reported once resolved
+        for topic, session in firehose.resolved_sessions().items():
+            sessions.append((topic, session.driver, session.end))
+        self.report_queue.put(("sessions", self.index, sessions))
+
+
+class ShardedActiveDrivers:
+    """Aggregates the active sessions reported by all firehose shards.
+
+    It exposes the same ``sessions`` interface as ActiveDrivers, so the CoachWatcher
+    can use it as a drop-in replacement. It is fed by the shard reports, not by MQTT.
+    """
+
+    def __init__(self, report_queue, shards, debug=False):
+        self.debug = debug
+        self.report_queue = report_queue
+        self.shards = shards
+        self.sessions = {}
+        self.expiry = SessionExpiry(max_age=600)  # 10 minutes
+        self.do_clear_sessions = False
+        self.ready_shards = set()
+        self.ready = False
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def resolved_sessions(self):
+        """The shards only report sessions with a driver record."""
+        return dict(self.sessions)
+
+    def clear_sessions(self, now):
+        for topic in self.expiry.expired(now):
+            del self.sessions[topic]
+            logging.debug(f"{topic}\n\t deleting inactive session")
+
+    def update_sessions(self, sessions):
+        for topic, driver, end in sessions:
+            session = self.sessions.get(topic)
+            if not session:
+                session = Session(topic, start=end)
+                session.key = SessionKey.from_topic(topic)
+                session.driver = driver
+                self.sessions[topic] = session
+                logging.debug(f"New session: {topic}")
+            if end > session.end:
+                session.end = end
+            self.expiry.touch(topic, session.end)
+
+        if self.do_clear_sessions:
+            self.clear_sessions(django.utils.timezone.now())
+
+    def run(self):
+        while not self.stopped():
+            try:
+                kind, index, data = self.report_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            if kind == "ready":
+                self.ready_shards.add(index)
+                self.ready = len(self.ready_shards) == self.shards
+                logging.debug(f"firehose shard {index} ready - {len(self.ready_shards)}/{self.shards}")
+            elif kind == "sessions":
+                self.update_sessions(data)
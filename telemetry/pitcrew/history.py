@@ -1,14 +1,15 @@
+import os
+import threading
 import time
+from collections import deque
 
 import numpy as np
-import pandas as pd
-from scipy.interpolate import interp1d
 
-from telemetry.analyzer import Analyzer
-from telemetry.fast_lap_analyzer import FastLapAnalyzer
-from telemetry.models import Coach, Driver, FastLap, Game
+from telemetry.models import Coach, Driver, FastLap, Game, LiveFeature
+from telemetry.pitcrew.live_feature_writer import LiveFeatureWriter
 from telemetry.pitcrew.logging_mixin import LoggingMixin
-from telemetry.pitcrew.segment import Segment
+from telemetry.pitcrew.reference_lap import build_segment_index, reference_laps
+from telemetry.pitcrew.segment_features import SegmentFeatures
 from telemetry.racing_stats import RacingStats
 
 
@@ -16,41 +17,87 @@ class History(LoggingMixin):
     def __init__(self):
         self._do_init = False
         self.segments = []
+        self.segment_index = np.empty(0, dtype=np.int32)  # meter -> position in segments
+        self.current_segment = None
         self.previous_update_meters = 0
         self._ready = False
         self._error = None
         self.do_run = True
         self.driver = None
         self.track_length = 0
-        self.telemetry = []
-        self.analyzer = Analyzer()
-        self.fast_lap_analyzer = FastLapAnalyzer()
+        self.segment_features = SegmentFeatures()
         self.racing_stats = RacingStats()
         self.fast_lap = None
-        self.process_segments = []
+        self.reference_lap = None
+        # meter lookup arrays of the reference lap, see ReferenceLap.build_lookup_tables
+        self.distance_lap_time = np.empty(0)
+        self.distance_speed = np.empty(0)
+        self.lap_times = np.empty(0)
+        self.lap_time_distances = np.empty(0, dtype=int)
+        self.lap_time_max = 0
+        self.live_feature_writer = None
+        # live features of the last laps used for coaching
+        self.recent_laps = int(os.environ.get("B4MAD_RACING_LIVE_FEATURES_RECENT_LAPS", 10))
+        # finished segments waiting for feature extraction: (segment, features, enqueued_at)
+        self.process_segments = deque()
+        # guards process_segments and wakes up the worker thread
+        self.work_condition = threading.Condition()
+        # optional Event shared by many histories, set with the condition, e.g. by CoachPool
+        self.work_event = None
+        self.segment_latencies = deque(maxlen=100)  # seconds from segment end to features
         self.threaded = False
         self.session_id = "NO_SESSION"
         self.coach_mode = Coach.MODE_DEFAULT
 
     def disconnect(self):
-        self.do_run = False
+        with self.work_condition:
+            self.do_run = False
+            self.notify_work()
+
+    def notify_work(self):
+        """Wake up the worker, called with work_condition held."""
+        self.work_condition.notify_all()
+        if self.work_event is not None:
+            self.work_event.set()
+
+    def has_work(self):
+        if not self.do_run or self._do_init:
+            return True
+        if self.live_feature_writer and self.live_feature_writer.due():
+            return True
+        return self._ready and len(self.process_segments) > 0
 
     def run(self):
         self.threaded = True
         while self.do_run:
-            time.sleep(0.1)
-            if self._ready:
-                self.do_work()
-            if self._do_init:
-                self.init()
-                self._do_init = False
+            with self.work_condition:
+                self.work_condition.wait_for(self.has_work, timeout=1)
+            self.step()
+        self.flush_live_features()
+
+    def step(self):
+        """Process pending segments or initialize a new session."""
+        if self._ready:
+            self.do_work()
+        if self.live_feature_writer:
+            self.live_feature_writer.maybe_flush()
+        if self._do_init:
+            self.init()
+            self._do_init = False
+
+    def flush_live_features(self):
+        """Write the buffered live features of the driver, e.g. at the end of a session."""
+        if self.live_feature_writer:
+            self.live_feature_writer.flush()
 
     def set_filter(self, filter, coach_mode=Coach.MODE_DEFAULT):
         self._ready = False
         self.filter = filter
         self.session_id = filter.get("SessionId", "NO_SESSION")
         self.coach_mode = coach_mode
-        self._do_init = True
+        with self.work_condition:
+            self._do_init = True
+            self.notify_work()
 
     def set_coach_mode(self, coach_mode):
         self.coach_mode = coach_mode
@@ -70,8 +117,12 @@ class History(LoggingMixin):
     def init(self):
         self._ready = False
         self._error = None
-        self.process_segments = []
-        self.telemetry = []
+        # the previous session ended
+        self.flush_live_features()
+        self.live_feature_writer = None
+        with self.work_condition:
+            self.process_segments.clear()
+        self.segment_features = SegmentFeatures()
 
         try:
             self.driver = Driver.objects.get(name=self.filter["Driver"])
@@ -92,9 +143,9 @@ class History(LoggingMixin):
                 return True
 
     def init_segments(self) -> bool:
-        """Load the segments from DB."""
-        fast_lap = FastLap.objects.filter(track=self.track, car=self.car, game=self.game).first()
-        if not fast_lap or not fast_lap.data or not fast_lap.data.get("segments"):
+        """Load the segments, the prepared reference lap is shared by all coaches of the combination."""
+        reference_lap = reference_laps.get(self.game, self.track, self.car, self.track_length)
+        if not reference_lap or not reference_lap.segments:
             error = f"no data found for game {self.filter['GameName']}"
             error += f" on track {self.filter['TrackCode']}"
             error += f" in car {self.filter['CarModel']}"
@@ -103,48 +154,73 @@ class History(LoggingMixin):
             return False
 
         self.log_debug("loading segments for %s %s - %s", self.game, self.track, self.car)
-        self.log_debug(f"  based on laps {fast_lap.laps.count()}")
 
-        self.segments = fast_lap.data.get("segments")
+        self.reference_lap = reference_lap
+        self.fast_lap = reference_lap.fast_lap
+        self.segments = reference_lap.new_segments(self)
+        self.distance_lap_time = reference_lap.distance_lap_time
+        self.distance_speed = reference_lap.distance_speed
+        self.lap_times = reference_lap.lap_times
+        self.lap_time_distances = reference_lap.lap_time_distances
+        self.lap_time_max = reference_lap.lap_time_max
 
-        for i, segment in enumerate(self.segments):
-            next_index = (i + 1) % len(self.segments)
-            previous_index = (i - 1) % len(self.segments)
-            segment.previous_segment = self.segments[previous_index]
-            segment.next_segment = self.segments[next_index]
-            segment.history = self
-
-        self.fast_lap = fast_lap
-
-        self.build_lookup_tables()
+        self.init_segment_index(reference_lap.segment_index)
 
         # self.log_debug("loaded %s segments", len(self.segments))
         return True
 
+    def init_segment_index(self, segment_index=None):
+        """Use the meter -> segment lookup of the reference lap or build it for the segments."""
+        if segment_index is None or len(segment_index) == 0:
+            segment_index = build_segment_index(self.segments, self.track_length)
+        self.segment_index = segment_index
+        self.current_segment = None
+
+    def segment_at(self, meters):
+        if 0 <= meters < len(self.segment_index):
+            position = self.segment_index[meters]
+            if position >= 0:
+                return self.segments[position]
+        return None
+
+    def in_segment(self, segment, meters):
+        if segment.start <= segment.end:
+            return segment.start <= meters <= segment.end
+        return meters >= segment.start or meters <= segment.end
+
     def init_driver(self):
-        self.driver_fast_lap, created = FastLap.objects.get_or_create(
-            car=self.car, track=self.track, game=self.game, driver=self.driver
+        self.live_feature_writer = LiveFeatureWriter(
+            self.driver, self.game, self.track, self.car, session_id=self.session_id
         )
+        if self.coach_mode == Coach.MODE_TRACK_GUIDE:
+            return True
 
-        driver_data = self.driver_fast_lap.data
-        if not driver_data:
-            segments = {}
+        # only the recent passes are loaded, the averages only look at the last few laps
+        passes = LiveFeature.objects.for_fast_lap(self.driver, self.game, self.track, self.car).recent(
+            laps=self.recent_laps
+        )
+        if passes:
             for segment in self.segments:
-                driver_segment = Segment()
-                driver_segment.copy_from(segment)
-                segments[segment.turn] = driver_segment
-            driver_data = {
-                "segments": segments,
-            }
+                features_by_type = {}
+                for features in passes.get(segment.turn, []):
+                    for type, type_features in features.items():
+                        features_by_type.setdefault(type, []).append(type_features)
+                segment.init_live_features(features_by_type, maxlen=self.recent_laps)
+            return True
+
+        # drivers without live feature rows yet, seed from the legacy pickled FastLap.data
+        driver_fast_lap = FastLap.objects.filter(
+            car=self.car, track=self.track, game=self.game, driver=self.driver
+        ).first()
+        driver_segments = {}
+        if driver_fast_lap and driver_fast_lap.data:
+            driver_segments = driver_fast_lap.data.get("segments", {})
+        else:
             self.log_debug("no driver data found")
-            self.driver_fast_lap.data = driver_data
-
-        driver_segments = self.driver_fast_lap.data.get("segments", {})
-        empty_segment = Segment()
         for segment in self.segments:
-            driver_segment = driver_segments.get(segment.turn, empty_segment)
-            if self.coach_mode != Coach.MODE_TRACK_GUIDE:
-                segment.init_live_features_from_segment(driver_segment)
+            driver_segment = driver_segments.get(segment.turn)
+            features_by_type = driver_segment.live_features if driver_segment else {}
+            segment.init_live_features(features_by_type, maxlen=self.recent_laps)
 
         return True
 
@@ -155,172 +231,142 @@ class History(LoggingMixin):
             data["_time"] = time
             return self.update_telemetry(meters, data)
 
-    def update_telemetry(self, meters, data, depth=0):
-        if depth > len(self.segments):
-            self.log_debug(f"update_telemetry: meters: {meters} no segment found")
+    def update_telemetry(self, meters, data):
+        segment = self.current_segment
+        if segment is not None and self.in_segment(segment, meters):
+            self.segment_features.add(data)
+            self.previous_update_meters = meters
             return
 
-        segment = self.segments[0]
-        start = segment.start
-        end = segment.end
-
-        if start < end:
-            in_segment = start <= meters <= end
-        else:
-            in_segment = meters >= start or meters <= end
+        work_to_do = False
+        if segment is not None and len(self.segment_features) > 0:
+            with self.work_condition:
+                self.process_segments.append((segment, self.segment_features, time.monotonic()))
+                self.notify_work()
+            self.segment_features = SegmentFeatures()
+            work_to_do = True
 
-        if in_segment:
-            self.telemetry.append(data)
-            self.previous_update_meters = meters
-        else:
-            work_to_do = False
-            if len(self.telemetry) > 0:
-                segment.live_telemetry.append(self.telemetry)
-                self.process_segments.append(segment)
-                self.telemetry = []
-                work_to_do = True
-
-            self.segments.append(self.segments.pop(0))
-            self.update_telemetry(meters, data, depth + 1)
+        self.current_segment = self.segment_at(meters)
+        if self.current_segment is None:
+            self.log_debug(f"update_telemetry: meters: {meters} no segment found")
             return work_to_do
 
+        self.segment_features.add(data)
+        self.previous_update_meters = meters
+        return work_to_do
+
     def do_work(self):
         # self.log_debug(f"do work")
-        while len(self.process_segments) > 0:
-            segment = self.process_segments.pop(0)
-            log_prefix = f"processing segment {segment.turn} "
-            if len(segment.live_telemetry) == 0:
-                self.log_error(f"{log_prefix} no telemetry for segment")
-                continue
+        while True:
+            with self.work_condition:
+                if len(self.process_segments) == 0:
+                    break
+                (segment, features, enqueued_at) = self.process_segments.popleft()
 
-            telemetry = segment.live_telemetry.pop(0)
-            if len(telemetry) == 0:
+            log_prefix = f"processing segment {segment.turn} "
+            if len(features) == 0:
                 self.log_error(f"{log_prefix} no data in telemetry")
                 continue
 
-            # lap_number = telemetry[0].get("CurrentLap")
-            # self.log_debug(f"   lap: {lap_number}")
-
-            df = pd.DataFrame.from_records(telemetry)
-            df = self.fast_lap_analyzer.preprocess(df)
-
-            brake_features = self.fast_lap_analyzer.brake_features(df)
-            throttle_features = self.fast_lap_analyzer.throttle_features(df)
-            gear_features = self.fast_lap_analyzer.gear_features(df)
-            sector_time = self.analyzer.sector_time(df)
-            sector_lap_time = self.analyzer.sector_lap_time(df)
-            other_features = {
-                "sector_time": sector_time,
-                "sector_lap_time": sector_lap_time,
-            }
+            # the ticks were collected column wise while driving, same features as
+            # FastLapAnalyzer.preprocess and the analyzer feature functions on a DataFrame
+            brake_features = features.brake_features()
+            throttle_features = features.throttle_features()
+            gear_features = features.gear_features()
+            other_features = features.other_features()
 
             segment.add_live_features(brake_features, type="brake")
             segment.add_live_features(throttle_features, type="throttle")
             segment.add_live_features(gear_features, type="gear")
             segment.add_live_features(other_features, type="other")
 
-            # FIXME: this produces a lot of large updates in the database
-            #        * refactor the DB design to store the data in a more efficient way
-            #        * store the data in a document database like MongoDB
-            driver_segment = self.driver_fast_lap.data["segments"][segment.turn]
-            driver_segment.add_live_features(brake_features, type="brake")
-            driver_segment.add_live_features(throttle_features, type="throttle")
-            driver_segment.add_live_features(gear_features, type="gear")
-            driver_segment.add_live_features(other_features, type="other")
-            self.driver_fast_lap.save()
-
-            segment.live_telemetry_frames.append(df)
-
-            self.log_debug(f"{log_prefix} driver delta: {segment.driver_delta()}")
-
-    def build_lookup_tables(self):
-        """Build lookup tables for fast lap data."""
-        df = self.fast_lap.data.get("distance_time")
-        # df is a pandas dataframe with CurrentLapTime, SpeedMs and DistanceRoundTrack as columns
-        # 1. round DistanceRoundTrack to integer
-        # 2. create a dictionary with DistanceRoundTrack as key and SpeedMs as value
-
-        min_distance = 0
-        max_distance = self.track_length
-        target_rows = max_distance + 1
-
-        new_distance_round_track = np.linspace(min_distance, max_distance, target_rows)
-        new_distance_round_track = np.round(new_distance_round_track, decimals=0).astype(int)
-
-        resampled_df = pd.DataFrame({"DistanceRoundTrack": new_distance_round_track})
-
-        for column in ["CurrentLapTime", "SpeedMs"]:
-            interp = interp1d(
-                df["DistanceRoundTrack"], df[column], kind="nearest", bounds_error=False, fill_value="extrapolate"
+            # buffered and written on a time / size budget, see LiveFeatureWriter
+            self.live_feature_writer.add(
+                segment.turn,
+                {
+                    "brake": brake_features,
+                    "throttle": throttle_features,
+                    "gear": gear_features,
+                    "other": other_features,
+                },
             )
-            interpolated_values = interp(new_distance_round_track)
-
-            if np.issubdtype(df[column].dtype, np.integer):
-                interpolated_values = np.round(interpolated_values).astype(int)
-
-            resampled_df[column] = interpolated_values
-
-        df = resampled_df
-
-        # Create dictionary with DistanceRoundTrack as key and SpeedMs as value
-        self.map_distance_speed = dict(zip(df["DistanceRoundTrack"], df["SpeedMs"]))
-        # Create dictionary with DistanceRoundTrack as key and CurrentLapTime as value
-        self.map_distance_time = dict(zip(df["DistanceRoundTrack"], df["CurrentLapTime"]))
-        # Create dictionary with CurrentLapTime as key and DistanceRoundTrack as value
-        self.map_time_distance = dict(zip(df["CurrentLapTime"], df["DistanceRoundTrack"]))
-        self.map_time_distance_max = max(self.map_time_distance.keys())
+            self.live_feature_writer.maybe_flush()
+
+            segment.live_telemetry_frames.append(features.resampled)
+
+            latency = time.monotonic() - enqueued_at
+            self.segment_latencies.append(latency)
+            self.log_debug(f"{log_prefix} driver delta: {segment.driver_delta()} - latency: {latency * 1000:.0f} ms")
+
+    def segment_latency(self):
+        """Return stats of the time from the end of a segment until its features are available."""
+        latencies = list(self.segment_latencies)
+        if not latencies:
+            return None
+        return {
+            "count": len(latencies),
+            "mean": sum(latencies) / len(latencies),
+            "max": max(latencies),
+        }
+
+    def meter_index(self, distance):
+        """Return the index into the meter lookup arrays or None for fractional or unknown distances."""
+        meters = int(distance)
+        if meters != distance or meters < 0 or meters >= len(self.distance_lap_time):
+            return None
+        return meters
 
     def lap_time_at_distance(self, distance):
-        lap_time = self.map_distance_time.get(distance, 0.0)
+        index = self.meter_index(distance)
+        lap_time = self.distance_lap_time[index] if index is not None else 0.0
         if lap_time == 0.0:
-            self.log_error(f"no lap_time at {distance} - map: {self.map_distance_time}")
+            self.log_error(f"no lap_time at {distance}")
         return lap_time
 
-    def speed_at_distance(self, distance):
-        speed = self.map_distance_speed.get(distance, 0.0)
-        if speed == 0.0:
-            self.log_error(f"no speed at {distance} - map: {self.map_distance_speed}")
+    def speed_at_distance(self, distance, log_missing=True):
+        index = self.meter_index(distance)
+        speed = self.distance_speed[index] if index is not None else 0.0
+        if speed == 0.0 and log_missing:
+            self.log_error(f"no speed at {distance}")
         return speed
 
     def distance_at_lap_time(self, lap_time):
-        distance = self.map_time_distance.get(lap_time, None)
-        if distance is None:
-            keys = self.map_time_distance.keys()
-            # get the closest key
-            # FIXME: this is probably too expensive, maybe have multiple lookup tables,
-            #        with different resolutions, 3 decimals, 2 decimals, 1 decimal, integer
-            closest_key = min(keys, key=lambda x: abs(x - lap_time))
-            distance = self.map_time_distance[closest_key]
-        return distance
+        """Return the meter of the closest lap time, of two equally close the lower one."""
+        lap_times = self.lap_times
+        if len(lap_times) == 0:
+            return None
+        index = int(np.searchsorted(lap_times, lap_time))
+        if index == len(lap_times) or (index > 0 and lap_time - lap_times[index - 1] <= lap_times[index] - lap_time):
+            index -= 1
+        return self.lap_time_distances[index]
 
     def distance_add(self, distance, meters):
         return (distance + meters) % self.track_length
 
     def distance_add_seconds(self, distance, seconds):
         time_at_distance = self.lap_time_at_distance(distance)
-        target_time = (time_at_distance + seconds) % self.map_time_distance_max
+        # wraps around the start / finish line
+        target_time = (time_at_distance + seconds) % self.lap_time_max
         return self.distance_at_lap_time(target_time)
 
     def offset_distance(self, distance, seconds=0.0):
+        """Return the last meter before distance that is reached seconds earlier, wraps around the start line."""
         self.log_debug(f"offset_distance from {distance} {seconds:.2f}")
-        if self.fast_lap.data:
-            distance_time = self.fast_lap.data.get("distance_time", {})
-            # check if distance_time is a pandas dataframe
-            if isinstance(distance_time, pd.DataFrame):
-                # check if index at distance exists
-                distance = round(distance)
-                if distance < len(distance_time):
-                    lap_time = distance_time.loc[distance]["CurrentLapTime"]
-                    lap_time_at_offset = lap_time - seconds
-
-                    if lap_time_at_offset < 0:
-                        # FIXME wrap around and start counting back from the end of the track
-                        return 0
-
-                    # loop backwards until we find the first index where CurrentLapTime is smaller than offset
-                    while lap_time > lap_time_at_offset and distance > 0:
-                        distance -= 1
-                        lap_time = distance_time.loc[distance]["CurrentLapTime"]
+        lap_times = self.distance_lap_time
+        distance = round(distance)
+        if 0 <= distance < len(lap_times):
+            lap_time_at_offset = lap_times[distance] - seconds
+            if lap_time_at_offset >= 0:
+                # the first meter going backwards with a smaller lap time, or the start line
+                reached = lap_times[distance::-1] <= lap_time_at_offset
+                index = int(reached.argmax())
+                distance = distance - index if reached[index] else 0
+            else:
+                # continue counting back from the end of the track
+                lap_time_at_offset += self.lap_time_max
+                reached = lap_times[:distance:-1] <= lap_time_at_offset
+                index = int(reached.argmax())
+                distance = len(lap_times) - 1 - index if len(reached) and reached[index] else 0
         self.log_debug(f"offset_distance   to {distance} {seconds:.2f}")
         return distance
 
@@ -0,0 +1,125 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+
+class Ingest:
+    """Bounded per-topic queue between the MQTT network thread and the observer.
+
+    The MQTT thread only enqueues decoded payloads, a worker thread hands them to the
+    observer. When the observer falls behind, the overload policy decides what happens:
+
+    - POLICY_DROP_OLDEST: drop the oldest queued tick of the topic
+    - POLICY_COALESCE: keep only the latest tick of the topic
+    - POLICY_BLOCK: block the MQTT thread until there is room again
+    """
+
+    POLICY_DROP_OLDEST = "drop_oldest"
+    POLICY_COALESCE = "coalesce"
+    POLICY_BLOCK = "block"
+    POLICIES = [POLICY_DROP_OLDEST, POLICY_COALESCE, POLICY_BLOCK]
+
+    def __init__(self, handler, maxsize=None, policy=None):
+        self.handler = handler
+        self.maxsize = maxsize or int(os.environ.get("B4MAD_RACING_INGEST_QUEUE_SIZE", 600))
+        self.policy = policy or os.environ.get("B4MAD_RACING_INGEST_POLICY", self.POLICY_BLOCK)
+        if self.policy not in self.POLICIES:
+            raise ValueError(f"unknown ingest policy {self.policy}")
+
+        self.queues = {}  # topic -> deque of payloads
+        self.pending = deque()  # topics with queued payloads, in arrival order
+        self.condition = threading.Condition()
+
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.log_interval = 60  # seconds
+        self._last_log = time.monotonic()
+
+        self._stop_event = threading.Event()
+        self.ready = False
+
+    def stop(self):
+        self._stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "queued": sum(len(q) for q in self.queues.values()),
+        }
+
+    def put(self, topic, payload):
+        with self.condition:
+            self.received += 1
+            q = self.queues.setdefault(topic, deque())
+
+            if self.policy == self.POLICY_COALESCE:
+                if q:
+                    q[-1] = payload
+                    self.coalesced += 1
+                    return
+            elif len(q) >= self.maxsize:
+                if self.policy == self.POLICY_DROP_OLDEST:
+                    q.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self.queues.get(topic, ())) >= self.maxsize and not self.stopped():
+                        self.condition.wait(timeout=1)
+                    # the worker might have drained and removed the queue while we waited
+                    q = self.queues.setdefault(topic, deque())
+
+            if not q:
+                self.pending.append(topic)
+            q.append(payload)
+            self.condition.notify_all()
+
+    def get(self, timeout=1):
+        """Return the next (topic, payload), serving topics round robin."""
+        with self.condition:
+            while not self.pending:
+                if self.stopped():
+                    return None
+                if not self.condition.wait(timeout=timeout):
+                    return None
+
+            topic = self.pending.popleft()
+            q = self.queues[topic]
+            payload = q.popleft()
+            if q:
+                self.pending.append(topic)
+            else:
+                del self.queues[topic]
+            self.condition.notify_all()
+            return (topic, payload)
+
+    def log_stats(self):
+        now = time.monotonic()
+        if now - self._last_log < self.log_interval:
+            return
+        self._last_log = now
+        logging.info(f"ingest {self.policy}: {self.stats()}")
+
+    def run(self):
+        self.ready = True
+        while not self.stopped():
+            item = self.get()
+            if item is None:
+                continue
+            (topic, payload) = item
+            try:
+                self.handler(topic, payload)
+            except Exception as e:
+                logging.exception(f"Error handling {topic}: {e}")
+            self.processed += 1
+            self.log_stats()
@@ -0,0 +1,140 @@
+"""Detect the laps of a recorded session at once.
+
+``Session.analyze`` and ``SessionRbr.analyze`` find the laps tick by tick while
+telemetry is streamed. To rebuild laps from recorded sessions, ``detect_laps`` applies
+the same rules to whole columns of a session (e.g. a DataFrame) with numpy and returns
+the same ``Lap`` objects as ``session.laps``.
+"""
+
+import numpy as np
+
+from .session import Lap
+
+FIELDS = (
+    "DistanceRoundTrack",
+    "CurrentLap",
+    "CurrentLapTime",
+    "LapTimePrevious",
+    "CurrentLapIsValid",
+    "PreviousLapWasValid",
+)
+RBR_FIELDS = ("DistanceRoundTrack", "CurrentLap", "CurrentLapTime")
+
+
+def to_float(values):
+    """Return the values as float array, None is NaN."""
+    return np.array(values, dtype=float)
+
+
+def changed(values, initial):
+    """Mask of the values different from the value before, NaN equals NaN like None equals None."""
+    previous = np.concatenate(([initial], values[:-1]))
+    same = (values == previous) | (np.isnan(values) & np.isnan(previous))
+    return ~same
+
+
+def run_lengths(mask):
+    """Length of the run of True values ending at each position, 0 where mask is False."""
+    count = np.cumsum(mask)
+    resets = np.maximum.accumulate(np.where(mask, 0, count))
+    return count - resets
+
+
+def nan_none(value):
+    return None if np.isnan(value) else value
+
+
+def detect_laps(columns, rbr=False):
+    """Return the laps of a session by lap number, like ``session.laps`` after replaying it.
+
+    ``columns`` maps the telemetry fields and ``_time`` to sequences in time order.
+    """
+    fields = RBR_FIELDS if rbr else FIELDS
+    if any(field not in columns for field in fields + ("_time",)):
+        # analyze ignores every tick with missing fields
+        return {}
+
+    data = {field: to_float(columns[field]) for field in fields}
+    times = np.asarray(columns["_time"], dtype=object)
+    if rbr:
+        required = RBR_FIELDS
+    else:
+        required = ("DistanceRoundTrack", "CurrentLap", "CurrentLapTime", "CurrentLapIsValid")
+    # ticks with None in these fields are skipped, they don't change the state either
+    ticks = np.ones(len(times), dtype=bool)
+    for field in required:
+        ticks &= ~np.isnan(data[field])
+    data = {field: values[ticks] for field, values in data.items()}
+    times = times[ticks]
+    if len(times) == 0:
+        return {}
+
+    if rbr:
+        return detect_rbr_lap(data, times)
+    return detect_circuit_laps(data, times)
+
+
+def detect_circuit_laps(data, times):
+    distance = data["DistanceRoundTrack"]
+    lap_numbers = data["CurrentLap"]
+
+    # the first lap starts when crossing the finish line
+    previous_distance = np.concatenate(([-1.0], distance[:-1]))
+    crossed = np.flatnonzero((distance < previous_distance) & (distance < 100))
+    if len(crossed) == 0:
+        return {}
+    first = crossed[0]
+
+    # then a new lap starts whenever the lap number increases
+    numbers = lap_numbers[first:]
+    highest = np.maximum.accumulate(numbers)
+    increased = np.flatnonzero(numbers[1:] > highest[:-1]) + 1
+    starts = np.concatenate(([0], increased)) + first
+    ends = np.append(starts[1:], len(distance))
+
+    lengths = np.maximum(np.maximum.reduceat(distance, starts), -1)
+    current_valid = data["CurrentLapIsValid"][ends - 1]
+
+    # a changed LapTimePrevious finishes the previous lap, the last change in a lap wins
+    lap_time_previous = data["LapTimePrevious"]
+    changes = np.flatnonzero(changed(lap_time_previous, -1.0))
+    changes = changes[changes >= starts[0]]
+    finishing = np.searchsorted(starts, changes, side="right") - 2
+    finished = {}
+    for change, lap in zip(changes, finishing):
+        if lap >= 0:
+            finished[lap] = change
+
+    laps = {}
+    for i, start in enumerate(starts):
+        end = ends[i] if i + 1 < len(starts) else start
+        lap = Lap(int(lap_numbers[start]), start=times[start], end=times[end])
+        lap.length = lengths[i]
+        lap.valid = bool(current_valid[i])
+        if i in finished:
+            change = finished[i]
+            lap.time = nan_none(lap_time_previous[change])
+            previous_valid = nan_none(data["PreviousLapWasValid"][change])
+            lap.valid = previous_valid if previous_valid is None else bool(previous_valid)
+            lap.finished = True
+        laps[lap.number] = lap
+    return laps
+
+
+def detect_rbr_lap(data, times):
+    """RBR has only one lap, it is finished when the time stops while the distance keeps increasing."""
+    distance = data["DistanceRoundTrack"]
+    lap_time = data["CurrentLapTime"]
+
+    time_not_updated = run_lengths(~changed(lap_time, -1.0))
+    distance_updated = run_lengths(distance > np.concatenate(([100_000_000], distance[:-1])))
+    finished = np.flatnonzero((time_not_updated > 10) & (distance_updated > 10))
+
+    lap = Lap(int(data["CurrentLap"][0]), start=times[0], end=times[0])
+    lap.valid = True
+    lap.length = max(distance.max(), -1)
+    lap.time = lap_time[-1]
+    if len(finished):
+        lap.finished = True
+        lap.end = times[finished[-1]]
+    return {lap.number: lap}
@@ -0,0 +1,96 @@
+import logging
+import math
+import os
+import threading
+import time
+
+from telemetry.models import LiveFeature
+
+
+def json_features(value):
+    """Make features JSON safe, NaN is stored as None."""
+    if isinstance(value, dict):
+        return {key: json_features(v) for key, v in value.items()}
+    if isinstance(value, float):
+        return None if math.isnan(value) else float(value)
+    if hasattr(value, "item"):
+        # numpy scalar
+        return json_features(value.item())
+    return value
+
+
+class LiveFeatureWriter:
+    """Write-behind buffer for the live features of a driver.
+
+    History adds the features of every finished segment here. They are appended as
+    LiveFeature rows when ``max_pending`` segment features are buffered,
+    ``flush_interval`` seconds passed since the last write, or the session ends (``flush``).
+    Each flush is a single bulk insert of the new rows.
+
+    Crash semantics: features not flushed yet are lost if the process dies, i.e. at most
+    ``flush_interval`` seconds or ``max_pending`` segments of a driver's live features.
+    Coaching in the running session is not affected, it reads the in-memory segments.
+    A failed write keeps the newest ``max_pending`` features pending and is retried after
+    ``flush_interval`` seconds, the older features are dropped while the database is down.
+    """
+
+    def __init__(self, driver, game, track, car, session_id="", flush_interval=None, max_pending=None):
+        self.driver = driver
+        self.game = game
+        self.track = track
+        self.car = car
+        self.session_id = session_id
+        self.flush_interval = flush_interval or int(os.environ.get("B4MAD_RACING_LIVE_FEATURES_FLUSH_INTERVAL", 60))
+        self.max_pending = max_pending or int(os.environ.get("B4MAD_RACING_LIVE_FEATURES_MAX_PENDING", 50))
+        self.pending = []  # unsaved LiveFeature rows
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self.retry_after = 0  # monotonic time before which a failed write is not retried
+        self.flushes = 0
+        self.flushed_features = 0
+        self.dropped_features = 0
+
+    def add(self, turn, features_by_type):
+        row = LiveFeature(
+            driver=self.driver,
+            game=self.game,
+            track=self.track,
+            car=self.car,
+            turn=turn,
+            session_id=self.session_id,
+            features=json_features(features_by_type),
+        )
+        with self.lock:
+            self.pending.append(row)
+
+    def due(self):
+        if time.monotonic() < self.retry_after:
+            return False
+        if len(self.pending) >= self.max_pending:
+            return True
+        return len(self.pending) > 0 and time.monotonic() - self.last_flush >= self.flush_interval
+
+    def maybe_flush(self):
+        if self.due():
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            try:
+                LiveFeature.objects.bulk_create(self.pending)
+            except Exception as e:
+                logging.error(f"Error saving live features of {self.driver}: {e}")
+                self.retry_after = time.monotonic() + self.flush_interval
+                dropped = len(self.pending) - self.max_pending
+                if dropped > 0:
+                    del self.pending[:dropped]
+                    self.dropped_features += dropped
+                    logging.warning(f"Dropped {dropped} live features of {self.driver}")
+                return
+            self.flushes += 1
+            self.flushed_features += len(self.pending)
+            self.pending = []
+            self.last_flush = time.monotonic()
+            self.retry_after = 0
@@ -1,6 +1,7 @@
 from telemetry.models import Coach
 
 from .segment import Segment
+from .snippet import AT_NAMES, EVAL_NAMES, SCORE_NAMES, SnippetError, check_note, compile_snippet
 
 
 class Message:
@@ -107,6 +108,10 @@ class Message:
             if self.needs_coaching():
                 return self.resp(self.at, self.msg)
 
+    def trigger_distances(self):
+        """Return the distances where response_hot_lap can respond, see Coach.init_schedule."""
+        return (self.at,)
+
     def response_track_walk(self, distance, telemetry):
         if distance == self.at_track_walk:
             return self.resp(self.at_track_walk, self.msg)
@@ -450,6 +455,10 @@ class MessageTrackGuideNotes(Message):
             self.note_play_counter[self.current_note] += 1
             return self.resp(self.at, self.msg)
 
+    def trigger_distances(self):
+        # scoring the notes moves self.at
+        return (self.segment.previous_segment.start, self.at)
+
     def score_notes(self):
         # score every note
         score_logs = []
@@ -496,6 +505,11 @@ class MessageTrackGuideNotes(Message):
         self.eval_notes = {}
         self.notes = []
         for note in notes:
+            try:
+                check_note(note)
+            except SnippetError as e:
+                self.log_debug(f"discarding note: {e}")
+                continue
             if note.ref_eval:
                 if note.ref_eval not in self.eval_notes:
                     self.eval_notes[note.ref_id] = []
@@ -504,6 +518,10 @@ class MessageTrackGuideNotes(Message):
                 self.notes.append(note)
                 self.note_play_counter[note] = 1
 
+        if not self.notes:
+            self.active = False
+            return
+
         # sort notes by priority
         self.notes.sort(key=lambda x: x.priority)
 
@@ -560,42 +578,14 @@ class MessageTrackGuideNotes(Message):
     #     return True
 
     def eval_score(self, snippet):
-        globals = {
-            "brake_point": self.segment.score_brake_point,
-            "apex": self.segment.score_apex,
-            "gear": self.segment.score_gear,
-            "brake_force": self.segment.score_brake_force,
-            "turn_in": self.segment.score_turn_in,
-            "throttle_force": self.segment.score_throttle_force,
-        }
-        return self.eval(snippet, globals)
+        return self.eval(snippet, SCORE_NAMES)
 
     def eval_at(self, snippet):
-        globals = {
-            "brake_point": self.segment.brake_point,
-            "apex": self.segment.apex,
-            "gear": self.segment.gear_distance,
-            "turn_in": self.segment.turn_in,
-        }
-        return self.eval(snippet, globals)
-
-    def eval(self, snippet, globals=None):
-        globals = globals or {
-            "segment": self.segment,
-            "brake_point": self.segment.brake_point,
-            "apex": self.segment.apex,
-            "brake_point_diff": self.segment.brake_point_diff,
-            "apex_diff": self.segment.apex_diff,
-            "gear_diff": self.segment.gear_diff,
-            "coach_brake_force": self.segment.coach_brake_force,
-            "coach_turn_in": self.segment.coach_turn_in,
-            "coach_brake_point": self.segment.coach_brake_point,
-            "coach_gear": self.segment.coach_gear,
-            "coach_apex": self.segment.coach_apex,
-            "coach_throttle_force": self.segment.coach_throttle_force,
-        }
+        return self.eval(snippet, AT_NAMES)
+
+    def eval(self, snippet, names=EVAL_NAMES):
         try:
-            rv = eval(snippet, globals)  # nosec
+            rv = compile_snippet(snippet).eval(self.segment, names)
             self.log_debug(f"eval: {snippet} -> {rv}")
             return rv
         except Exception as e:
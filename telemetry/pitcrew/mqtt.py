@@ -1,39 +1,39 @@
 #!/usr/bin/env python3
 
-import json
 import logging
 import threading
 
 import paho.mqtt.client as mqtt
 
-from telemetry.utils import get_mqtt_config
+from telemetry.utils import get_mqtt_config, shard_for_topic
 
-_LOGGER = logging.getLogger(__name__)
+from .ingest import Ingest
+from .telemetry_decoder import TelemetryDecoder
 
-(
-    B4MAD_RACING_MQTT_HOST,
-    B4MAD_RACING_MQTT_PORT,
-    B4MAD_RACING_MQTT_USER,
-    B4MAD_RACING_MQTT_PASSWORD,
-) = get_mqtt_config()
+_LOGGER = logging.getLogger(__name__)
 
 
 class Mqtt:
-    def __init__(self, observer, topic, replay: bool = False, debug=False):
+    def __init__(self, observer, topic, replay: bool = False, debug=False, partition=None, ingest=False):
         mqttc = mqtt.Client()
         mqttc.on_message = self.on_message
         mqttc.on_connect = self.on_connect
         mqttc.on_publish = self.on_publish
         mqttc.on_subscribe = self.on_subscribe
-        mqttc.username_pw_set(B4MAD_RACING_MQTT_USER, B4MAD_RACING_MQTT_PASSWORD)
         self.mqttc = mqttc
         self.do_disconnect = False
         self.replay = replay
         self.topic = topic
         self.observer = observer
+        # observers can ask for a projection of the telemetry fields they read
+        self.decoder = TelemetryDecoder(getattr(observer, "TELEMETRY_FIELDS", None))
         self._stop_event = threading.Event()
         self.ready = False
         self.debug = debug
+        # (index, count) - only handle topics of drivers hashed into this partition
+        self.partition = partition
+        # decouple the network loop from the observer with a bounded queue
+        self.ingest = Ingest(self.dispatch) if ingest else None
 
     # def __del__(self):
     #     # disconnect from broker
@@ -43,6 +43,8 @@ class Mqtt:
 
     def stop(self):
         self._stop_event.set()
+        if self.ingest:
+            self.ingest.stop()
 
     def stopped(self):
         return self._stop_event.is_set()
@@ -71,13 +73,29 @@ class Mqtt:
             # remove replay/ prefix from session
             topic = topic[7:]
 
+        if self.partition:
+            # all shards receive every message, skip the other shards' drivers before decoding
+            (index, count) = self.partition
+            if shard_for_topic(topic, count) != index:
+                return
+
         try:
-            payload = json.loads(msg.payload.decode("utf-8")).get("telemetry")
+            payload = self.decoder.decode(msg.payload)
         except Exception as e:
             logging.error("Error decoding payload: %s", e)
             return
 
+        if self.ingest:
+            self.ingest.put(topic, payload)
+        else:
+            self.dispatch(topic, payload)
+
+    def dispatch(self, topic, payload):
+        """Notify the observer and publish its responses."""
         response = self.observer.notify(topic, payload)
+        self.publish_response(response, payload)
+
+    def publish_response(self, response, payload):
         if response:
             (r_topic, r_payload) = response
             payloads = r_payload
@@ -87,7 +105,7 @@ class Mqtt:
             for r_payload in payloads:
                 meters = payload.get("DistanceRoundTrack", 0)
                 logging.debug("r-->: %s: %s : %s", meters, r_topic, r_payload)
-                mqttc.publish(r_topic, r_payload)
+                self.mqttc.publish(r_topic, r_payload)
 
     def on_connect(self, mqttc, obj, flags, rc):
         _LOGGER.debug("on_connect rc: %s", str(rc))
@@ -113,13 +131,25 @@ class Mqtt:
         pass
 
     def run(self):
-        self.mqttc.connect(B4MAD_RACING_MQTT_HOST, B4MAD_RACING_MQTT_PORT, 60)
+        # the config is read on connect, so the module can be imported without it
+        (host, port, user, password) = get_mqtt_config()
+        self.mqttc.username_pw_set(user, password)
+        self.mqttc.connect(host, port, 60)
         # topic = f"crewchief/{self.driver}/#"
         if self.replay:
             self.topic = f"replay/{self.topic}"
 
+        if self.ingest:
+            t = threading.Thread(target=self.ingest.run)
+            t.name = f"ingest-{threading.current_thread().name}"
+            t.start()
+
         self.mqttc.loop_forever()
 
+        if self.ingest:
+            self.ingest.stop()
+            t.join(timeout=60)
+
 
 # if __name__ == "__main__":
 #     _LOGGER.info("Starting MQTT client")
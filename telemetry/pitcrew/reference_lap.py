@@ -0,0 +1,203 @@
+import copy
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from scipy.interpolate import interp1d
+
+from telemetry.models import FastLap
+
+from .feature_buffer import FeatureBuffer
+
+
+class ReferenceLap:
+    """The prepared reference data of a game / track / car combination.
+
+    Holds the decoded reference FastLap, its segments and the meter lookup tables. It is
+    shared by all coaches driving the combination and must not be modified, every History
+    gets its own copies of the segments with ``new_segments``.
+    """
+
+    def __init__(self, fast_lap, track_length, version=None):
+        self.fast_lap = fast_lap
+        # the ReferenceLapCache version of the reference FastLaps it was built from
+        self.version = version
+        self.track_length = track_length
+        self.data = fast_lap.get_data()
+        self.segments = self.data.get("segments") if self.data else None
+        # lap time and speed by meter
+        self.distance_lap_time = np.empty(0)
+        self.distance_speed = np.empty(0)
+        # sorted unique lap times and the meter of each
+        self.lap_times = np.empty(0)
+        self.lap_time_distances = np.empty(0, dtype=int)
+        self.lap_time_max = 0
+        # meter -> position in segments, shared read only by all History instances
+        self.segment_index = np.empty(0, dtype=np.int32)
+
+    def new_segments(self, history):
+        """Return fresh segments for a History, the reference features are shared."""
+        segments = []
+        for prototype in self.segments:
+            segment = copy.copy(prototype)
+            segment.history = history
+            segment.live_telemetry_frames = []
+            segment.live_features = {type: FeatureBuffer() for type in ("brake", "throttle", "gear", "other")}
+            segment.live_features_maxlen = None
+            segments.append(segment)
+
+        for i, segment in enumerate(segments):
+            segment.previous_segment = segments[(i - 1) % len(segments)]
+            segment.next_segment = segments[(i + 1) % len(segments)]
+        return segments
+
+    def build_lookup_tables(self):
+        """Build the meter lookup arrays for the fast lap data."""
+        df = self.data.get("distance_time")
+        # df is a pandas dataframe with CurrentLapTime, SpeedMs and DistanceRoundTrack as columns
+        # 1. round DistanceRoundTrack to integer
+        # 2. create a dictionary with DistanceRoundTrack as key and SpeedMs as value
+
+        min_distance = 0
+        max_distance = self.track_length
+        target_rows = max_distance + 1
+
+        new_distance_round_track = np.linspace(min_distance, max_distance, target_rows)
+        new_distance_round_track = np.round(new_distance_round_track, decimals=0).astype(int)
+
+        resampled_df = pd.DataFrame({"DistanceRoundTrack": new_distance_round_track})
+
+        for column in ["CurrentLapTime", "SpeedMs"]:
+            interp = interp1d(
+                df["DistanceRoundTrack"], df[column], kind="nearest", bounds_error=False, fill_value="extrapolate"
+            )
+            interpolated_values = interp(new_distance_round_track)
+
+            if np.issubdtype(df[column].dtype, np.integer):
+                interpolated_values = np.round(interpolated_values).astype(int)
+
+            resampled_df[column] = interpolated_values
+
+        self.distance_lap_time = resampled_df["CurrentLapTime"].to_numpy()
+        self.distance_speed = resampled_df["SpeedMs"].to_numpy()
+
+        # for the reverse lookup sort by lap time, of equal lap times the last meter wins
+        lap_times = self.distance_lap_time
+        distances = new_distance_round_track
+        valid = ~np.isnan(lap_times)
+        order = np.argsort(lap_times[valid], kind="stable")
+        lap_times = lap_times[valid][order]
+        distances = distances[valid][order]
+        last = np.append(lap_times[1:] != lap_times[:-1], True)
+        self.lap_times = lap_times[last]
+        self.lap_time_distances = distances[last]
+        self.lap_time_max = self.lap_times[-1] if len(self.lap_times) else 0
+
+        self.segment_index = build_segment_index(self.segments, self.track_length)
+        unset = int(np.count_nonzero(self.segment_index < 0))
+        if unset:
+            logging.debug(f"{unset} distances not assigned to a segment")
+
+
+def build_segment_index(segments, track_length):
+    """Return a read only array of the position of the segment at each meter, -1 for none.
+
+    Segments can wrap around the start/finish line, on shared boundaries the first
+    segment wins.
+    """
+    length = max([int(track_length)] + [segment.end + 1 for segment in segments])
+    index = np.full(length, -1, dtype=np.int32)
+    # assign in reverse so earlier segments overwrite later ones
+    for position in range(len(segments) - 1, -1, -1):
+        segment = segments[position]
+        if segment.start <= segment.end:
+            index[segment.start : segment.end + 1] = position
+        else:
+            index[segment.start :] = position
+            index[: segment.end + 1] = position
+    index.flags.writeable = False
+    return index
+
+
+class ReferenceLapCache:
+    """Process wide LRU cache of ReferenceLap by (game id, track id, car id).
+
+    A hit is checked against the latest modification time and the number of the reference
+    FastLaps with an aggregate query that does not load the data, so a FastLap saved by ``analyze`` in another
+    process is picked up on the next session start. Saves in this process invalidate the
+    entry right away.
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size or int(os.environ.get("B4MAD_RACING_REFERENCE_LAP_CACHE_SIZE", 32))
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def fast_laps(self, game, track, car):
+        # the reference laps are not bound to a driver
+        return FastLap.objects.filter(game=game, track=track, car=car, driver=None)
+
+    def version(self, game, track, car):
+        """Return the version of the reference FastLaps or None if there are none."""
+        version = self.fast_laps(game, track, car).aggregate(modified=Max("modified"), count=Count("id"))
+        if not version["count"]:
+            return None
+        return (version["modified"], version["count"])
+
+    def get(self, game, track, car, track_length):
+        """Return the ReferenceLap of a combination or None if there is no reference FastLap."""
+        key = (game.id, track.id, car.id)
+        version = self.version(game, track, car)
+        if version is None:
+            self.invalidate(*key)
+            return None
+
+        with self.lock:
+            reference_lap = self.entries.get(key)
+            if reference_lap and reference_lap.version == version and reference_lap.track_length == track_length:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return reference_lap
+
+        # build outside of the lock, concurrent misses for the same key just build twice
+        fast_lap = self.fast_laps(game, track, car).first()
+        if fast_lap is None:
+            return None
+        reference_lap = ReferenceLap(fast_lap, track_length, version)
+        if reference_lap.segments:
+            reference_lap.build_lookup_tables()
+            logging.debug(f"reference lap {key} based on laps {fast_lap.laps.count()}")
+
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = reference_lap
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return reference_lap
+
+    def invalidate(self, game_id, track_id, car_id):
+        with self.lock:
+            self.entries.pop((game_id, track_id, car_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+reference_laps = ReferenceLapCache()
+
+
+def invalidate_reference_lap(sender, instance, **kwargs):
+    reference_laps.invalidate(instance.game_id, instance.track_id, instance.car_id)
+
+
+post_save.connect(invalidate_reference_lap, sender=FastLap)
+post_delete.connect(invalidate_reference_lap, sender=FastLap)
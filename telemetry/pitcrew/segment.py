@@ -1,9 +1,6 @@
-import statistics
-
 import pandas as pd
 
-# import numpy as np
-from scipy.stats import zscore
+from .feature_buffer import FeatureBuffer, inliers, mean, no_values, to_list
 
 
 class Segment:
@@ -28,14 +25,14 @@ class Segment:
         self.next_segment = None
 
         # added by history to store live data
-        self.live_telemetry = []
         self.live_telemetry_frames = []
         self.live_features = {
-            "brake": [],
-            "throttle": [],
-            "gear": [],
-            "other": [],
+            "brake": FeatureBuffer(),
+            "throttle": FeatureBuffer(),
+            "gear": FeatureBuffer(),
+            "other": FeatureBuffer(),
         }
+        self.live_features_maxlen = None
 
     def log_debug(self, msg):
         if self.history:
@@ -57,6 +54,26 @@ class Segment:
     def end(self, value):
         self._end = int(value)
 
+    @property
+    def telemetry(self):
+        self.load_telemetry()
+        return self.__dict__.get("telemetry")
+
+    @telemetry.setter
+    def telemetry(self, value):
+        self.__dict__["telemetry"] = value
+        self.__dict__.pop("_telemetry_loader", None)
+
+    def set_telemetry_loader(self, loader):
+        """Decode the telemetry on first access, see telemetry.fast_lap_data."""
+        self.__dict__.pop("telemetry", None)
+        self.__dict__["_telemetry_loader"] = loader
+
+    def load_telemetry(self):
+        loader = self.__dict__.pop("_telemetry_loader", None)
+        if loader is not None:
+            self.__dict__["telemetry"] = loader()
+
     def copy_from(self, segment):
         self.start = segment.start
         self.end = segment.end
@@ -86,12 +103,22 @@ class Segment:
 
     def init_live_features_from_segment(self, segment):
         for type, features in segment.live_features.items():
+            if not isinstance(features, FeatureBuffer):
+                features = FeatureBuffer(features)
             self.live_features[type] = features
             # self.add_live_features(features, type=type)
 
+    def init_live_features(self, features_by_type, maxlen=None):
+        """Start with the recent features of the driver, keep at most maxlen per type."""
+        self.live_features_maxlen = maxlen
+        self.live_features = {}
+        for type in ("brake", "throttle", "gear", "other"):
+            self.live_features[type] = FeatureBuffer(features_by_type.get(type, []), maxlen=maxlen)
+
     def add_live_features(self, features, type):
         if type not in self.live_features:
-            self.live_features[type] = []
+            # segments unpickled from FastLap.data have no maxlen
+            self.live_features[type] = FeatureBuffer(maxlen=getattr(self, "live_features_maxlen", None))
         self.live_features[type].append(features)
 
     def type_brake(self):
@@ -271,53 +298,42 @@ class Segment:
         delta = min_sector_lap_time - self.time
         return delta
 
-    def feature_values(self, n=0, feature="feature_to_query", type="type_of_feature_set"):
+    def feature_arrays(self, n=0, feature="feature_to_query", type="type_of_feature_set"):
+        """Return the recent values of a feature newest first and which of them are ints.
+
+        Falsy values are skipped. With n exactly the n most recent values or none at all.
+        """
         if type not in self.live_features:
             self.log_debug(f"no {type} features")
-            return []
+            return no_values()
         features = self.live_features[type]
         if n and len(features) <= n:
-            return []
-
-        values = []
-        for i in range(-1, -len(features), -1):
-            value = features[i].get(feature)
-            if value and value is not None:
-                values.append(value)
-            if n and len(values) == n:
-                break
+            return no_values()
 
+        values, ints = features.recent(feature, n=n)
         if n and len(values) < n:
-            return []
-        return values
+            return no_values()
+        return values, ints
+
+    def feature_values(self, n=0, feature="feature_to_query", type="type_of_feature_set"):
+        return to_list(*self.feature_arrays(n=n, feature=feature, type=type))
 
     def avg_feature(self, n=0, feature="feature_to_query", type="type_of_feature_set"):
-        values = self.feature_values(n=n, feature=feature, type=type)
-        self.log_debug(f"{type} {feature} values: {values}")
+        values, ints = self.feature_arrays(n=n, feature=feature, type=type)
+        self.log_debug(f"{type} {feature} values: {to_list(values, ints)}")
 
         if len(values) == 0:
             return None
 
-        # 1. Using Z-score to remove outliers
-        z_scores = zscore(values)
-        threshold = 1  # ChatGPT suggested 3
-        values_clean = [x for x, z in zip(values, z_scores) if abs(z) < threshold]
-
-        # 2. Using IQR to remove outliers
-        # Q1 = np.percentile(values, 25)
-        # Q3 = np.percentile(values, 75)
-        # IQR = Q3 - Q1
-        # lower_bound = Q1 - (1.5 * IQR)
-        # upper_bound = Q3 + (1.5 * IQR)
-        # values_clean = [x for x in values if x >= lower_bound and x <= upper_bound]
-
-        self.log_debug(f"{type} {feature} values wo/outliers: {values_clean}")
-        # return mean gear
-        if values_clean:
-            return statistics.mean(values_clean)
+        # Using Z-score to remove outliers
+        clean = inliers(values, threshold=1)  # ChatGPT suggested 3
+
+        self.log_debug(f"{type} {feature} values wo/outliers: {to_list(values[clean], ints[clean])}")
+        if clean.any():
+            return mean(values[clean], ints[clean])
         else:
             # if values_clean is empty, either all values are the same or there is only one value
-            return values[0]
+            return to_list(values[:1], ints[:1])[0]
 
     def session_laps(self):
         return len(self.live_telemetry_frames)
@@ -0,0 +1,252 @@
+import datetime
+
+import numpy as np
+
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_UTC = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# pd.cut bins used by Analyzer.top_bin, the first bin includes 0
+FORCE_BINS = np.array([x / 10 for x in range(11)])
+
+
+def time_ns(_time):
+    """Return a timestamp as int nanoseconds, like pandas' astype("int64")."""
+    if _time is None:
+        return np.nan
+    value = getattr(_time, "value", None)  # pandas.Timestamp
+    if value is not None:
+        return value
+    epoch = EPOCH if _time.tzinfo is None else EPOCH_UTC
+    return (_time - epoch) // datetime.timedelta(microseconds=1) * 1000
+
+
+def nan_float(value):
+    return np.nan if value is None else value
+
+
+class SegmentFeatures:
+    """Collect the ticks of a segment and extract its features without pandas.
+
+    Ticks are appended column wise while the segment is driven. When the segment ends,
+    the columns are resampled to 1 meter steps once and the feature methods compute the
+    same features as ``FastLapAnalyzer.preprocess`` followed by ``Analyzer.brake_features``,
+    ``Analyzer.throttle_features``, ``FastLapAnalyzer.gear_features``,
+    ``Analyzer.sector_time`` and ``Analyzer.sector_lap_time``.
+    """
+
+    COLUMNS = ("Brake", "SpeedMs", "Throttle", "Gear", "CurrentLapTime", "Time")
+
+    def __init__(self):
+        self.ticks = 0
+        self.distance = []
+        self.columns = {column: [] for column in self.COLUMNS}
+        self.resampled = None
+
+    def __len__(self):
+        return self.ticks
+
+    def add(self, telemetry):
+        self.ticks += 1
+        gear = telemetry.get("Gear")
+        if gear == 0:
+            # FastLapAnalyzer.preprocess drops ticks in neutral
+            return
+        distance = telemetry.get("DistanceRoundTrack")
+        if distance is None or distance != distance:
+            return
+        self.distance.append(distance)
+        columns = self.columns
+        columns["Brake"].append(nan_float(telemetry.get("Brake")))
+        columns["SpeedMs"].append(nan_float(telemetry.get("SpeedMs")))
+        columns["Throttle"].append(nan_float(telemetry.get("Throttle")))
+        columns["Gear"].append(nan_float(gear))
+        columns["CurrentLapTime"].append(nan_float(telemetry.get("CurrentLapTime")))
+        columns["Time"].append(time_ns(telemetry.get("_time")))
+
+    def resample(self, freq=1):
+        """Nearest neighbour resampling, like Analyzer.resample with scipy's interp1d."""
+        if self.resampled is not None:
+            return self.resampled
+
+        distance = np.asarray(self.distance, dtype=np.float64)
+        resampled = {"DistanceRoundTrack": np.empty(0)}
+        for column in self.COLUMNS:
+            resampled[column] = np.empty(0)
+        if len(distance) == 0:
+            self.resampled = resampled
+            return resampled
+
+        min_distance = int(np.ceil(distance.min()))
+        max_distance = int(np.floor(distance.max()))
+        target_rows = int(max_distance / freq)
+
+        new_distance = np.linspace(min_distance, max_distance, target_rows)
+        new_distance = np.round(new_distance, decimals=2)
+        if target_rows:
+            new_distance[0] = max(new_distance[0], min_distance)
+            new_distance[-1] = min(new_distance[-1], max_distance)
+        resampled["DistanceRoundTrack"] = new_distance
+
+        order = np.argsort(distance, kind="mergesort")
+        distance = distance[order]
+        bounds = distance / 2.0
+        bounds = bounds[1:] + bounds[:-1]
+        indices = np.searchsorted(bounds, new_distance, side="left").clip(0, len(distance) - 1)
+
+        for column in self.COLUMNS:
+            values = np.asarray(self.columns[column], dtype=np.float64)[order]
+            values = values[indices]
+            if column == "Time":
+                values = np.round(values)
+            resampled[column] = values
+
+        self.resampled = resampled
+        return resampled
+
+    def top_bin(self, values, column="Brake"):
+        """Return the peak force range, see Analyzer.top_bin."""
+        bins = np.searchsorted(FORCE_BINS, values, side="left")
+        bins[values == FORCE_BINS[0]] = 1
+        bins = bins[(bins > 0) & (bins < len(FORCE_BINS))] - 1
+        counts = np.bincount(bins, minlength=len(FORCE_BINS) - 1)
+
+        # order the bins like value_counts does, including its tie breaking
+        # by a descending (unstable) quicksort, then drop the lowest brake / highest throttle bin
+        reversed_bins = np.arange(len(counts))[::-1]
+        ordered = reversed_bins[counts[::-1].argsort(kind="quicksort")][::-1]
+        dropped = 0 if column == "Brake" else len(counts) - 1
+        ordered = [b for b in ordered if b != dropped]
+        # nlargest keeps the first of equal counts
+        top = sorted(ordered, key=lambda b: -counts[b])[:2]
+        ascending = column == "Throttle"
+        first_bin, second_bin = sorted(top, reverse=not ascending)
+        first_count, second_count = counts[first_bin], counts[second_bin]
+
+        def left(b):
+            return -0.001 if b == 0 else FORCE_BINS[b]
+
+        def right(b):
+            return FORCE_BINS[b + 1]
+
+        if first_count and second_count:
+            if left(first_bin) == right(second_bin):
+                return left(second_bin), right(first_bin)
+            return left(first_bin), right(first_bin)
+        elif first_count:
+            return left(first_bin), right(first_bin)
+        elif second_count:
+            return left(second_bin), right(second_bin)
+        if column == "Brake":
+            return 0, 0.1
+        return 0.9, 1
+
+    def window(self, distance, above, below):
+        """Return start and end distance of a window, see Analyzer.brake_window."""
+        if not above.any():
+            return None, None
+        start = distance[np.argmax(above)]
+        if not below.any():
+            return start, None
+        end_section = below & (distance > start)
+        if end_section.any():
+            end = distance[np.argmax(end_section)]
+        else:
+            end = distance[-1]
+        return start, end
+
+    def force_features(self, column, start, end):
+        resampled = self.resampled
+        distance = resampled["DistanceRoundTrack"]
+        values = resampled[column]
+
+        section = (distance >= start) & (distance <= end)
+        section_values = values[section]
+        min_force, max_force = self.top_bin(section_values, column=column)
+        peak = (section_values >= min_force) & (section_values <= max_force)
+        peak_distance = distance[section][peak]
+        peak_values = section_values[peak]
+
+        features = {
+            "start": start,
+            "end": end,
+            "max_start": nan_min(peak_distance),
+            "max_end": nan_max(peak_distance),
+            "max_high": round(nan_max(peak_values), 2),
+            "max_low": round(nan_min(peak_values), 2),
+            "force": round(nan_mean(peak_values), 2),
+            "approach_speed": round(resampled["SpeedMs"][np.argmin(np.abs(distance - start))], 2),
+            "min_speed": round(nan_min(resampled["SpeedMs"][section]), 2),
+        }
+        if column == "Throttle":
+            features["max_low"] = abs(features["max_low"])
+            features["force"] = abs(features["force"])
+        return features
+
+    def brake_features(self, brake_threshold=0.1):
+        resampled = self.resample()
+        brake = resampled["Brake"]
+        start, end = self.window(resampled["DistanceRoundTrack"], brake > brake_threshold, brake <= brake_threshold)
+        if start and end:
+            return self.force_features("Brake", start, end)
+        return {}
+
+    def throttle_features(self, threshold=None):
+        resampled = self.resample()
+        throttle = resampled["Throttle"]
+        if threshold is None:
+            threshold = nan_max(throttle) * 0.98
+        start, end = self.window(resampled["DistanceRoundTrack"], throttle <= threshold, throttle > threshold)
+        if start and end:
+            return self.force_features("Throttle", start, end)
+        return {}
+
+    def gear_features(self):
+        resampled = self.resample()
+        gears = resampled["Gear"]
+        gear = nan_min(gears)
+        distance_gear = {}
+        previous = np.nan
+        for distance, value in zip(resampled["DistanceRoundTrack"], gears):
+            # NaN compares unequal, just like pandas' shift
+            if value != previous:
+                distance_gear[int(round(distance))] = int(value)
+            previous = value
+        return {
+            "gear": int(gear) if not np.isnan(gear) else 0,
+            "distance_gear": distance_gear,
+        }
+
+    def other_features(self):
+        resampled = self.resample()
+        if len(resampled["DistanceRoundTrack"]) == 0:
+            return {"sector_time": 0, "sector_lap_time": 0}
+
+        times = resampled["Time"]
+        sector_time = (times[-1] - times[0]) / 1_000_000_000
+
+        lap_times = resampled["CurrentLapTime"]
+        start_lap_time = lap_times[0]
+        end_lap_time = lap_times[-1]
+        if end_lap_time < start_lap_time:
+            start_lap_time = 0
+        return {
+            "sector_time": sector_time,
+            "sector_lap_time": end_lap_time - start_lap_time,
+        }
+
+
+def nan_min(values):
+    values = values[~np.isnan(values)]
+    return values.min() if len(values) else np.nan
+
+
+def nan_max(values):
+    values = values[~np.isnan(values)]
+    return values.max() if len(values) else np.nan
+
+
+def nan_mean(values):
+    # sum with NaN as 0, like pandas' nanmean
+    mask = np.isnan(values)
+    count = len(values) - mask.sum()
+    return np.where(mask, 0, values).sum() / count if count else np.nan
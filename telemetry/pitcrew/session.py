@@ -46,6 +46,7 @@ class Session(LoggingMixin):
         self.car_class = ""
         self.session_type = ""
         self.record = None
+        self.key = None
 
         self.current_lap_time = -1
         self.distance_round_track = 1_000_000_000
@@ -0,0 +1,52 @@
+import heapq
+
+
+class SessionExpiry:
+    """Find the sessions without telemetry for more than max_age seconds.
+
+    Every session has one entry in a heap ordered by the time it was last seen when
+    the entry was pushed. ``touch`` only records the time, an entry that is due is
+    checked against it and pushed again if the session was seen since. Expiring costs
+    O(log n) per expired or re-pushed session instead of a scan of all sessions.
+    """
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.heap = []  # (last seen, topic)
+        self.scheduled = {}  # topic -> last seen of its entry in the heap
+        self.last_seen = {}
+
+    def __len__(self):
+        return len(self.last_seen)
+
+    def touch(self, topic, now):
+        self.last_seen[topic] = now
+        if topic not in self.scheduled:
+            self.schedule(topic, now)
+
+    def schedule(self, topic, last_seen):
+        self.scheduled[topic] = last_seen
+        heapq.heappush(self.heap, (last_seen, topic))
+
+    def remove(self, topic):
+        self.last_seen.pop(topic, None)
+        self.scheduled.pop(topic, None)
+
+    def age(self, last_seen, now):
+        return (now - last_seen).total_seconds()
+
+    def expired(self, now):
+        """Remove and return the topics not seen for more than max_age seconds."""
+        topics = []
+        while self.heap and self.age(self.heap[0][0], now) > self.max_age:
+            entry_seen, topic = heapq.heappop(self.heap)
+            if self.scheduled.get(topic) != entry_seen:
+                # removed, or a newer entry of the topic is in the heap
+                continue
+            last_seen = self.last_seen[topic]
+            if self.age(last_seen, now) > self.max_age:
+                topics.append(topic)
+                self.remove(topic)
+            else:
+                self.schedule(topic, last_seen)
+        return topics
@@ -0,0 +1,99 @@
+import threading
+
+
+class SessionKey:
+    """Immutable key of a telemetry session, parsed once from its MQTT topic.
+
+    A topic looks like ``crewchief/<driver>/<session_id>/<game>/<track>/<car>/<session_type>``.
+    Keys are interned, ``SessionKey.from_topic`` returns the same object for the same topic,
+    so consumers can share it and compare or hash it cheaply.
+    """
+
+    __slots__ = ("topic", "prefix", "driver", "session_id", "game", "track", "car", "session_type")
+
+    FIELDS = ("prefix", "driver", "session_id", "game", "track", "car", "session_type")
+
+    _registry = {}
+    _registry_lock = threading.Lock()
+    max_keys = 10_000
+
+    def __init__(self, topic, prefix, driver, session_id, game, track, car, session_type):
+        set_ = object.__setattr__
+        set_(self, "topic", topic)
+        set_(self, "prefix", prefix)
+        set_(self, "driver", driver)
+        set_(self, "session_id", session_id)
+        set_(self, "game", game)
+        set_(self, "track", track)
+        set_(self, "car", car)
+        set_(self, "session_type", session_type)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"SessionKey is immutable, can't set {name}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"SessionKey is immutable, can't delete {name}")
+
+    def __eq__(self, other):
+        if isinstance(other, SessionKey):
+            return self.topic == other.topic
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.topic)
+
+    def __str__(self):
+        return self.topic
+
+    def __repr__(self):
+        return f"SessionKey({self.topic})"
+
+    @classmethod
+    def parse(cls, topic):
+        """Parse a topic into a new key, returns None for invalid topics."""
+        frags = topic.split("/")
+        if len(frags) != 7:
+            return None
+        return cls(topic, *frags)
+
+    @classmethod
+    def from_topic(cls, topic):
+        """Return the interned key for a topic, returns None for invalid topics."""
+        key = cls._registry.get(topic)
+        if key is not None:
+            return key
+
+        key = cls.parse(topic)
+        if key is None:
+            return None
+        with cls._registry_lock:
+            if len(cls._registry) >= cls.max_keys:
+                # sessions are short lived, start over instead of tracking usage
+                cls._registry.clear()
+            return cls._registry.setdefault(topic, key)
+
+    @property
+    def is_rbr(self):
+        return self.game == "Richard Burns Rally"
+
+    def filter(self):
+        """Return the filter dict used by History.set_filter."""
+        return {
+            "Driver": self.driver,
+            "GameName": self.game,
+            "TrackCode": self.track,
+            "CarModel": self.car,
+            "SessionId": self.session_id,
+            "SessionType": self.session_type,
+        }
+
+    def init_session(self, session, payload):
+        """Copy the key fields onto a new Session."""
+        session.key = self
+        session.driver = self.driver
+        session.session_id = self.session_id
+        session.game_name = self.game
+        session.track = self.track
+        session.car = self.car
+        session.car_class = payload.get("CarClass", "")
+        session.session_type = self.session_type
@@ -2,14 +2,22 @@ import logging
 import threading
 import time
 
-from django.db import IntegrityError
+from telemetry.models import Lap, Session, Track
 
-from telemetry.models import Driver, Game, Session, SessionType
+from .dimension_cache import DimensionCache
+
+
+class SessionHolder:
+    """The sessions to save without a firehose, e.g. sessions rebuilt from recorded telemetry."""
+
+    def __init__(self):
+        self.sessions = {}
 
 
 class SessionSaver:
-    def __init__(self, firehose, save=True):
+    def __init__(self, firehose, save=True, dimensions=None):
         self.firehose = firehose
+        self.dimensions = dimensions or DimensionCache()
         self.sleep_time = 10
         self.save = save
 
@@ -31,118 +39,163 @@ class SessionSaver:
             self.ready = True
             time.sleep(self.sleep_time)
 
-    def fetch_sessions(self):
-        session_ids = list(self.firehose.sessions.keys())
-        for session_id in session_ids:
+    def sessions(self):
+        sessions = []
+        for session_id in list(self.firehose.sessions.keys()):
             session = self.firehose.sessions.get(session_id)
-            if not session.record:
-                try:
-                    session.driver = Driver.objects.get(name=session.driver)
-                    session.game = Game.objects.get(name=session.game_name)
-                    session.session_type = SessionType.objects.get(type=session.session_type)
-                    session.car = session.game.cars.get(name=session.car)
-                    session.car.car_class = session.game.car_classes.get(name=session.car_class)
-                    session.track = session.game.tracks.get(name=session.track)
-                    session.record = session.driver.sessions.filter(
-                        session_id=session.session_id,
-                        session_type=session.session_type,
-                        game=session.game,
-                    ).first() or Session(
-                        session_id=session.session_id,
-                        session_type=session.session_type,
-                        game=session.game,
-                        start=session.start,
-                        end=session.end,
-                    )
-                    logging.debug(f"{session.session_id}: Fetched session {session_id}")
-                except Exception as e:
-                    # TODO add error to session to expire
-                    logging.error(f"{session.session_id}: Error fetching session {session_id}: {e}")
-                    continue
+            if session is not None:
+                sessions.append(session)
+        return sessions
 
-    def save_sessions(self):
-        session_ids = list(self.firehose.sessions.keys())
-        for session_id in session_ids:
-            session = self.firehose.sessions.get(session_id)
+    def fetch_sessions(self):
+        sessions = self.resolve_sessions(self.sessions(), create=False)
+        self.load_records(sessions, create=False)
 
-            # save session to database
-            # TODO: update session details if they change (e.g. end time)
-            if not session.record:
-                try:
-                    session.driver, created = Driver.objects.get_or_create(name=session.driver)
-                    session.game, created = Game.objects.get_or_create(name=session.game_name)
-                    (
-                        session.session_type,
-                        created,
-                    ) = SessionType.objects.get_or_create(type=session.session_type)
-                    session.car, created = session.game.cars.get_or_create(name=session.car)
-                    session.car.car_class, created = session.game.car_classes.get_or_create(name=session.car_class)
-                    session.track, created = session.game.tracks.get_or_create(name=session.track)
-                    (
-                        session.record,
-                        created,
-                    ) = session.driver.sessions.get_or_create(
-                        session_id=session.session_id,
-                        session_type=session.session_type,
-                        game=session.game,
-                        defaults={"start": session.start, "end": session.end},
-                    )
-                    logging.debug(f"{session.session_id}: Saving session {session_id}")
-                except Exception as e:
-                    # TODO add error to session to expire
-                    logging.error(f"{session.session_id}: Error saving session {session_id}: {e}")
-                    continue
-
-            lap_numbers = list(session.laps.keys())
-            for lap_number in lap_numbers:
-                lap = session.laps.get(lap_number)
-                if session.record and lap.finished and not lap.persisted:
-                    # check if lap length is within 98% of the track length
-                    track = session.track
-
-                    # track_length = track.length
-                    # if lap.length < track_length * 0.98:
-                    #     lstring = (
-                    #         f"{lap.number}: {lap.time}s {lap.length}m"
-                    #     )
-                    #     logging.info(
-                    #         f"{session.session_id}: Discard lap {lstring} - track length {track_length}m"
-                    #     )
-                    #     # FIXME: this is a hack to prevent the lap from being saved again
-                    #     lap.persisted = True
-                    #     continue
-
-                    try:
-                        lap_record = session.record.laps.create(
-                            number=lap.number,
-                            car=session.car,
-                            track=track,
-                            start=lap.start,
-                            end=lap.end,
-                            length=lap.length,
-                            valid=lap.valid,
-                            time=lap.time,
-                        )
-                        logging.info(f"{session.session_id}: Saving lap {lap_record}")
-                        session.record.end = session.end
-                        session.record.save_dirty_fields()
-                        lap.persisted = True
-                    except IntegrityError as e:
-                        logging.error(f"{session.session_id}: Error saving lap {lap.number}: {e}")
-                        lap.persisted = True
-                    except Exception as e:
-                        logging.error(f"{session.session_id}: Error saving lap {lap.number}: {e}")
-
-                    lap_length = int(lap.length)
-                    if lap_length > track.length:
-                        track.refresh_from_db()
-                        if lap_length > track.length:
-                            logging.info(
-                                f"{session.session_id}: updating {track.name} "
-                                + f"length from {track.length} to {lap_length}"
-                            )
-                            track.length = lap_length
-                            track.save()
+    def save_sessions(self):
+        """Save new sessions and finished laps with a constant number of queries per call."""
+        sessions = self.sessions()
+        try:
+            resolved = self.resolve_sessions(sessions, create=True)
+            self.load_records(resolved, create=True)
+        except Exception as e:
+            # TODO add error to session to expire
+            logging.error(f"Error saving sessions: {e}")
+        self.save_laps(sessions)
+
+    def resolve_sessions(self, sessions, create):
+        """Resolve the dimensions of the sessions without record, return the resolved sessions."""
+        pending = [session for session in sessions if not session.record]
+        if not pending:
+            return []
+
+        dimensions = self.dimensions
+        drivers = dimensions.resolve("driver", [(s.driver,) for s in pending], create)
+        games = dimensions.resolve("game", [(s.game_name,) for s in pending], create)
+        session_types = dimensions.resolve("session_type", [(s.session_type,) for s in pending], create)
+        in_game = [s for s in pending if games[(s.game_name,)]]
+        cars = dimensions.resolve("car", [(games[(s.game_name,)].id, s.car) for s in in_game], create)
+        car_classes = dimensions.resolve(
+            "car_class", [(games[(s.game_name,)].id, s.car_class) for s in in_game], create
+        )
+        tracks = dimensions.resolve("track", [(games[(s.game_name,)].id, s.track) for s in in_game], create)
+
+        resolved = []
+        for session in pending:
+            game = games[(session.game_name,)]
+            game_id = game.id if game else None
+            records = {
+                "driver": drivers[(session.driver,)],
+                "game": game,
+                "session_type": session_types[(session.session_type,)],
+                "car": cars.get((game_id, session.car)),
+                "car_class": car_classes.get((game_id, session.car_class)),
+                "track": tracks.get((game_id, session.track)),
+            }
+            unknown = [dimension for dimension, record in records.items() if record is None]
+            if unknown:
+                logging.error(
+                    f"{session.session_id}: Error resolving session {session.id}: unknown {', '.join(unknown)}"
+                )
+                continue
+            session.driver = records["driver"]
+            session.game = game
+            session.session_type = records["session_type"]
+            session.car = records["car"]
+            session.car.car_class = records["car_class"]
+            session.track = records["track"]
+            resolved.append(session)
+        return resolved
+
+    def record_key(self, record):
+        return (record.driver_id, record.session_id, record.session_type_id, record.game_id)
+
+    def session_key(self, session):
+        return (session.driver.id, session.session_id, session.session_type.id, session.game.id)
+
+    def fetch_records(self, sessions):
+        session_ids = {session.session_id for session in sessions}
+        return {self.record_key(record): record for record in Session.objects.filter(session_id__in=session_ids)}
+
+    def load_records(self, sessions, create):
+        """Set the Session record of resolved sessions, new records are inserted in bulk with create."""
+        if not sessions:
+            return
+        records = self.fetch_records(sessions)
+        new = {}
+        for session in sessions:
+            key = self.session_key(session)
+            if key not in records and key not in new:
+                new[key] = Session(
+                    session_id=session.session_id,
+                    driver=session.driver,
+                    session_type=session.session_type,
+                    game=session.game,
+                    start=session.start,
+                    end=session.end,
+                )
+        if new and create:
+            Session.objects.bulk_create(new.values(), ignore_conflicts=True)
+            records = self.fetch_records(sessions)
+
+        for session in sessions:
+            key = self.session_key(session)
+            session.record = records.get(key) or new[key]
+            action = "Saving" if create else "Fetched"
+            logging.debug(f"{session.session_id}: {action} session {session.id}")
+
+    def save_laps(self, sessions):
+        """Insert the finished laps in bulk and update the session end times with a single query."""
+        saved = [session for session in sessions if session.record and session.record.pk]
+        laps = []
+        for session in saved:
+            for lap in list(session.laps.values()):
+                if lap.finished and not lap.persisted:
+                    laps.append((session, lap))
+
+        longer_tracks = {}
+        if laps:
+            lap_records = [
+                Lap(
+                    session=session.record,
+                    number=lap.number,
+                    car=session.car,
+                    track=session.track,
+                    start=lap.start,
+                    end=lap.end,
+                    length=lap.length,
+                    valid=lap.valid,
+                    time=lap.time,
+                )
+                for session, lap in laps
+            ]
+            try:
+                # laps saved before, e.g. by a restarted pitcrew, are skipped
+                Lap.objects.bulk_create(lap_records, ignore_conflicts=True)
+            except Exception as e:
+                logging.error(f"Error saving {len(lap_records)} laps: {e}")
+                return
+
+            for (session, lap), lap_record in zip(laps, lap_records):
+                logging.info(f"{session.session_id}: Saving lap {lap_record}")
+                lap.persisted = True
+                lap_length = int(lap.length)
+                if lap_length > max(session.track.length, longer_tracks.get(session.track, 0)):
+                    longer_tracks[session.track] = lap_length
+
+        # also sessions without new laps, e.g. a session without finished laps
+        records = {}
+        for session in saved:
+            if session.record.end != session.end:
+                session.record.end = session.end
+                records[session.record.pk] = session.record
+        if records:
+            Session.objects.bulk_update(records.values(), ["end"])
+
+        for track, lap_length in longer_tracks.items():
+            logging.info(f"updating {track.name} length from {track.length} to {lap_length}")
+            # the length only grows, also if another process updated it meanwhile
+            Track.objects.filter(id=track.id, length__lt=lap_length).update(length=lap_length)
+            track.length = lap_length
 
     def run(self):
         self.save_sessions_loop()
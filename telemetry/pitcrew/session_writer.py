@@ -0,0 +1,110 @@
+import atexit
+import copy
+import logging
+import os
+import queue
+import threading
+
+from django.db import connection
+
+from .session import Session
+from .session_saver import SessionSaver
+
+
+class SessionWriter:
+    """Persist sessions and finished laps from a background thread.
+
+    The thread handling the telemetry hands session updates and copies of finished laps
+    over with ``put``, the writer keeps its own copy of each session and saves the
+    sessions, laps and session end times with ``SessionSaver`` every ``flush_interval`` seconds. ``stop`` drains the
+    queue and writes what is left. Expired sessions are kept until their finished laps
+    are written, for at most ``max_retries`` flushes. After that, e.g. if the session can't
+    be resolved, the laps are logged and discarded.
+    """
+
+    def __init__(self, flush_interval=None):
+        self.flush_interval = flush_interval or float(os.environ.get("B4MAD_RACING_SESSION_FLUSH_INTERVAL", 60))
+        self.queue = queue.SimpleQueue()
+        self.sessions = {}  # topic -> Session owned by the writer thread
+        self.forgotten = {}  # expired topic -> flushes since it expired
+        self.max_retries = 10
+        self.session_saver = SessionSaver(self)
+        # without a thread the laps are written by stop
+        self.threaded = True
+        self.thread = None
+        self.lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def put(self, session, lap=None):
+        """Hand over the start and end of a session and a finished lap, called by the telemetry thread."""
+        lap = copy.copy(lap) if lap is not None else None
+        self.queue.put(("session", session.id, session.key, session.car_class, session.start, session.end, lap))
+        self.start()
+
+    def forget(self, topic):
+        """The session expired, drop it after its pending laps are written."""
+        self.queue.put(("forget", topic))
+
+    def start(self):
+        if self.thread is not None or not self.threaded:
+            return
+        with self.lock:
+            if self.thread is None and not self._stop_event.is_set():
+                self.thread = threading.Thread(target=self.run, name="session-writer", daemon=True)
+                self.thread.start()
+                atexit.register(self.stop)
+
+    def stop(self):
+        self._stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            atexit.unregister(self.stop)
+        else:
+            self.flush()
+
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+        connection.close()
+
+    def drain(self):
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[0] == "forget":
+                self.forgotten.setdefault(item[1], 0)
+                continue
+
+            _, topic, key, car_class, start, end, lap = item
+            session = self.sessions.get(topic)
+            if session is None:
+                session = self.sessions[topic] = Session(topic, start=start)
+                key.init_session(session, {"CarClass": car_class})
+            session.end = end
+            if lap is not None:
+                session.laps[lap.number] = lap
+
+    def flush(self):
+        self.drain()
+        if self.sessions:
+            try:
+                self.session_saver.save_sessions()
+            except Exception as e:
+                logging.exception(f"Error persisting sessions: {e}")
+        for topic, flushes in list(self.forgotten.items()):
+            session = self.sessions.get(topic)
+            laps = session.laps.values() if session else ()
+            unsaved = [lap.number for lap in laps if lap.finished and not lap.persisted]
+            if unsaved and flushes < self.max_retries:
+                self.forgotten[topic] = flushes + 1
+                continue
+            if unsaved:
+                logging.error(f"{topic}: discarding laps {unsaved}, not saved after {flushes} retries")
+            self.sessions.pop(topic, None)
+            del self.forgotten[topic]
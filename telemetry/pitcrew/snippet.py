@@ -0,0 +1,107 @@
+import ast
+import builtins
+import functools
+
+# names available in snippets -> Segment method, None is the segment itself
+AT_NAMES = {
+    "brake_point": "brake_point",
+    "throttle_point": "throttle_point",
+    "apex": "apex",
+    "gear": "gear_distance",
+    "turn_in": "turn_in",
+}
+
+SCORE_NAMES = {
+    "brake_point": "score_brake_point",
+    "apex": "score_apex",
+    "gear": "score_gear",
+    "brake_force": "score_brake_force",
+    "turn_in": "score_turn_in",
+    "throttle_force": "score_throttle_force",
+}
+
+EVAL_NAMES = {
+    "segment": None,
+    "brake_point": "brake_point",
+    "apex": "apex",
+    "brake_point_diff": "brake_point_diff",
+    "apex_diff": "apex_diff",
+    "gear_diff": "gear_diff",
+    "coach_brake_force": "coach_brake_force",
+    "coach_turn_in": "coach_turn_in",
+    "coach_brake_point": "coach_brake_point",
+    "coach_gear": "coach_gear",
+    "coach_apex": "coach_apex",
+    "coach_throttle_force": "coach_throttle_force",
+}
+
+GLOBALS = {"__builtins__": builtins}
+
+
+class SnippetError(ValueError):
+    pass
+
+
+class Snippet:
+    """A TrackGuideNote expression, parsed and compiled once.
+
+    Snippets are single Python expressions like ``brake_point() - 50``. The names they use
+    are looked up in a names table (e.g. AT_NAMES) and bound to the methods of a segment
+    only when the snippet is evaluated.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        try:
+            tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as e:
+            raise SnippetError(f"invalid snippet '{source}': {e.msg}")
+        self.names = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name):
+                self.names.add(node.id)
+            elif isinstance(node, ast.Attribute) and node.attr.startswith("_"):
+                raise SnippetError(f"invalid snippet '{source}': private attribute {node.attr}")
+        self.code = compile(tree, "<snippet>", "eval")
+
+    def check(self, names):
+        """Raise SnippetError for names that are neither in the names table nor builtins."""
+        unknown = [name for name in self.names if name not in names and not hasattr(builtins, name)]
+        if unknown:
+            raise SnippetError(f"invalid snippet '{self.source}': unknown {', '.join(sorted(unknown))}")
+
+    def eval(self, segment, names):
+        return eval(self.code, GLOBALS, SegmentNames(segment, names))  # nosec
+
+
+class SegmentNames(dict):
+    """Resolve the names of a snippet to the bound methods of a segment on lookup."""
+
+    def __init__(self, segment, names):
+        self.segment = segment
+        self.names = names
+
+    def __missing__(self, name):
+        if name not in self.names:
+            raise KeyError(name)
+        method = self.names[name]
+        value = self.segment if method is None else getattr(self.segment, method)
+        self[name] = value
+        return value
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_snippet(source):
+    return Snippet(source)
+
+
+def check_note(note):
+    """Compile the snippets of a TrackGuideNote, raises SnippetError for bad ones."""
+    fields = (("at", AT_NAMES), ("finish_at", AT_NAMES), ("score", SCORE_NAMES), ("eval", EVAL_NAMES))
+    for field, names in fields:
+        source = getattr(note, field, None)
+        if source and source.strip():
+            try:
+                compile_snippet(source).check(names)
+            except SnippetError as e:
+                raise SnippetError(f"note {note.id} {field}: {e}") from e
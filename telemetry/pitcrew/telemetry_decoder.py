@@ -0,0 +1,196 @@
+import json
+from typing import Any
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+try:
+    import cbor2
+except ImportError:  # pragma: no cover
+    cbor2 = None
+
+FORMAT_JSON = "json"
+FORMAT_MSGPACK = "msgpack"
+FORMAT_CBOR = "cbor"
+FORMATS = [FORMAT_JSON, FORMAT_MSGPACK, FORMAT_CBOR]
+
+# marks a projected field that was not in the payload
+UNSET = msgspec.UNSET if msgspec else object()
+
+
+def payload_format(payload: bytes):
+    """Detect the encoding of a payload from its first byte.
+
+    Telemetry payloads are always maps, so the header byte tells the formats apart:
+    a JSON object starts with '{' (or whitespace), a MessagePack map with 0x80-0x8f,
+    0xde or 0xdf and a CBOR map with 0xa0-0xbf or the self-describe tag 0xd9d9f7.
+    """
+    if not payload:
+        return FORMAT_JSON
+    header = payload[0]
+    if 0x80 <= header <= 0x8F or header in (0xDE, 0xDF):
+        return FORMAT_MSGPACK
+    if 0xA0 <= header <= 0xBF or payload[:3] == b"\xd9\xd9\xf7":
+        return FORMAT_CBOR
+    return FORMAT_JSON
+
+
+def encode_payload(payload, format=FORMAT_JSON):
+    """Encode a payload dict for publishing, e.g. by the replay command."""
+    if format == FORMAT_MSGPACK:
+        if not msgspec:
+            raise ValueError("msgspec is required to encode MessagePack payloads")
+        return msgspec.msgpack.encode(payload)
+    if format == FORMAT_CBOR:
+        if not cbor2:
+            raise ValueError("cbor2 is required to encode CBOR payloads")
+        return cbor2.dumps(payload)
+    return json.dumps(payload).encode("utf-8")
+
+
+class TelemetryMixin:
+    """Dict like access to a projected telemetry record.
+
+    Consumers keep using ``telemetry["SpeedMs"]`` and ``telemetry.get("SpeedMs", 1)``.
+    Fields missing from the payload raise a KeyError, just like the dict did.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        value = getattr(self, key, UNSET)
+        if value is UNSET:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return getattr(self, key, UNSET) is not UNSET
+
+    def get(self, key, default=None):
+        value = getattr(self, key, UNSET)
+        if value is UNSET:
+            return default
+        return value
+
+    def keys(self):
+        return [key for key in self.FIELDS if key in self]
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.keys()}
+
+
+if msgspec:
+
+    class TelemetryStruct(TelemetryMixin, msgspec.Struct, gc=False):
+        pass
+
+
+class TelemetryRecord(TelemetryMixin):
+    """Slotted record, used if msgspec is not installed."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return f"Telemetry({self.to_dict()})"
+
+
+class TelemetryDecoder:
+    """Decode JSON, MessagePack or CBOR MQTT payloads into telemetry.
+
+    With ``fields`` set, only those fields are decoded into a compact Telemetry record,
+    otherwise the full telemetry dict is returned like before. If msgspec is installed
+    the record is a msgspec Struct and all other fields are skipped while parsing,
+    without msgspec the payload is parsed by json and projected afterwards.
+
+    Run ``manage.py benchmark_decoder`` to compare both against the dict path.
+    """
+
+    # fields read by Session.analyze, History, the copilots and the FastLapAnalyzer
+    COACH_FIELDS = (
+        "DistanceRoundTrack",
+        "SpeedMs",
+        "CurrentLap",
+        "CurrentLapTime",
+        "LapTimePrevious",
+        "CurrentLapIsValid",
+        "PreviousLapWasValid",
+        "Brake",
+        "Throttle",
+        "Gear",
+        "SteeringAngle",
+        "CarClass",
+    )
+
+    _record_classes = {}
+
+    def __init__(self, fields=None):
+        self.fields = tuple(fields) if fields else None
+        self.record_class = None
+        self.json_decoder = None
+        self.msgpack_decoder = msgspec.msgpack.Decoder() if msgspec else None
+        if self.fields:
+            self.record_class = self.record_class_for(self.fields)
+            if msgspec:
+                payload_class = msgspec.defstruct("Payload", [("telemetry", self.record_class | None, None)])
+                self.json_decoder = msgspec.json.Decoder(payload_class)
+                self.msgpack_decoder = msgspec.msgpack.Decoder(payload_class)
+
+    @classmethod
+    def record_class_for(cls, fields):
+        record_class = cls._record_classes.get(fields)
+        if record_class:
+            return record_class
+
+        # _time is set by History.update
+        slots = fields if "_time" in fields else fields + ("_time",)
+        if msgspec:
+            record_class = msgspec.defstruct(
+                "Telemetry", [(field, Any, UNSET) for field in slots], bases=(TelemetryStruct,), gc=False
+            )
+        else:
+            record_class = type("Telemetry", (TelemetryRecord,), {"__slots__": slots})
+        record_class.FIELDS = slots
+        cls._record_classes[fields] = record_class
+        return record_class
+
+    def project(self, telemetry):
+        """Project a telemetry dict into a record."""
+        if self.record_class is None or telemetry is None:
+            return telemetry
+        record = self.record_class()
+        for field in self.fields:
+            value = telemetry.get(field, UNSET)
+            if value is not UNSET:
+                setattr(record, field, value)
+        return record
+
+    def decode(self, payload: bytes):
+        """Decode a raw MQTT payload and return the (projected) telemetry.
+
+        The payload can be JSON, MessagePack or CBOR, see payload_format.
+        """
+        format = payload_format(payload)
+        if format == FORMAT_MSGPACK:
+            if not self.msgpack_decoder:
+                raise ValueError("msgspec is required to decode MessagePack payloads")
+            decoded = self.msgpack_decoder.decode(payload)
+        elif format == FORMAT_CBOR:
+            if not cbor2:
+                raise ValueError("cbor2 is required to decode CBOR payloads")
+            decoded = cbor2.loads(payload)
+        elif self.json_decoder:
+            decoded = self.json_decoder.decode(payload)
+        else:
+            decoded = json.loads(payload)
+
+        if isinstance(decoded, dict):
+            return self.project(decoded.get("telemetry"))
+        return decoded.telemetry
@@ -2,11 +2,12 @@ import threading
 import time
 from pprint import pprint  # noqa
 
-from django.test import TransactionTestCase
+from django.test import TestCase, TransactionTestCase
 
 from telemetry.models import Coach, Driver
 from telemetry.pitcrew.coach import Coach as PitCrewCoach
 from telemetry.pitcrew.history import History
+from telemetry.pitcrew.message import Message
 
 from .utils import get_session_df, read_responses, save_responses  # noqa
 
@@ -58,10 +59,8 @@ class TestCoach(TransactionTestCase):
             history.init()
             history._do_init = False
 
-        # get the fast lap for the driver
-        fast_lap = driver.fast_laps.get(game=history.game, track=history.track, car=history.car)
-        driver_segments = fast_lap.data
-        self.assertIsNone(driver_segments)
+        # no live features for the driver yet
+        self.assertFalse(driver.live_features.exists())
 
         captured_responses = []
         try:
@@ -84,11 +83,11 @@ class TestCoach(TransactionTestCase):
         # pprint(captured_responses, width=200)
         self.assertEqual(captured_responses, expected_responses)
 
-        # get the fast lap for the driver
-        fast_lap.refresh_from_db()
-        driver_segments = fast_lap.data["segments"]
-        self.assertEqual(len(driver_segments), 8)
-        self.assertEqual(len(driver_segments[1].live_features["brake"]), 16)
+        # get the live features of the driver
+        history.flush_live_features()
+        self.assertEqual(len(history.segments), 8)
+        live_features = driver.live_features.filter(turn=history.segments[1].turn)
+        self.assertEqual(live_features.count(), 16)
 
     def test_track_guide(self):
         # Automobilista 2 / BMW M4 GT4/  Monza:Monza_2020
@@ -173,3 +172,63 @@ class TestCoach(TransactionTestCase):
 
         # pprint(captured_responses, width=200)
         self.assertEqual(captured_responses, expected_responses)
+
+
+class ScheduledMessage(Message):
+    """Responds at self.at and optionally moves to 300 meters, like MessageTrackGuideNotes."""
+
+    def __init__(self, at, msg, moves=False):
+        self.moves = moves
+        self.at_init = at
+        self.msg_init = msg
+        super().__init__(None)
+
+    def init(self):
+        self.at = self.at_init
+        self.msg = self.msg_init
+
+    def max_distance_delta(self):
+        return 10
+
+    def response_hot_lap(self, distance, telemetry):
+        response = super().response_hot_lap(distance, telemetry)
+        if response and self.moves:
+            self.at = 300
+        return response
+
+
+class TestCoachSchedule(TestCase):
+    def coach(self, messages):
+        history = History()
+        history.track_length = 1000
+        db_coach = Coach(driver=Driver(name="durandom"))
+        coach = PitCrewCoach(history, db_coach)
+        coach.messages = messages
+        coach.init_schedule()
+        return coach
+
+    def test_schedule(self):
+        messages = [
+            ScheduledMessage(100, "brake"),
+            ScheduledMessage(100.0, "gear 3"),
+            ScheduledMessage(100.5, "never"),
+            ScheduledMessage(None, "never"),
+            ScheduledMessage(2000, "never"),
+            ScheduledMessage(900, "note", moves=True),
+        ]
+        coach = self.coach(messages)
+        self.assertEqual(coach.schedule[100], messages[0:2])
+
+        responses = [(d, r["message"]) for lap in range(2) for d in range(1000) for r in coach.get_responses({}, d)]
+        self.assertEqual(
+            responses,
+            [(100, "brake"), (100, "gear 3"), (900, "note"), (100, "brake"), (100, "gear 3"), (300, "note")],
+        )
+        self.assertEqual(coach.schedule[900], [])
+        self.assertEqual(coach.schedule[300], [messages[5]])
+
+    def test_filter_from_invalid_topic(self):
+        coach = self.coach([])
+        self.assertEqual(coach.filter_from_topic("crewchief/durandom/1681897871"), {})
+        topic = "crewchief/durandom/1681897871/iRacing/fuji nochicane/Ferrari 488 GT3 Evo 2020/Practice"
+        self.assertEqual(coach.filter_from_topic(topic)["Driver"], "durandom")
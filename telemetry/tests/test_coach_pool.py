@@ -0,0 +1,94 @@
+from django.test import SimpleTestCase
+
+from telemetry.pitcrew.coach_pool import CoachPool
+from telemetry.pitcrew.history import History
+
+
+class FakeHistory:
+    def __init__(self):
+        self.connected = True
+        self.flushed = False
+
+    def disconnect(self):
+        self.connected = False
+
+    def flush_live_features(self):
+        self.flushed = True
+
+
+class FakePersister:
+    def stop(self):
+        pass
+
+
+class FakeCoach:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.history = FakeHistory()
+        self.persister = FakePersister()
+        self.ticks = []
+
+    def notify(self, topic, payload, now=None):
+        if self.fail:
+            raise ValueError("broken coach")
+        self.ticks.append(payload["DistanceRoundTrack"])
+
+
+class TestCoachPool(SimpleTestCase):
+    def _drain(self, pool):
+        for ingest in pool.ingests:
+            while item := ingest.get(timeout=0):
+                pool.handle(*item)
+
+    def test_routing_and_error_isolation(self):
+        pool = CoachPool(workers=2)
+        pool.max_errors = 3
+        good = FakeCoach()
+        bad = FakeCoach(fail=True)
+        pool.coaches = {"good": good, "bad": bad}
+
+        for distance in range(5):
+            for driver in ["good", "bad", "unknown"]:
+                topic = f"crewchief/{driver}/1681897871/iRacing/fuji nochicane/Ferrari 488 GT3 Evo 2020/Practice"
+                pool.notify(topic, {"DistanceRoundTrack": distance})
+        self._drain(pool)
+
+        # ticks of a driver are handled in order
+        self.assertEqual(good.ticks, [0, 1, 2, 3, 4])
+        # the failing coach is dropped without affecting the others
+        self.assertEqual(list(pool.coaches), ["good"])
+
+    def test_errors_in_a_row(self):
+        pool = CoachPool(workers=1)
+        pool.max_errors = 3
+        coach = FakeCoach()
+        pool.coaches = {"flaky": coach}
+        topic = "crewchief/flaky/1681897871/iRacing/fuji nochicane/Ferrari 488 GT3 Evo 2020/Practice"
+
+        # errors between successful ticks don't add up
+        for distance in range(10):
+            coach.fail = distance % 2 == 0
+            pool.handle(topic, {"DistanceRoundTrack": distance})
+        self.assertEqual(list(pool.coaches), ["flaky"])
+
+        coach.fail = True
+        for distance in range(3):
+            pool.handle(topic, {"DistanceRoundTrack": distance})
+        self.assertEqual(pool.coaches, {})
+
+    def test_stop_flushes_the_coaches(self):
+        pool = CoachPool(workers=1)
+        coaches = [FakeCoach(), FakeCoach()]
+        pool.coaches = {"a": coaches[0], "b": coaches[1]}
+        pool.stop()
+        self.assertEqual(pool.coaches, {})
+        for coach in coaches:
+            self.assertFalse(coach.history.connected)
+            self.assertTrue(coach.history.flushed)
+
+    def test_history_wakes_up_the_pool(self):
+        pool = CoachPool(workers=1)
+        history = History()
+        history.work_event = pool.history_event
+        history.set_filter({"Driver": "Jim"})
+        self.assertTrue(pool.history_event.is_set())
@@ -0,0 +1,30 @@
+from django.test import SimpleTestCase
+
+from telemetry.pitcrew.distance_flags import DistanceFlags
+
+
+class TestDistanceFlags(SimpleTestCase):
+    def test_ranges(self):
+        flags = DistanceFlags(100)
+        flags.set_range(10, 20)
+        self.assertTrue(flags[10])
+        self.assertTrue(flags[19])
+        self.assertFalse(flags[20])
+        self.assertEqual(flags.unset_in_range(5, 12), [5, 6, 7, 8, 9])
+
+        # wraps around the start / finish line
+        flags.set_range(95, 3)
+        self.assertTrue(flags[99])
+        self.assertTrue(flags[0])
+        self.assertTrue(flags[102])
+        self.assertFalse(flags[3])
+        self.assertEqual(flags.unset_in_range(93, 5), [93, 94, 3, 4])
+
+        flags.set_range(98, 2, False)
+        self.assertEqual(flags.unset_in_range(95, 3), [98, 99, 0, 1])
+        # an empty range
+        flags.set_range(50, 50)
+        self.assertFalse(flags[50])
+
+        flags.clear()
+        self.assertEqual(len(flags.unset_in_range(0, 99)), 99)
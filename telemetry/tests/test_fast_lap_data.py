@@ -0,0 +1,97 @@
+import io
+
+import numpy as np
+import pandas as pd
+from django.test import TestCase
+
+from telemetry.fast_lap_data import FastLapDataError, decode, encode, is_encoded
+from telemetry.models import Car, FastLap, Game, Track
+from telemetry.pitcrew.segment import Segment
+
+
+def analyzer_data():
+    segments = []
+    for turn, (start, end) in enumerate([(0, 400), (400, 900), (900, 50)], start=1):
+        segment = Segment()
+        segment.turn = turn
+        segment.start = start
+        segment.end = end
+        segment.type = "brake"
+        segment.time = np.float64(10.5 * turn)
+        segment.track_length = np.float64(1000.0)
+        segment.add_features({"start": np.float64(start + 10), "force": np.nan, "max_high": 0.9}, type="brake")
+        segment.add_features({"gear": 3, "distance_gear": {start: np.int64(3), start + 20: np.int64(4)}}, type="gear")
+        segment.telemetry = pd.DataFrame(
+            {
+                "_time": pd.date_range("2024-01-01", periods=5, freq="100ms", tz="UTC"),
+                "DistanceRoundTrack": np.linspace(start, start + 40, 5),
+                "Gear": np.array([3, 3, 4, 4, 4]),
+                "topic": ["crewchief/Jim/1/game/track/car/Race"] * 5,
+            },
+            index=range(10 * turn, 10 * turn + 5),
+        )
+        segments.append(segment)
+
+    distance_time = pd.DataFrame(
+        {
+            "DistanceRoundTrack": np.arange(0, 1000, 0.5).round(1),
+            "CurrentLapTime": np.linspace(0, 90, 2000).round(3),
+            "SpeedMs": np.full(2000, 42.0),
+        }
+    )
+    return {"segments": segments, "distance_time": distance_time, "lap_ids": {3, 1, 2}}
+
+
+class TestFastLapData(TestCase):
+    def test_round_trip(self):
+        data = analyzer_data()
+        blob = encode(data)
+        self.assertTrue(is_encoded(blob))
+
+        decoded = decode(blob)
+        self.assertEqual(decoded.version, 1)
+        self.assertEqual(decoded.get("lap_ids"), {1, 2, 3})
+        self.assertIsNone(decoded.get("unknown"))
+        pd.testing.assert_frame_equal(decoded["distance_time"], data["distance_time"])
+
+        segments = decoded["segments"]
+        self.assertEqual(len(segments), 3)
+        for segment, expected in zip(segments, data["segments"]):
+            self.assertEqual((segment.turn, segment.start, segment.end), (expected.turn, expected.start, expected.end))
+            self.assertEqual(segment.time, expected.time)
+            self.assertEqual(segment.brake_feature("start"), expected.brake_feature("start"))
+            self.assertTrue(np.isnan(segment.brake_feature("force")))
+            self.assertEqual(segment.gear_feature("distance_gear"), {segment.start: 3, segment.start + 20: 4})
+            self.assertEqual(segment.gear_distance(4), segment.start + 20)
+
+            # the telemetry is decoded on first access
+            self.assertNotIn("telemetry", segment.__dict__)
+            pd.testing.assert_frame_equal(segment.telemetry, expected.telemetry)
+
+    def test_invalid(self):
+        with self.assertRaises(FastLapDataError):
+            decode(b"not a fastlap")
+
+        buffer = io.BytesIO()
+        np.savez(buffer, version=np.array([99]), meta=np.frombuffer(b"{}", dtype=np.uint8))
+        with self.assertRaises(FastLapDataError):
+            decode(buffer.getvalue())
+
+    def test_model(self):
+        game = Game.objects.create(name="test_game")
+        track = Track.objects.create(name="test_track", game=game)
+        car = Car.objects.create(name="test_car", game=game)
+        fast_lap = FastLap.objects.create(game=game, track=track, car=car, data=analyzer_data())
+
+        # legacy pickled data
+        self.assertEqual(len(fast_lap.get_data()["segments"]), 3)
+
+        fast_lap.set_data(fast_lap.get_data())
+        fast_lap.save()
+
+        fast_lap = FastLap.objects.get(id=fast_lap.id)
+        self.assertIsNone(fast_lap.data)
+        data = fast_lap.get_data()
+        self.assertIs(data, fast_lap.get_data())
+        self.assertEqual([segment.turn for segment in data["segments"]], [1, 2, 3])
+        self.assertEqual(data["lap_ids"], {1, 2, 3})
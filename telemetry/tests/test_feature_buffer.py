@@ -0,0 +1,74 @@
+import random
+import statistics
+from collections import deque
+
+from django.test import SimpleTestCase
+from scipy.stats import zscore
+
+from telemetry.pitcrew.feature_buffer import FeatureBuffer
+from telemetry.pitcrew.segment import Segment
+
+
+def list_avg_feature(features, n, feature):
+    """avg_feature as it was implemented on a deque of dicts."""
+    if n and len(features) <= n:
+        return None
+    values = []
+    for i in range(-1, -len(features), -1):
+        value = features[i].get(feature)
+        if value and value is not None:
+            values.append(value)
+        if n and len(values) == n:
+            break
+    if (n and len(values) < n) or not values:
+        return None
+    values_clean = [x for x, z in zip(values, zscore(values)) if abs(z) < 1]
+    if values_clean:
+        return statistics.mean(values_clean)
+    return values[0]
+
+
+class TestFeatureBuffer(SimpleTestCase):
+    def test_ring(self):
+        buffer = FeatureBuffer([{"start": i} for i in range(5)], maxlen=3)
+        self.assertEqual(list(buffer), [{"start": 2}, {"start": 3}, {"start": 4}])
+        self.assertEqual(buffer[-1], {"start": 4})
+        self.assertEqual(buffer[0], {"start": 2})
+        # the oldest row is skipped
+        values, ints = buffer.recent("start")
+        self.assertEqual(values.tolist(), [4, 3])
+
+        # without maxlen the buffer grows
+        buffer = FeatureBuffer()
+        for i in range(40):
+            buffer.append({"start": i, "gear": {i: 3}} if i % 2 else {"start": i})
+        self.assertEqual([f["start"] for f in buffer], list(range(40)))
+        self.assertEqual(buffer.recent("start", n=3)[0].tolist(), [39, 38, 37])
+        self.assertEqual(buffer.recent("gear", n=2)[0].tolist(), [{39: 3}, {37: 3}])
+
+    def test_same_as_lists(self):
+        rng = random.Random(19)
+        for maxlen in (None, 3, 10):
+            segment = Segment()
+            segment.init_live_features({}, maxlen=maxlen)
+            rows = deque(maxlen=maxlen)
+            for lap in range(30):
+                features = {
+                    "start": rng.choice([None, 0, rng.randint(100, 130), rng.uniform(100, 130)]),
+                    "gear": rng.choice([3, 3, 4]),
+                    "force": rng.choice([0.5, 0.5, 0.5]),
+                }
+                if lap % 4:
+                    features["sector_lap_time"] = round(rng.uniform(20, 22), 3)
+                rows.append(features)
+                segment.add_live_features(features, type="brake")
+
+                for feature in ("start", "gear", "force", "sector_lap_time", "unknown"):
+                    for n in (0, 1, 3):
+                        expected = list_avg_feature(rows, n, feature)
+                        value = segment.avg_feature(n=n, feature=feature, type="brake")
+                        if isinstance(expected, float):
+                            self.assertAlmostEqual(value, expected, places=9)
+                        else:
+                            self.assertEqual(value, expected)
+                        self.assertIs(type(value), type(expected))
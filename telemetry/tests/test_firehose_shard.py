@@ -0,0 +1,61 @@
+import datetime
+import queue
+
+import django.utils.timezone
+from django.test import TestCase
+
+from telemetry.models import Driver
+from telemetry.pitcrew.active_drivers import ActiveDrivers
+from telemetry.pitcrew.coach_watcher import CoachWatcher
+from telemetry.pitcrew.firehose_shard import ShardedActiveDrivers
+from telemetry.utils import shard_for_topic
+
+
+class TestFirehoseShard(TestCase):
+    def test_shard_for_topic(self):
+        topic = "crewchief/durandom/1681897871/iRacing/fuji nochicane/Ferrari 488 GT3 Evo 2020/Practice"
+        other_session = "crewchief/durandom/1681897872/iRacing/monza full/Ferrari 488 GT3 Evo 2020/Race"
+        shard = shard_for_topic(topic, 4)
+
+        self.assertTrue(0 <= shard < 4)
+        # all sessions of a driver end up in the same shard
+        self.assertEqual(shard, shard_for_topic(other_session, 4))
+        self.assertEqual(shard_for_topic("invalid", 4), 0)
+
+    def test_update_sessions(self):
+        driver = Driver.objects.create(name="durandom")
+        now = django.utils.timezone.now()
+        topic = "crewchief/durandom/1681897871/iRacing/fuji nochicane/Ferrari 488 GT3 Evo 2020/Practice"
+
+        active_drivers = ShardedActiveDrivers(queue.Queue(), 2)
+        active_drivers.update_sessions([(topic, driver, now - datetime.timedelta(seconds=5))])
+        active_drivers.update_sessions([(topic, driver, now)])
+
+        self.assertEqual(len(active_drivers.sessions), 1)
+        self.assertEqual(active_drivers.sessions[topic].driver, driver)
+        self.assertEqual(active_drivers.sessions[topic].end, now)
+
+        active_drivers.clear_sessions(now + datetime.timedelta(minutes=11))
+        self.assertEqual(active_drivers.sessions, {})
+
+    def test_driver_registration(self):
+        active_drivers = ActiveDrivers()
+        active_drivers.threaded = False
+        now = django.utils.timezone.now()
+        topic = "crewchief/driver {}/1681897871/iRacing/fuji nochicane/Ferrari 488 GT3 Evo 2020/Practice"
+        topics = [topic.format(n) for n in range(3)]
+        Driver.objects.create(name="driver 0")
+
+        with self.assertNumQueries(0):
+            for topic in topics:
+                active_drivers.notify(topic, {}, now)
+        self.assertEqual(active_drivers.pending, set(topics))
+        coach_watcher = CoachWatcher(active_drivers, runtime=CoachWatcher.RUNTIME_POOL)
+        self.assertEqual(coach_watcher.drivers(), set())
+
+        # all pending drivers are created in one batch
+        self.assertTrue(active_drivers.register_pending())
+        self.assertEqual(active_drivers.pending, set())
+        drivers = {session.driver for session in active_drivers.sessions.values()}
+        self.assertEqual({driver.name for driver in drivers}, {"driver 0", "driver 1", "driver 2"})
+        self.assertEqual(coach_watcher.drivers(), drivers)
@@ -1,10 +1,12 @@
+import threading
 from pprint import pprint  # noqa
 
-from django.test import TransactionTestCase
+from django.test import SimpleTestCase, TransactionTestCase
 
 from telemetry.models import Driver
 from telemetry.pitcrew.coach import Coach as PitCrewCoach
 from telemetry.pitcrew.history import History
+from telemetry.pitcrew.segment import Segment
 
 from .utils import get_session_df
 
@@ -38,3 +40,70 @@ class TestHistory(TransactionTestCase):
         history.init()
 
         self.assertEqual(history.track_length, 4460)
+
+
+class TestHistoryWorker(SimpleTestCase):
+    def test_segment_queue(self):
+        history = History()
+        segments = []
+        for turn, (start, end) in enumerate([(0, 99), (100, 199)]):
+            segment = Segment(history)
+            segment.start = start
+            segment.end = end
+            segment.turn = turn + 1
+            segments.append(segment)
+        history.segments = segments
+        history.track_length = 200
+        history.init_segment_index()
+
+        for meters in range(0, 120, 10):
+            history.update_telemetry(meters, {"DistanceRoundTrack": meters})
+
+        self.assertEqual(len(history.process_segments), 1)
+        (segment, features, enqueued_at) = history.process_segments[0]
+        self.assertEqual(segment.turn, 1)
+        self.assertEqual(len(features), 10)
+        self.assertIsNone(history.segment_latency())
+
+    def test_segment_index(self):
+        history = History()
+        segments = []
+        for turn, (start, end) in enumerate([(950, 99), (100, 499), (500, 949)]):
+            segment = Segment(history)
+            segment.start = start
+            segment.end = end
+            segment.turn = turn + 1
+            segments.append(segment)
+        history.segments = segments
+        history.track_length = 1000
+        history.init_segment_index()
+
+        self.assertEqual(history.segment_at(999).turn, 1)
+        self.assertEqual(history.segment_at(0).turn, 1)
+        self.assertEqual(history.segment_at(100).turn, 2)
+        self.assertEqual(history.segment_at(949).turn, 3)
+        self.assertIsNone(history.segment_at(1000))
+
+        # big jumps, e.g. a reset to the pits, find the segment directly
+        history.update_telemetry(10, {})
+        history.update_telemetry(600, {})
+        history.update_telemetry(20, {})
+        self.assertEqual([item[0].turn for item in history.process_segments], [1, 3])
+        self.assertEqual(history.current_segment.turn, 1)
+
+    def test_wake_on_set_filter(self):
+        initialized = threading.Event()
+
+        class WakeHistory(History):
+            def init(self):
+                initialized.set()
+
+        history = WakeHistory()
+        t = threading.Thread(target=history.run)
+        t.start()
+        history.set_filter({"SessionId": "1681897871"})
+        # the worker blocks on the queue, it doesn't wait for a poll interval
+        self.assertTrue(initialized.wait(timeout=0.5))
+        history.disconnect()
+        t.join(timeout=5)
+        self.assertFalse(t.is_alive())
@@ -0,0 +1,34 @@
+from django.test import SimpleTestCase
+
+from telemetry.pitcrew.ingest import Ingest
+
+
+class TestIngest(SimpleTestCase):
+    def _fill(self, policy):
+        ingest = Ingest(None, maxsize=3, policy=policy)
+        for i in range(5):
+            ingest.put("crewchief/a", {"tick": i})
+        ingest.put("crewchief/b", {"tick": 0})
+        ingest.stop()
+
+        ticks = []
+        while item := ingest.get(timeout=0):
+            ticks.append((item[0], item[1]["tick"]))
+        return ingest, ticks
+
+    def test_drop_oldest(self):
+        ingest, ticks = self._fill(Ingest.POLICY_DROP_OLDEST)
+        self.assertEqual(ingest.dropped, 2)
+        self.assertEqual(ingest.coalesced, 0)
+        # topics are served round robin
+        self.assertEqual(ticks, [("crewchief/a", 2), ("crewchief/b", 0), ("crewchief/a", 3), ("crewchief/a", 4)])
+
+    def test_coalesce(self):
+        ingest, ticks = self._fill(Ingest.POLICY_COALESCE)
+        self.assertEqual(ingest.dropped, 0)
+        self.assertEqual(ingest.coalesced, 4)
+        self.assertEqual(ticks, [("crewchief/a", 4), ("crewchief/b", 0)])
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            Ingest(None, policy="ignore")
@@ -0,0 +1,70 @@
+from django.test import SimpleTestCase, TestCase
+
+from telemetry.models import Lap
+from telemetry.pitcrew.lap_detector import detect_laps
+from telemetry.pitcrew.session import Session
+from telemetry.pitcrew.session_key import SessionKey
+from telemetry.pitcrew.session_rbr import SessionRbr
+from telemetry.pitcrew.session_saver import SessionHolder, SessionSaver
+
+from .utils import get_session_df
+
+
+class TestLapDetector(SimpleTestCase):
+    def replay(self, session_df, session):
+        for row in session_df.to_dict("records"):
+            session.signal(row, row["_time"])
+        return session.laps
+
+    def assert_same_laps(self, session_id, rbr=False):
+        session_df = get_session_df(session_id)
+        expected = self.replay(session_df, SessionRbr(666) if rbr else Session(666))
+        laps = detect_laps(session_df, rbr=rbr)
+
+        self.assertEqual(laps.keys(), expected.keys())
+        for number, lap in laps.items():
+            expected_lap = expected[number]
+            self.assertEqual(
+                (lap.number, lap.time, lap.valid, lap.finished, lap.length, lap.start, lap.end),
+                (
+                    expected_lap.number,
+                    expected_lap.time,
+                    expected_lap.valid,
+                    expected_lap.finished,
+                    expected_lap.length,
+                    expected_lap.start,
+                    expected_lap.end,
+                ),
+                f"session {session_id} lap {number}",
+            )
+
+    def test_same_laps_as_session(self):
+        for session_id in ["1681021274", "1673613558", "1672395579", "1692140843", "1694266648"]:
+            self.assert_same_laps(session_id)
+
+    def test_same_lap_as_rbr_session(self):
+        self.assert_same_laps("1703706617", rbr=True)
+        laps = detect_laps(get_session_df("1703706617"), rbr=True)
+        self.assertEqual((laps[0].time, laps[0].finished), (210.600174, True))
+
+    def test_missing_fields(self):
+        session_df = get_session_df("1681021274").drop(columns=["LapTimePrevious"])
+        self.assertEqual(detect_laps(session_df), {})
+
+
+class TestSaveDetectedLaps(TestCase):
+    def test_save_laps(self):
+        session_df = get_session_df("1681021274")
+        topic = session_df["topic"].iloc[0]
+        session = Session(topic, start=session_df["_time"].iloc[0])
+        session.end = session_df["_time"].iloc[-1]
+        SessionKey.from_topic(topic).init_session(session, {})
+        session.laps = detect_laps(session_df)
+
+        holder = SessionHolder()
+        holder.sessions[topic] = session
+        SessionSaver(holder).save_sessions()
+
+        finished = {number for number, lap in session.laps.items() if lap.finished}
+        self.assertTrue(finished)
+        self.assertEqual(set(Lap.objects.values_list("number", flat=True)), finished)
@@ -0,0 +1,83 @@
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase
+
+from telemetry.models import Car, Driver, Game, LiveFeature, Track
+from telemetry.pitcrew.live_feature_writer import LiveFeatureWriter
+from telemetry.pitcrew.segment import Segment
+
+
+class TestLiveFeatureWriter(TestCase):
+    def setUp(self):
+        self.game = Game.objects.create(name="test_game")
+        self.track = Track.objects.create(name="test_track", game=self.game)
+        self.car = Car.objects.create(name="test_car", game=self.game)
+        self.driver = Driver.objects.create(name="test_driver")
+
+    def writer(self, **kwargs):
+        return LiveFeatureWriter(self.driver, self.game, self.track, self.car, session_id="666", **kwargs)
+
+    def test_write_behind(self):
+        writer = self.writer(flush_interval=3600, max_pending=2)
+
+        writer.add(1, {"brake": {"start": 100}, "gear": {"gear": 3}})
+        writer.maybe_flush()
+        # buffered, but not written yet
+        self.assertEqual(LiveFeature.objects.count(), 0)
+
+        writer.add(1, {"brake": {"start": 101}, "gear": {"gear": 3}})
+        writer.maybe_flush()
+        self.assertEqual(LiveFeature.objects.count(), 2)
+        self.assertEqual(writer.pending, [])
+
+        # end of session
+        writer.add(2, {"brake": {"start": np.float64(202.5), "force": np.nan}})
+        writer.flush()
+        writer.flush()
+        self.assertEqual(writer.flushes, 2)
+        self.assertEqual(writer.flushed_features, 3)
+
+        feature = LiveFeature.objects.get(turn=2)
+        self.assertEqual(feature.session_id, "666")
+        self.assertEqual(feature.features, {"brake": {"start": 202.5, "force": None}})
+
+    def test_failed_write(self):
+        writer = self.writer(flush_interval=3600, max_pending=2)
+        for turn in range(3):
+            writer.add(turn, {"gear": {"gear": 3}})
+        self.assertTrue(writer.due())
+
+        with mock.patch.object(LiveFeature.objects, "bulk_create", side_effect=Exception("database is down")):
+            writer.flush()
+        # the newest features are kept, the write is not retried before flush_interval
+        self.assertEqual([row.turn for row in writer.pending], [1, 2])
+        self.assertEqual(writer.dropped_features, 1)
+        self.assertFalse(writer.due())
+
+        writer.retry_after = 0
+        self.assertTrue(writer.due())
+        writer.flush()
+        self.assertEqual(sorted(LiveFeature.objects.values_list("turn", flat=True)), [1, 2])
+
+    def test_recent(self):
+        writer = self.writer()
+        for lap in range(5):
+            writer.add(1, {"other": {"sector_lap_time": 10 + lap}})
+            writer.add(2, {"other": {"sector_lap_time": 20 + lap}})
+        writer.flush()
+
+        recent = LiveFeature.objects.for_fast_lap(self.driver, self.game, self.track, self.car).recent(laps=3)
+        self.assertEqual(sorted(recent), [1, 2])
+        self.assertEqual([f["other"]["sector_lap_time"] for f in recent[1]], [12, 13, 14])
+        self.assertEqual([f["other"]["sector_lap_time"] for f in recent[2]], [22, 23, 24])
+
+        other_driver = Driver.objects.create(name="other_driver")
+        self.assertEqual(LiveFeature.objects.for_fast_lap(other_driver, self.game, self.track, self.car).recent(), {})
+
+    def test_segment_keeps_recent_laps(self):
+        segment = Segment()
+        segment.init_live_features({"other": [{"sector_lap_time": t} for t in (1, 2, 3)]}, maxlen=3)
+        segment.add_live_features({"sector_lap_time": 4}, type="other")
+        self.assertEqual([f["sector_lap_time"] for f in segment.live_features["other"]], [2, 3, 4])
+        self.assertEqual(len(segment.live_features["brake"]), 0)
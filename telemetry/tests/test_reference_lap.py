@@ -0,0 +1,162 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+from django.test import TestCase
+
+from telemetry.models import Car, Driver, FastLap, Game, Track
+from telemetry.pitcrew.history import History
+from telemetry.pitcrew.reference_lap import ReferenceLap, ReferenceLapCache, reference_laps
+
+from .test_fast_lap_data import analyzer_data
+
+
+class TestReferenceLapCache(TestCase):
+    def setUp(self):
+        self.game = Game.objects.create(name="test_game")
+        self.track = Track.objects.create(name="test_track", game=self.game, length=1000)
+        self.car = Car.objects.create(name="test_car", game=self.game)
+        self.fast_lap = FastLap(game=self.game, track=self.track, car=self.car)
+        self.fast_lap.set_data(analyzer_data())
+        self.fast_lap.save()
+
+    def test_hit(self):
+        cache = ReferenceLapCache()
+        reference_lap = cache.get(self.game, self.track, self.car, 1000)
+        self.assertEqual(len(reference_lap.segments), 3)
+        self.assertEqual(reference_lap.distance_speed[500], 42.0)
+
+        self.assertIs(cache.get(self.game, self.track, self.car, 1000), reference_lap)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # a FastLap saved by another process
+        FastLap.objects.filter(id=self.fast_lap.id).update(modified=self.fast_lap.modified + datetime.timedelta(1))
+        self.assertIsNot(cache.get(self.game, self.track, self.car, 1000), reference_lap)
+        self.assertEqual(cache.misses, 2)
+
+        # another reference FastLap added without signals, e.g. by another process
+        reference_lap = cache.get(self.game, self.track, self.car, 1000)
+        FastLap.objects.bulk_create(
+            [FastLap(game=self.game, track=self.track, car=self.car, modified=self.fast_lap.modified)]
+        )
+        self.assertIsNot(cache.get(self.game, self.track, self.car, 1000), reference_lap)
+        self.assertEqual(cache.misses, 3)
+
+    def test_driver_fast_laps_are_ignored(self):
+        FastLap.objects.filter(id=self.fast_lap.id).update(driver=Driver.objects.create(name="test_driver"))
+        self.assertIsNone(ReferenceLapCache().get(self.game, self.track, self.car, 1000))
+
+    def test_invalidate_on_save(self):
+        reference_lap = reference_laps.get(self.game, self.track, self.car, 1000)
+        self.fast_lap.save()
+        self.assertNotIn((self.game.id, self.track.id, self.car.id), reference_laps.entries)
+        self.assertIsNot(reference_laps.get(self.game, self.track, self.car, 1000), reference_lap)
+
+    def test_lru(self):
+        cache = ReferenceLapCache(max_size=1)
+        other_track = Track.objects.create(name="other_track", game=self.game, length=1000)
+        other_fast_lap = FastLap(game=self.game, track=other_track, car=self.car)
+        other_fast_lap.set_data(analyzer_data())
+        other_fast_lap.save()
+
+        cache.get(self.game, self.track, self.car, 1000)
+        cache.get(self.game, other_track, self.car, 1000)
+        self.assertEqual(list(cache.entries), [(self.game.id, other_track.id, self.car.id)])
+        self.assertIsNone(cache.get(self.game, Track.objects.create(name="empty", game=self.game), self.car, 1000))
+
+    def test_history_segments(self):
+        histories = []
+        for _ in range(2):
+            history = History()
+            history.game, history.track, history.car = self.game, self.track, self.car
+            history.track_length = 1000
+            history.filter = {"GameName": "test_game", "TrackCode": "test_track", "CarModel": "test_car"}
+            self.assertTrue(history.init_segments())
+            histories.append(history)
+
+        a, b = histories
+        self.assertIs(a.reference_lap, b.reference_lap)
+        # each History has its own segments to collect live features
+        self.assertIsNot(a.segments[0], b.segments[0])
+        self.assertIs(a.segments[0].history, a)
+        self.assertIs(a.segments[0].next_segment, a.segments[1])
+        a.segments[0].add_live_features({"start": 1}, type="brake")
+        self.assertEqual(len(b.segments[0].live_features["brake"]), 0)
+        self.assertEqual(a.segment_at(500), a.segments[1])
+        self.assertEqual(b.segment_at(500), b.segments[1])
+        # one read only meter -> segment index for all of them
+        self.assertIs(a.segment_index, b.segment_index)
+        self.assertFalse(a.segment_index.flags.writeable)
+        self.assertEqual(a.segments[0].brake_feature("start"), 10)
+
+
+class TestLookupTables(TestCase):
+    def history(self, lap_times, speeds):
+        fast_lap = FastLap(id=1)
+        fast_lap.data = {
+            "segments": [],
+            "distance_time": pd.DataFrame(
+                {"DistanceRoundTrack": np.arange(len(lap_times)), "CurrentLapTime": lap_times, "SpeedMs": speeds}
+            ),
+        }
+        reference_lap = ReferenceLap(fast_lap, len(lap_times) - 1)
+        reference_lap.build_lookup_tables()
+        history = History()
+        history.track_length = reference_lap.track_length
+        history.distance_lap_time = reference_lap.distance_lap_time
+        history.distance_speed = reference_lap.distance_speed
+        history.lap_times = reference_lap.lap_times
+        history.lap_time_distances = reference_lap.lap_time_distances
+        history.lap_time_max = reference_lap.lap_time_max
+        return history
+
+    def test_same_as_dicts(self):
+        rng = np.random.default_rng(42)
+        # not monotonic and with repeated lap times
+        lap_times = np.round(np.sort(rng.uniform(0, 90, 1000)), 1)
+        lap_times[:20] = lap_times[:20][::-1]
+        history = self.history(lap_times, rng.uniform(20, 80, 1000))
+
+        map_time_distance = dict(zip(lap_times, range(1000)))
+        for lap_time in list(rng.uniform(-5, 95, 500)) + list(lap_times[::7]):
+            expected = map_time_distance[min(map_time_distance, key=lambda x: abs(x - lap_time))]
+            distance = history.distance_at_lap_time(lap_time)
+            # of two equally close lap times the dicts returned the first inserted
+            self.assertEqual(abs(lap_times[distance] - lap_time), abs(lap_times[expected] - lap_time))
+
+        self.assertEqual(history.lap_time_at_distance(10), lap_times[10])
+        self.assertEqual(history.lap_time_at_distance(10.5), 0.0)
+        self.assertEqual(history.speed_at_distance(2000, log_missing=False), 0.0)
+
+    def test_distance_add_seconds(self):
+        lap_times = np.linspace(0, 99.9, 1000)
+        history = self.history(lap_times, np.full(1000, 10.0))
+        self.assertEqual(history.distance_add_seconds(100, 5), 150)
+        # wraps around the start / finish line
+        self.assertEqual(history.distance_add_seconds(990, 5), 41)
+        self.assertEqual(history.distance_add_seconds(20, -5), 969)
+
+    def test_offset_distance(self):
+        rng = np.random.default_rng(7)
+        lap_times = np.cumsum(rng.uniform(0.05, 0.2, 1000))
+        lap_times[300:310] = lap_times[300]
+        history = self.history(lap_times, np.full(1000, 10.0))
+
+        def walk_back(distance, seconds):
+            lap_time_at_offset = lap_times[distance] - seconds
+            while lap_times[distance] > lap_time_at_offset and distance > 0:
+                distance -= 1
+            return distance
+
+        for distance in range(0, 1000, 37):
+            for seconds in (0, 0.5, 3, 10):
+                if lap_times[distance] - seconds >= 0:
+                    self.assertEqual(history.offset_distance(distance, seconds), walk_back(distance, seconds))
+
+        # wraps around the start / finish line
+        distance = history.offset_distance(5, 2)
+        self.assertGreater(distance, 900)
+        self.assertLessEqual(lap_times[distance], lap_times[5] - 2 + lap_times[-1])
+        self.assertGreater(lap_times[distance + 1], lap_times[5] - 2 + lap_times[-1])
+        # unknown distances are returned as is
+        self.assertEqual(history.offset_distance(5000, 2), 5000)
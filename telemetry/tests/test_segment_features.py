@@ -0,0 +1,51 @@
+import math
+
+import pandas as pd
+from django.test import SimpleTestCase
+
+from telemetry.analyzer import Analyzer
+from telemetry.fast_lap_analyzer import FastLapAnalyzer
+from telemetry.pitcrew.segment_features import SegmentFeatures
+
+from .utils import get_session_df
+
+
+class TestSegmentFeatures(SimpleTestCase):
+    def assert_features_equal(self, expected, features):
+        self.assertEqual(expected.keys(), features.keys())
+        for key, value in expected.items():
+            if isinstance(value, float) and math.isnan(value):
+                self.assertTrue(math.isnan(features[key]), key)
+            else:
+                self.assertEqual(value, features[key], key)
+
+    def test_recorded_sessions(self):
+        # split the recorded laps into 300m segments and compare with the DataFrame based analyzers
+        analyzer = Analyzer()
+        fast_lap_analyzer = FastLapAnalyzer()
+        for session_id in ["1681897871", "1673613558"]:
+            session_df = get_session_df(session_id)
+            segments = []
+            previous_sector = None
+            for row in session_df.to_dict(orient="records"):
+                if row["DistanceRoundTrack"] is None:
+                    continue
+                sector = int(row["DistanceRoundTrack"] // 300)
+                if sector != previous_sector:
+                    segments.append([])
+                    previous_sector = sector
+                segments[-1].append(row)
+
+            for telemetry in segments:
+                df = fast_lap_analyzer.preprocess(pd.DataFrame.from_records(telemetry))
+                features = SegmentFeatures()
+                for row in telemetry:
+                    features.add(row)
+
+                self.assert_features_equal(fast_lap_analyzer.brake_features(df), features.brake_features())
+                self.assert_features_equal(fast_lap_analyzer.throttle_features(df), features.throttle_features())
+                self.assert_features_equal(fast_lap_analyzer.gear_features(df), features.gear_features())
+                self.assert_features_equal(
+                    {"sector_time": analyzer.sector_time(df), "sector_lap_time": analyzer.sector_lap_time(df)},
+                    features.other_features(),
+                )
@@ -0,0 +1,42 @@
+import datetime
+
+import django.utils.timezone
+from django.test import SimpleTestCase
+
+from telemetry.pitcrew.firehose import Firehose
+from telemetry.pitcrew.session_expiry import SessionExpiry
+
+
+class TestSessionExpiry(SimpleTestCase):
+    def test_expired(self):
+        now = django.utils.timezone.now()
+        expiry = SessionExpiry(max_age=600)
+        expiry.touch("a", now)
+        expiry.touch("b", now)
+        expiry.touch("c", now)
+        for seconds in range(0, 500, 10):
+            # seen again, only the last time counts
+            expiry.touch("b", now + datetime.timedelta(seconds=seconds))
+        expiry.remove("c")
+
+        self.assertEqual(expiry.expired(now + datetime.timedelta(seconds=600)), [])
+        self.assertEqual(expiry.expired(now + datetime.timedelta(seconds=601)), ["a"])
+        self.assertEqual(len(expiry), 1)
+        # b was pushed again with the time it was last seen
+        self.assertEqual(len(expiry.heap), 1)
+        self.assertEqual(expiry.expired(now + datetime.timedelta(seconds=1091)), ["b"])
+
+        expiry.touch("c", now)
+        # more than a day old, not just the seconds part of the timedelta
+        self.assertEqual(expiry.expired(now + datetime.timedelta(days=1, seconds=60)), ["c"])
+        self.assertEqual(len(expiry), 0)
+
+    def test_firehose(self):
+        now = django.utils.timezone.now()
+        firehose = Firehose()
+        topic = "crewchief/Jim/1/iRacing/track/car/Race"
+        firehose.notify(topic, {}, now)
+        firehose.clear_sessions(now + datetime.timedelta(minutes=5))
+        self.assertIn(topic, firehose.sessions)
+        firehose.clear_sessions(now + datetime.timedelta(days=1))
+        self.assertEqual(firehose.sessions, {})
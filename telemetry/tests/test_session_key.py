@@ -0,0 +1,39 @@
+from django.test import SimpleTestCase
+
+from telemetry.pitcrew.session_key import SessionKey
+
+
+class TestSessionKey(SimpleTestCase):
+    topic = "crewchief/durandom/1681897871/iRacing/fuji nochicane/Ferrari 488 GT3 Evo 2020/Practice"
+
+    def test_from_topic(self):
+        key = SessionKey.from_topic(self.topic)
+        self.assertIs(key, SessionKey.from_topic(self.topic))
+        self.assertEqual(key, SessionKey.parse(self.topic))
+        self.assertEqual(key.driver, "durandom")
+        self.assertEqual(key.session_id, "1681897871")
+        self.assertEqual(key.track, "fuji nochicane")
+        self.assertEqual(key.session_type, "Practice")
+        self.assertFalse(key.is_rbr)
+        self.assertEqual(
+            key.filter(),
+            {
+                "Driver": "durandom",
+                "GameName": "iRacing",
+                "TrackCode": "fuji nochicane",
+                "CarModel": "Ferrari 488 GT3 Evo 2020",
+                "SessionId": "1681897871",
+                "SessionType": "Practice",
+            },
+        )
+
+    def test_immutable(self):
+        key = SessionKey.from_topic(self.topic)
+        with self.assertRaises(AttributeError):
+            key.driver = "someone"
+        with self.assertRaises(AttributeError):
+            key.ids = {}
+
+    def test_invalid_topic(self):
+        self.assertIsNone(SessionKey.from_topic("crewchief/durandom/1681897871"))
+        self.assertIsNone(SessionKey.from_topic(self.topic + "/extra"))
@@ -0,0 +1,193 @@
+import datetime
+from unittest import mock
+
+import django.utils.timezone
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from telemetry.models import Game, Lap
+from telemetry.models import Session as SessionModel
+from telemetry.models import Track
+from telemetry.pitcrew.persister import Persister
+from telemetry.pitcrew.session import Lap as SessionLap
+from telemetry.pitcrew.session import Session
+from telemetry.pitcrew.session_key import SessionKey
+from telemetry.pitcrew.session_saver import SessionHolder, SessionSaver
+from telemetry.pitcrew.session_writer import SessionWriter
+
+
+class TestSessionSaver(TestCase):
+    def setUp(self):
+        self.firehose = SessionHolder()
+        self.now = django.utils.timezone.now()
+
+    def add_session(self, n, driver="Jim", game="iRacing", laps=1):
+        session = Session(f"crewchief/{driver}/{n}/{game}/track/car/Race", start=self.now)
+        session.driver = driver
+        session.session_id = str(n)
+        session.game_name = game
+        session.track = "track"
+        session.car = "car"
+        session.car_class = "class"
+        session.session_type = "Race"
+        session.end = self.now + datetime.timedelta(minutes=laps)
+        for number in range(1, laps + 1):
+            self.add_lap(session, number)
+        self.firehose.sessions[session.id] = session
+        return session
+
+    def add_lap(self, session, number, length=1000):
+        start = self.now + datetime.timedelta(minutes=number - 1)
+        lap = SessionLap(number, time=60.0, length=length, start=start, end=start + datetime.timedelta(minutes=1))
+        lap.finished = True
+        session.laps[number] = lap
+
+    def save(self, saver):
+        with CaptureQueriesContext(connection) as queries:
+            saver.save_sessions()
+        return len(queries)
+
+    def test_constant_queries(self):
+        self.add_session(1)
+        one_session = self.save(SessionSaver(self.firehose))
+        self.assertEqual(SessionModel.objects.count(), 1)
+        self.assertEqual(Lap.objects.count(), 1)
+
+        self.firehose.sessions.clear()
+        for n in range(2, 7):
+            self.add_session(n, driver=f"driver {n}", laps=3)
+        self.assertLessEqual(self.save(SessionSaver(self.firehose)), one_session)
+        self.assertEqual(SessionModel.objects.count(), 6)
+        self.assertEqual(Lap.objects.count(), 16)
+        self.assertEqual(Track.objects.count(), 1)
+
+        # the next cycle only saves the new laps
+        saver = SessionSaver(self.firehose)
+        saver.save_sessions()
+        for session in self.firehose.sessions.values():
+            self.add_lap(session, 4, length=1010)
+            session.end = self.now + datetime.timedelta(minutes=10)
+        self.assertEqual(self.save(saver), 3)
+        self.assertEqual(Lap.objects.count(), 21)
+        self.assertEqual(Track.objects.get().length, 1010)
+        ends = SessionModel.objects.exclude(session_id="1").values_list("end", flat=True)
+        self.assertEqual(set(ends), {self.now + datetime.timedelta(minutes=10)})
+        self.assertEqual(self.save(saver), 0)
+
+    def test_saved_laps_are_skipped(self):
+        session = self.add_session(1, laps=2)
+        SessionSaver(self.firehose).save_sessions()
+        for lap in session.laps.values():
+            lap.persisted = False
+        SessionSaver(self.firehose).save_sessions()
+        self.assertEqual(Lap.objects.count(), 2)
+        self.assertTrue(all(lap.persisted for lap in session.laps.values()))
+
+    def test_fetch_sessions(self):
+        session = self.add_session(1, game="unknown")
+        saver = SessionSaver(self.firehose, save=False)
+        saver.fetch_sessions()
+        self.assertIsNone(session.record)
+        self.assertFalse(Game.objects.filter(name="unknown").exists())
+
+        # unknown names are cached, the next loop does not query them again
+        with CaptureQueriesContext(connection) as queries:
+            saver.fetch_sessions()
+        self.assertEqual(len(queries), 0)
+
+        SessionSaver(self.firehose).save_sessions()
+        other = self.add_session(2, game="unknown")
+        saver.dimensions.clear()
+        saver.fetch_sessions()
+        self.assertIsNone(other.record.pk)
+        self.assertEqual(other.car.name, "car")
+
+
+class TestPersister(TestCase):
+    def test_laps_are_written_by_the_writer(self):
+        persister = Persister()
+        persister.writer.threaded = False
+        topic = "crewchief/Jim/1/iRacing/track/car/Race"
+        now = django.utils.timezone.now()
+
+        def tick(distance, lap, lap_time_previous=0.0):
+            telemetry = {
+                "DistanceRoundTrack": distance,
+                "CurrentLap": lap,
+                "CurrentLapTime": 1.0,
+                "LapTimePrevious": lap_time_previous,
+                "CurrentLapIsValid": True,
+                "PreviousLapWasValid": True,
+            }
+            persister.notify(topic, telemetry, now + datetime.timedelta(seconds=distance))
+
+        for distance in (900, 950, 10, 500, 990):
+            tick(distance, 1)
+        tick(5, 2, 60.5)
+        tick(10, 2, 60.5)
+
+        # notify only hands the finished lap over
+        self.assertEqual(Lap.objects.count(), 0)
+        self.assertTrue(persister.sessions[topic].laps[1].persisted)
+
+        persister.stop()
+        lap = Lap.objects.get()
+        self.assertEqual((lap.number, lap.time, lap.length, lap.valid), (1, 60.5, 990, True))
+
+    def test_sessions_without_laps_are_written(self):
+        persister = Persister()
+        persister.writer.threaded = False
+        topic = "crewchief/Jim/3/iRacing/track/car/Race"
+        now = django.utils.timezone.now()
+        for seconds in range(3):
+            persister.notify(topic, {"DistanceRoundTrack": 100 + seconds}, now + datetime.timedelta(seconds=seconds))
+
+        persister.stop()
+        session = SessionModel.objects.get(session_id="3")
+        self.assertEqual((session.start, session.end), (now, now + datetime.timedelta(seconds=2)))
+        self.assertEqual(Lap.objects.count(), 0)
+
+
+class TestSessionWriter(TestCase):
+    def test_expired_session_is_kept_until_written(self):
+        writer = SessionWriter()
+        writer.threaded = False
+        now = django.utils.timezone.now()
+        topic = "crewchief/Jim/1/iRacing/track/car/Race"
+        session = Session(topic, start=now)
+        SessionKey.from_topic(topic).init_session(session, {"CarClass": "class"})
+        lap = SessionLap(1, time=60.0, length=1000, start=now, end=now + datetime.timedelta(minutes=1))
+        lap.finished = True
+
+        writer.put(session, lap)
+        writer.forget(topic)
+        with mock.patch.object(Lap.objects, "bulk_create", side_effect=Exception("database is down")):
+            writer.flush()
+        self.assertIn(topic, writer.sessions)
+
+        writer.flush()
+        self.assertEqual(Lap.objects.count(), 1)
+        self.assertEqual(writer.sessions, {})
+        self.assertEqual(writer.forgotten, {})
+
+    def test_expired_session_is_discarded_after_retries(self):
+        writer = SessionWriter()
+        writer.threaded = False
+        writer.max_retries = 2
+        now = django.utils.timezone.now()
+        topic = "crewchief/Jim/2/iRacing/track/car/Race"
+        session = Session(topic, start=now)
+        SessionKey.from_topic(topic).init_session(session, {"CarClass": "class"})
+        lap = SessionLap(1, time=60.0, length=1000, start=now, end=now + datetime.timedelta(minutes=1))
+        lap.finished = True
+
+        writer.put(session, lap)
+        writer.forget(topic)
+        with mock.patch.object(Lap.objects, "bulk_create", side_effect=Exception("database is down")):
+            for _ in range(writer.max_retries):
+                writer.flush()
+            self.assertIn(topic, writer.sessions)
+            writer.flush()
+        self.assertEqual(writer.sessions, {})
+        self.assertEqual(writer.forgotten, {})
@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from telemetry.pitcrew.segment import Segment
+from telemetry.pitcrew.snippet import AT_NAMES, EVAL_NAMES, SCORE_NAMES, SnippetError, check_note, compile_snippet
+
+
+class TestSnippet(SimpleTestCase):
+    def segment(self):
+        segment = Segment()
+        segment.type = "brake"
+        segment.add_features({"start": 420.4, "end": 480}, type="brake")
+        segment.add_features({"gear": 3, "distance_gear": {400: 4, 430: 3}}, type="gear")
+        return segment
+
+    def test_eval(self):
+        segment = self.segment()
+        self.assertEqual(compile_snippet("brake_point() - 30").eval(segment, AT_NAMES), 390)
+        self.assertEqual(compile_snippet("gear(3)").eval(segment, AT_NAMES), 430)
+        self.assertEqual(compile_snippet("max(brake_point(), 500)").eval(segment, AT_NAMES), 500)
+        self.assertEqual(compile_snippet("segment.brake_point()").eval(segment, EVAL_NAMES), 420)
+        # compiled once
+        self.assertIs(compile_snippet("brake_point() - 30"), compile_snippet("brake_point() - 30"))
+        with self.assertRaises(NameError):
+            compile_snippet("segment").eval(segment, AT_NAMES)
+
+    def test_check_note(self):
+        check_note(SimpleNamespace(id=1, at="", finish_at="brake_point() - 30", score="apex()"))
+        for at in ("brake_point(", "segment.__class__", "throttle()"):
+            with self.assertRaises(SnippetError):
+                check_note(SimpleNamespace(id=1, at=at, finish_at=None, score=""))
+        check_note(SimpleNamespace(id=1, at="", finish_at="", score="", eval="segment.apex() > 100"))
+        with self.assertRaises(SnippetError) as cm:
+            check_note(SimpleNamespace(id=1, at="", finish_at="", score="", eval="segment.apex("))
+        self.assertIsInstance(cm.exception.__cause__, SnippetError)
+        with self.assertRaises(SnippetError):
+            compile_snippet("coach_gear()").check(SCORE_NAMES)
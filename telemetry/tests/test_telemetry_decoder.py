@@ -0,0 +1,80 @@
+import json
+from unittest import skipUnless
+
+from django.test import TestCase
+
+from telemetry.pitcrew.session import Session
+from telemetry.pitcrew.telemetry_decoder import (
+    FORMAT_CBOR,
+    FORMAT_JSON,
+    FORMAT_MSGPACK,
+    TelemetryDecoder,
+    cbor2,
+    encode_payload,
+    msgspec,
+    payload_format,
+)
+
+from .utils import get_session_df
+
+
+class TestTelemetryDecoder(TestCase):
+    def test_record(self):
+        decoder = TelemetryDecoder(TelemetryDecoder.COACH_FIELDS)
+        payload = {"time": 1, "telemetry": {"SpeedMs": 33.3, "Gear": 4, "CarModel": "Ferrari 488 GT3 Evo 2020"}}
+        telemetry = decoder.decode(json.dumps(payload).encode("utf-8"))
+
+        self.assertEqual(telemetry["SpeedMs"], 33.3)
+        self.assertEqual(telemetry.get("Brake", 0.5), 0.5)
+        self.assertNotIn("CarModel", telemetry)
+        with self.assertRaises(KeyError):
+            telemetry["DistanceRoundTrack"]
+
+        telemetry["_time"] = 1
+        self.assertEqual(dict(telemetry), {"SpeedMs": 33.3, "Gear": 4, "_time": 1})
+
+    def test_full_payload(self):
+        decoder = TelemetryDecoder()
+        payload = {"time": 1, "telemetry": {"SpeedMs": 33.3, "CarModel": "Ferrari 488 GT3 Evo 2020"}}
+        telemetry = decoder.decode(json.dumps(payload).encode("utf-8"))
+        self.assertEqual(telemetry, payload["telemetry"])
+
+    def assert_payload_format(self, format):
+        payload = {"time": 1, "telemetry": {"SpeedMs": 33.3, "Gear": 4, "CarModel": "Ferrari 488 GT3 Evo 2020"}}
+        decoder = TelemetryDecoder(TelemetryDecoder.COACH_FIELDS)
+        full_decoder = TelemetryDecoder()
+        encoded = encode_payload(payload, format)
+        self.assertEqual(payload_format(encoded), format)
+        self.assertEqual(dict(decoder.decode(encoded)), {"SpeedMs": 33.3, "Gear": 4})
+        self.assertEqual(full_decoder.decode(encoded), payload["telemetry"])
+
+    def test_json_payloads(self):
+        self.assert_payload_format(FORMAT_JSON)
+
+    @skipUnless(msgspec, "msgspec is not installed")
+    def test_msgpack_payloads(self):
+        self.assert_payload_format(FORMAT_MSGPACK)
+
+    @skipUnless(cbor2, "cbor2 is not installed")
+    def test_cbor_payloads(self):
+        self.assert_payload_format(FORMAT_CBOR)
+
+    def test_payload_format(self):
+        self.assertEqual(payload_format(b' {"telemetry": {}}'), FORMAT_JSON)
+        self.assertEqual(payload_format(b"\xd9\xd9\xf7\xa0"), FORMAT_CBOR)
+        self.assertEqual(payload_format(b"\xde\x00\x10"), FORMAT_MSGPACK)
+
+    def test_session_laps(self):
+        # the projected records must produce the same laps as the telemetry dicts
+        session_df = get_session_df("1673613558")
+        decoder = TelemetryDecoder(TelemetryDecoder.COACH_FIELDS)
+
+        dict_session = Session(666)
+        record_session = Session(667)
+        for row in session_df.to_dict(orient="records"):
+            now = row.pop("_time")
+            payload = json.dumps({"time": 0, "telemetry": row}, default=str).encode("utf-8")
+            dict_session.signal(json.loads(payload)["telemetry"], now)
+            record_session.signal(decoder.decode(payload), now)
+
+        self.assertEqual(str(record_session.laps), str(dict_session.laps))
@@ -1,4 +1,5 @@
 import os
+import zlib
 
 from paddock.exceptions import RuntimeEnvironmentConfigurationIncompleteError
 
@@ -46,3 +47,15 @@ def get_mqtt_config() -> tuple[str, int, str, str] | RuntimeEnvironmentConfigura
         _B4MAD_RACING_MQTT_USER,
         _B4MAD_RACING_MQTT_PASSWORD,
     )
+
+
+def shard_for_topic(topic, shards):
+    """Return the shard index for a topic.
+
+    Topics are partitioned by driver, so every session of a driver ends up in the same shard.
+    crc32 is used instead of hash() since it is stable across processes.
+    """
+    frags = topic.split("/", 2)
+    if len(frags) < 2:
+        return 0
+    return zlib.crc32(frags[1].encode("utf-8")) % shards